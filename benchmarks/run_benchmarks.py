@@ -0,0 +1,436 @@
+"""
+Performance benchmarks of the hot paths of the project.
+
+Results are written to JSON with the machine metadata, and two result files can be
+compared to flag regressions:
+
+    uv run benchmarks/run_benchmarks.py run --output results/benchmarks/base.json
+    uv run benchmarks/run_benchmarks.py compare results/benchmarks/base.json new.json
+"""
+
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import fire
+from opik.evaluation.metrics import score_result
+
+# Keep BAML from logging every prompt and reply of the end-to-end benchmark
+os.environ.setdefault('BAML_LOG', 'warn')
+
+from beach_challenge_problem.answer_index import AnswerIndex
+from beach_challenge_problem.evaluation import ItemResult
+from beach_challenge_problem.loadtest import get_machine_metadata, start_mock_llm
+from beach_challenge_problem.metrics import get_scoring_metrics
+from beach_challenge_problem.problem import (
+    ProblemGenerator,
+    calculate_final_distance,
+)
+from beach_challenge_problem.run_store import RunWriter, StoredRun
+from beach_challenge_problem.shared_dataset import SharedDataset
+from beach_challenge_problem.simulation import solve_pursuit, solve_two_phase
+from beach_challenge_problem.templates import TEMPLATES
+
+
+def _throughput(fn: Callable[[], None], n_items: int, repeat: int) -> dict:
+    """
+    Runs `fn` once to warm up, then `repeat` times, and returns the best throughput.
+    """
+    fn()
+    best = min(_timed(fn) for _ in range(repeat))
+    return {'value': n_items / best, 'unit': 'items/s', 'higher_is_better': True}
+
+
+def _timed(fn: Callable[[], None]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_distance_scalar(n_items: int, repeat: int) -> dict:
+    params = ProblemGenerator().generate_batch(n_items, seed=0).params.tolist()
+
+    def run():
+        for row in params:
+            calculate_final_distance(*row)
+
+    return _throughput(run, n_items, repeat)
+
+
+def bench_distance_batch(n_items: int, repeat: int) -> dict:
+    batch = ProblemGenerator().generate_batch(n_items * 10, seed=0)
+    return _throughput(batch.get_correct_answers, n_items * 10, repeat)
+
+
+def bench_simulate_two_phase(n_items: int, repeat: int) -> dict:
+    batch = ProblemGenerator().generate_batch(n_items * 10, seed=0)
+    return _throughput(lambda: solve_two_phase(batch), n_items * 10, repeat)
+
+
+def bench_simulate_pursuit(n_items: int, repeat: int) -> dict:
+    batch = ProblemGenerator().generate_batch(n_items, seed=0)
+    return _throughput(lambda: solve_pursuit(batch), n_items, repeat)
+
+
+def bench_answer_index_lookup(n_items: int, repeat: int) -> dict:
+    index = AnswerIndex.build()
+    params = ProblemGenerator().generate_batch(n_items, seed=0).params.tolist()
+
+    def run():
+        for row in params:
+            index.lookup(row)
+
+    return _throughput(run, n_items, repeat)
+
+
+def bench_answer_index_lookup_batch(n_items: int, repeat: int) -> dict:
+    index = AnswerIndex.build()
+    batch = ProblemGenerator().generate_batch(n_items * 10, seed=0)
+    return _throughput(lambda: index.lookup_batch(batch), n_items * 10, repeat)
+
+
+def bench_shared_dataset_attach(n_items: int, repeat: int) -> dict:
+    """
+    Time for a worker to attach to a shared dataset and read its first item,
+    whatever the size of the dataset.
+    """
+    batch = ProblemGenerator().generate_batch(n_items * 10, seed=0)
+    with SharedDataset.from_batch(batch) as dataset:
+
+        def attach():
+            worker_dataset = SharedDataset.attach(dataset.name)
+            worker_dataset.get_items(0, 1)
+            worker_dataset.close()
+
+        best = min(_timed(attach) for _ in range(repeat * 10))
+    return {'value': best, 'unit': 's', 'higher_is_better': False}
+
+
+def bench_run_store_load(n_items: int, repeat: int) -> dict:
+    """
+    Time to open a stored run, average its scores and read one reasoning.
+    """
+    problems = ProblemGenerator().generate_problems(n_items)
+    questions = [problem.get_question() for problem in problems]
+    answers = [problem.get_correct_answer() for problem in problems]
+    # Verbose and repetitive, like the reasonings of real models
+    reasonings = {
+        question: (
+            'Sofia moves at constant velocity and Kai turns after 1 hour. '
+            f'The distance between them is {answer:.4f} km.\n'
+        )
+        * 20
+        for question, answer in zip(questions, answers, strict=True)
+    }
+
+    start = datetime.datetime.now(datetime.UTC)
+    with tempfile.TemporaryDirectory() as root:
+        with RunWriter(root, run='bench', get_reasoning=reasonings.get) as writer:
+            for i, (question, answer) in enumerate(
+                zip(questions, answers, strict=True)
+            ):
+                writer.on_result(
+                    ItemResult(
+                        dataset_item_id=str(i),
+                        input=question,
+                        expected_output=answer,
+                        answer=answer,
+                        scores=[
+                            score_result.ScoreResult(name='within_1_percent', value=1.0)
+                        ],
+                        trace_id=str(i),
+                        start_time=start,
+                        end_time=start,
+                    )
+                )
+
+        def load():
+            with StoredRun(writer.path) as run:
+                run.get_average_scores()
+                run.get_reasoning(len(run) - 1)
+
+        best = min(_timed(load) for _ in range(repeat))
+    return {'value': best, 'unit': 's', 'higher_is_better': False}
+
+
+def bench_problem_generator(n_items: int, repeat: int) -> dict:
+    random.seed(0)
+    return _throughput(
+        lambda: ProblemGenerator().generate_problems(n_items), n_items, repeat
+    )
+
+
+def bench_problem_generator_batch(n_items: int, repeat: int) -> dict:
+    return _throughput(
+        lambda: ProblemGenerator().generate_batch(n_items * 10), n_items * 10, repeat
+    )
+
+
+def bench_question_render(n_items: int, repeat: int) -> dict:
+    problems = ProblemGenerator().generate_problems(n_items)
+
+    def run():
+        for problem in problems:
+            problem.get_question()
+
+    return _throughput(run, n_items, repeat)
+
+
+def bench_question_render_batch(n_items: int, repeat: int) -> dict:
+    batch = ProblemGenerator().generate_batch(n_items * 10, seed=0)
+    return _throughput(
+        lambda: TEMPLATES.render_batch(batch, TEMPLATES.names(complete=True), seed=0),
+        n_items * 10,
+        repeat,
+    )
+
+
+def bench_metric_scoring(n_items: int, repeat: int) -> dict:
+    metrics = get_scoring_metrics()
+    batch = ProblemGenerator().generate_batch(n_items, seed=0)
+    expected = batch.get_correct_answers().tolist()
+    answers = [value * random.uniform(0.98, 1.02) for value in expected]
+
+    def run():
+        for answer, expected_output in zip(answers, expected, strict=True):
+            for metric in metrics:
+                metric.score(answer=answer, expected_output=expected_output)
+
+    return _throughput(run, n_items, repeat)
+
+
+def bench_baml_request_build(n_items: int, repeat: int) -> dict:
+    """
+    Per-call overhead of the BAML client before any network I/O: merging the call
+    options, resolving the client registry and rendering the prompt.
+    """
+    from baml_py import ClientRegistry, Collector
+
+    from beach_challenge_problem.baml_client import b
+
+    client_registry = ClientRegistry()
+    client_registry.add_llm_client(
+        name='MyDynamicClient',
+        provider='openai-generic',
+        options={'model': 'mock', 'base_url': 'http://127.0.0.1:1/v1'},
+    )
+    client_registry.set_primary('MyDynamicClient')
+    questions = [p.get_question() for p in ProblemGenerator().generate_problems(100)]
+    n_calls = max(n_items // 10, 100)
+
+    def run():
+        for i in range(n_calls):
+            b.request.SolveProblem(
+                questions[i % len(questions)],
+                baml_options={
+                    'client_registry': client_registry,
+                    'collector': Collector(),
+                },
+            )
+
+    return _throughput(run, n_calls, repeat)
+
+
+def bench_import_time(n_items: int, repeat: int) -> dict:
+    """
+    Time to import the agents package in a fresh interpreter, on top of the
+    interpreter startup time.
+    """
+
+    def startup(code: str) -> float:
+        return min(
+            _timed(lambda: subprocess.run([sys.executable, '-c', code], check=True))
+            for _ in range(repeat)
+        )
+
+    import_time = startup('import beach_challenge_problem.agents') - startup('pass')
+    return {'value': import_time, 'unit': 's', 'higher_is_better': False}
+
+
+def _start_mock_llm_thread(port: int) -> None:
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(start_mock_llm(port, latency=0.001, latency_sigma=0.0))
+    threading.Thread(target=loop.run_forever, name='mock-llm', daemon=True).start()
+
+
+class _LocalOpik:
+    """
+    Stand-in for the Opik client, serving the dataset items from memory and
+    dropping the uploaded traces, as the mock LLM stands in for the model server.
+    """
+
+    items: list[dict] = []
+
+    def get_or_create_dataset(self, name: str) -> '_LocalOpik':
+        return self
+
+    def get_items(self) -> list[dict]:
+        return self.items
+
+    def create_experiment(self, dataset_name: str, experiment_config: dict | None):
+        return SimpleNamespace(id='local', name='local', insert=lambda **kwargs: None)
+
+    def trace(self, **kwargs) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+def bench_evaluate_mock_llm(n_items: int, repeat: int) -> dict:
+    """
+    End-to-end `GenericAgent.evaluate` with batched upload (agent, BAML client,
+    HTTP, parsing, scoring and the background writer) against a local stand-in
+    LLM and a local stand-in Opik client, with the rate limiter disabled.
+
+    The throughput is bounded by the CPU time of the BAML runtime, which spends
+    15-25 ms building each request (see baml_request_build) against 1 ms of mock
+    latency. On a single core it stays around 40 items/s whatever the number of
+    task threads or the rate limit.
+    """
+    from beach_challenge_problem.agents import OneShootAgent
+
+    port = 8191
+    _start_mock_llm_thread(port)
+    agent = OneShootAgent(
+        model='openai-generic/mock',
+        base_url=f'http://127.0.0.1:{port}/v1',
+        requests_per_second=math.inf,
+    )
+
+    batch = ProblemGenerator().generate_batch(max(n_items // 50, 50), seed=0)
+    _LocalOpik.items = [
+        {
+            'id': str(i),
+            'input': batch[i].get_question(),
+            'expected_output': batch[i].get_correct_answer(),
+        }
+        for i in range(len(batch))
+    ]
+
+    def run():
+        with (
+            mock.patch('beach_challenge_problem.evaluation.Opik', _LocalOpik),
+            contextlib.redirect_stdout(io.StringIO()),
+        ):
+            agent.evaluate(
+                dataset_name='benchmark', task_threads=16, batched_upload=True
+            )
+
+    return _throughput(run, len(_LocalOpik.items), repeat)
+
+
+BENCHMARKS = {
+    'distance_scalar': bench_distance_scalar,
+    'distance_batch': bench_distance_batch,
+    'simulate_two_phase': bench_simulate_two_phase,
+    'simulate_pursuit': bench_simulate_pursuit,
+    'answer_index_lookup': bench_answer_index_lookup,
+    'answer_index_lookup_batch': bench_answer_index_lookup_batch,
+    'shared_dataset_attach': bench_shared_dataset_attach,
+    'run_store_load': bench_run_store_load,
+    'problem_generator': bench_problem_generator,
+    'problem_generator_batch': bench_problem_generator_batch,
+    'question_render': bench_question_render,
+    'question_render_batch': bench_question_render_batch,
+    'metric_scoring': bench_metric_scoring,
+    'baml_request_build': bench_baml_request_build,
+    'import_time': bench_import_time,
+    'evaluate_mock_llm': bench_evaluate_mock_llm,
+}
+
+
+def run(
+    output: str | None = None,
+    only: str | tuple[str, ...] | None = None,
+    n_items: int = 10_000,
+    repeat: int = 5,
+):
+    """
+    Run the benchmarks and write the results with the machine metadata.
+
+    Args:
+        output: Path of the JSON results. Defaults to results/benchmarks/<time>.json
+        only: Names of the benchmarks to run, e.g. distance_scalar,distance_batch
+        n_items: Base number of items per benchmark run
+        repeat: Number of timed runs per benchmark, the best one is kept
+    """
+    if isinstance(only, str):
+        only = tuple(only.split(','))
+    names = only or tuple(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(
+            f'Unknown benchmarks {sorted(unknown)}, see {list(BENCHMARKS)}'
+        )
+
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name](n_items, repeat)
+        print(f'{name:<26} {results[name]["value"]:>14.6g} {results[name]["unit"]}')
+
+    metadata = get_machine_metadata()
+    if output is None:
+        output = f'results/benchmarks/{metadata["timestamp"].replace(":", "-")}.json'
+    path = Path(output)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {
+                'metadata': metadata,
+                'config': {'n_items': n_items, 'repeat': repeat},
+                'results': results,
+            },
+            indent=2,
+        )
+    )
+    print(f'Results written to {path}')
+
+
+def compare(baseline: str, candidate: str, threshold: float = 0.1):
+    """
+    Compare two benchmark result files and exit with an error on regressions.
+
+    Args:
+        baseline: Path of the reference results
+        candidate: Path of the new results
+        threshold: Relative slowdown above which a benchmark counts as a regression
+    """
+    base = json.loads(Path(baseline).read_text())['results']
+    new = json.loads(Path(candidate).read_text())['results']
+
+    regressions = []
+    for name in base.keys() & new.keys():
+        change = new[name]['value'] / base[name]['value'] - 1
+        # positive slowdown means worse, whichever direction the metric goes
+        slowdown = -change if base[name]['higher_is_better'] else change
+        regressed = slowdown > threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f'{name:<26} {base[name]["value"]:>14.6g} {new[name]["value"]:>14.6g} '
+            f'{new[name]["unit"]:<8} {change:>+8.1%}{"  REGRESSION" if regressed else ""}'
+        )
+
+    if regressions:
+        print(f'{len(regressions)} regression(s) above {threshold:.0%}: {regressions}')
+        sys.exit(1)
+    print(f'No regression above {threshold:.0%}')
+
+
+if __name__ == '__main__':
+    fire.Fire({'run': run, 'compare': compare})
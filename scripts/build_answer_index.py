@@ -0,0 +1,28 @@
+"""
+CLI script to precompute the answers of every problem ProblemGenerator can sample.
+"""
+
+import fire
+
+from beach_challenge_problem.answer_index import AnswerIndex
+
+
+def build_answer_index(path: str = 'results/answer_index.npy'):
+    """
+    Build the answer index and save it to disk, to be memory-mapped by OracleAgent.
+
+    Args:
+        path: Path of the .npy file. The parameter ranges are written next to it
+
+    Examples:
+        python build_answer_index.py --path results/answer_index.npy
+    """
+    index = AnswerIndex.build()
+    path = index.save(path)
+    print(
+        f'Wrote {index.answers.size} answers ({index.answers.nbytes} bytes) to {path}'
+    )
+
+
+if __name__ == '__main__':
+    fire.Fire(build_answer_index)
@@ -0,0 +1,77 @@
+"""
+CLI script to measure the accuracy/tokens trade-off of the compact and answer-only
+SolveProblem prompts against the full one.
+"""
+
+import fire
+
+from beach_challenge_problem.agents import OneShootAgent
+from beach_challenge_problem.metrics import get_average_scores
+
+
+def compare_prompt_variants(
+    model: str,
+    dataset: str,
+    max_reasoning_words: int = 150,
+    max_output_tokens: int | None = None,
+    base_url: str = 'http://localhost:11434/v1',
+    task_threads: int = 1,
+):
+    """
+    Evaluates OneShootAgent with the full, compact and answer-only prompts on a
+    dataset, and prints the accuracy and token usage of each variant.
+
+    Args:
+        model: Model identifier (e.g., anthropic/claude-sonnet-4-20250514)
+        dataset: Name of the dataset to evaluate on
+        max_reasoning_words: Reasoning length requested with the compact prompt
+        max_output_tokens: Maximum number of tokens the LLM can generate with the
+            compact prompt
+        base_url: Base URL for the model API
+        task_threads: Number of dataset items evaluated concurrently
+
+    Returns:
+        List with one summary dictionary per variant
+
+    Examples:
+        python compare_prompt_variants.py --model anthropic/claude-sonnet-4-20250514 --dataset beach_challenge_problem_dataset --max_output_tokens 400
+    """
+    variants = {
+        'full': {},
+        'compact': {
+            'compact_prompt': True,
+            'max_reasoning_words': max_reasoning_words,
+            'max_output_tokens': max_output_tokens,
+        },
+        'answer_only': {'answer_only': True},
+    }
+
+    summaries = []
+    for variant, kwargs in variants.items():
+        agent = OneShootAgent(model=model, base_url=base_url, **kwargs)
+        evaluation = agent.evaluate(dataset_name=dataset, task_threads=task_threads)
+
+        usage = agent.get_token_usage()
+        n_calls = max(usage['n_calls'], 1)
+        summaries.append(
+            {
+                'variant': variant,
+                **get_average_scores(evaluation),
+                'input_tokens_per_item': usage['input_tokens'] / n_calls,
+                'output_tokens_per_item': usage['output_tokens'] / n_calls,
+            }
+        )
+
+    full_tokens = (
+        summaries[0]['input_tokens_per_item'] + summaries[0]['output_tokens_per_item']
+    )
+    for summary in summaries:
+        tokens = summary['input_tokens_per_item'] + summary['output_tokens_per_item']
+        summary['token_ratio'] = tokens / full_tokens if full_tokens else None
+        print(summary)
+
+    return summaries
+
+
+if __name__ == '__main__':
+    fire.Fire(compare_prompt_variants)
@@ -0,0 +1,111 @@
+"""
+CLI script to evaluate OneShootAgent with several worker processes, possibly on
+several hosts, sharing a SQLite work queue.
+"""
+
+import fire
+
+from beach_challenge_problem.agents import OneShootAgent
+from beach_challenge_problem.distributed import (
+    WorkQueue,
+    create_queue,
+    merge_results,
+    run_worker,
+)
+from beach_challenge_problem.metrics import get_average_scores
+
+
+def coordinate(
+    model: str,
+    dataset: str,
+    queue: str = 'results/work_queue.sqlite',
+    item_ids: list[str] | None = None,
+    base_url: str = 'http://localhost:11434/v1',
+    max_attempts: int = 3,
+    compact_prompt: bool = False,
+    max_reasoning_words: int = 150,
+    max_output_tokens: int | None = None,
+    answer_only: bool = False,
+):
+    """
+    Create the work queue for an evaluation of OneShootAgent on a dataset. The
+    agent options are stored in the queue, and every worker builds its agent with
+    them.
+
+    Args:
+        model: Model identifier (e.g., anthropic/claude-sonnet-4-20250514)
+        dataset: Name of the dataset to evaluate on
+        queue: Path of the SQLite file of the queue, on a volume shared by workers
+        item_ids: Optional list of specific dataset item IDs to evaluate
+        base_url: Base URL for the model API
+        max_attempts: Number of leases an item gets before it is given up on,
+            stored in the queue and used by the workers and the merge
+        compact_prompt: Whether to send a parameter-only prompt with a short reasoning
+        max_reasoning_words: Reasoning length requested with the compact prompt
+        max_output_tokens: Maximum number of tokens the LLM can generate
+        answer_only: Whether to ask for the number only, without reasoning
+    """
+    agent = OneShootAgent(
+        model=model,
+        base_url=base_url,
+        compact_prompt=compact_prompt,
+        max_reasoning_words=max_reasoning_words,
+        max_output_tokens=max_output_tokens,
+        answer_only=answer_only,
+    )
+    create_queue(
+        queue,
+        dataset_name=dataset,
+        experiment_config=agent.get_experiment_config(),
+        dataset_item_ids=item_ids,
+        max_attempts=max_attempts,
+    )
+
+
+def worker(
+    queue: str = 'results/work_queue.sqlite',
+    base_url: str = 'http://localhost:11434/v1',
+    requests_per_second: float = 10.0,
+    task_threads: int = 1,
+    lease_seconds: float = 60.0,
+):
+    """
+    Solve items from the work queue until it is finished. The agent is configured
+    from the parameters stored in the queue by the coordinator.
+
+    Args:
+        queue: Path of the SQLite file of the queue
+        base_url: Base URL for the model API, as seen from this host
+        requests_per_second: Initial request rate of this worker
+        task_threads: Number of items solved concurrently
+        lease_seconds: Number of seconds without renewal after which the items
+            of this worker are handed out to another worker, e.g. if it crashed.
+            Leases are renewed while the items are being solved
+    """
+    work_queue = WorkQueue(queue)
+    params = work_queue.get_meta()['experiment_config']['agent_params']
+    agent = OneShootAgent(
+        **params, base_url=base_url, requests_per_second=requests_per_second
+    )
+    run_worker(
+        agent.get_answer,
+        work_queue,
+        task_threads=task_threads,
+        lease_seconds=lease_seconds,
+    )
+
+
+def merge(queue: str = 'results/work_queue.sqlite'):
+    """
+    Wait for the workers to finish and log all results to one Opik experiment.
+
+    Args:
+        queue: Path of the SQLite file of the queue
+    """
+    evaluation = merge_results(WorkQueue(queue))
+    print(f'Experiment: {evaluation.experiment_name}')
+    print(f'Average scores: {get_average_scores(evaluation)}')
+
+
+if __name__ == '__main__':
+    fire.Fire({'coordinate': coordinate, 'worker': worker, 'merge': merge})
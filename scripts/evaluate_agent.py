@@ -6,13 +6,47 @@ import fire
 from typing import Optional, List
 
 from beach_challenge_problem.agents import OneShootAgent
+from beach_challenge_problem.cache import CachedAgent
+from beach_challenge_problem.dashboard import EvaluationMonitor
+from beach_challenge_problem.profiling import enable_profiling
+from beach_challenge_problem.rate_limiter import get_rate_limiter
+from beach_challenge_problem.run_store import RunWriter
+from beach_challenge_problem.sampling import get_weighted_accuracy, sample_dataset_items
+from beach_challenge_problem.triage import FailureRecorder, FailureStore
 
 
 def evaluate_one_shoot_agent(
     model: str,
     dataset: str,
     item_ids: Optional[List[str]] = None,
-    base_url: str = "http://localhost:11434/v1"
+    base_url: str = "http://localhost:11434/v1",
+    requests_per_second: float = 10.0,
+    task_threads: int = 1,
+    hedge: bool = False,
+    hedge_model: str | None = None,
+    cache: bool = False,
+    compact_prompt: bool = False,
+    max_output_tokens: int | None = None,
+    answer_only: bool = False,
+    profile: bool = False,
+    profile_path: str = "profiles/trace.json",
+    batched_upload: bool = False,
+    incremental: bool = False,
+    sequential: bool = False,
+    ci_width: float = 0.1,
+    baseline_accuracy: float | None = None,
+    sample_size: int | None = None,
+    live: bool = False,
+    input_price: float | None = None,
+    output_price: float | None = None,
+    coalesce: bool = False,
+    parallel_slots: int | None = None,
+    keep_alive: str | None = None,
+    prompt_cache: bool = True,
+    triage: bool = False,
+    triage_path: str = "results/failures.sqlite",
+    store_run: bool = False,
+    runs_path: str = "results/runs",
 ):
     """
     Evaluate OneShootAgent on a dataset.
@@ -22,6 +56,44 @@ def evaluate_one_shoot_agent(
         dataset: Name of the dataset to evaluate on
         item_ids: Optional list of specific dataset item IDs to evaluate
         base_url: Base URL for the model API
+        requests_per_second: Initial request rate, adapted to the provider's limits
+        task_threads: Number of dataset items evaluated concurrently
+        hedge: Whether to send hedged requests when the LLM is slower than p95
+        hedge_model: Model or BAML client (e.g. CustomFast) used for hedged requests
+        cache: Whether to answer equivalent problems only once
+        compact_prompt: Whether to send a parameter-only prompt with a short reasoning
+        max_output_tokens: Maximum number of tokens the LLM can generate
+        answer_only: Whether to ask for the number only, without reasoning
+        profile: Whether to record a trace of where the time of the run goes
+        profile_path: Path of the Chrome trace file written when profiling
+        batched_upload: Whether to upload results to Opik in background batches
+        incremental: Whether to only solve items without a stored result for this
+            agent configuration and BAML sources
+        sequential: Whether to stop once the accuracy is known precisely enough
+        ci_width: Width of the accuracy confidence interval to stop at
+        baseline_accuracy: Accuracy of a model to compare against, to stop as soon
+            as this model is significantly better or worse
+        sample_size: Number of items drawn from the dataset, stratified by a
+            difficulty estimated from past results, instead of item_ids
+        live: Whether to show throughput, accuracy, errors and cost in the terminal
+            as items complete
+        input_price: Price in dollars of one million input tokens, for the live cost
+        output_price: Price in dollars of one million output tokens, for the live
+            cost
+        coalesce: Whether to send at most parallel_slots requests at once to a local
+            server and identical concurrent prompts only once
+        parallel_slots: Number of requests the local server decodes in parallel,
+            defaults to OLLAMA_NUM_PARALLEL
+        keep_alive: If set, load the model on the Ollama server before the run and
+            keep it loaded for this long after the last request, e.g. 30m
+        prompt_cache: Whether to mark the static instructions of the prompt for
+            provider prompt caching
+        triage: Whether to store the wrong answers with their parameters, reasoning
+            and likely cause, to query them with scripts/triage_failures.py
+        triage_path: Path of the SQLite failure store
+        store_run: Whether to store the results and reasonings of the run locally,
+            deduplicated and compressed, to inspect them with scripts/inspect_runs.py
+        runs_path: Directory the stored runs are written to
     
     Returns:
         The evaluation results from Opik
@@ -40,13 +112,100 @@ def evaluate_one_shoot_agent(
     if item_ids:
         print(f"Evaluating specific items: {item_ids}")
     
+    if profile:
+        profiler = enable_profiling()
+
+    if sample_size:
+        sample_weights = sample_dataset_items(dataset, sample_size)
+        item_ids = list(sample_weights)
+        print(f"Evaluating a stratified sample of {len(item_ids)} items")
+
     # Create and evaluate the agent
-    agent = OneShootAgent(model=model, base_url=base_url)
-    evaluation_result = agent.evaluate(
-        dataset_name=dataset,
-        dataset_item_ids=item_ids
+    agent = OneShootAgent(
+        model=model,
+        base_url=base_url,
+        requests_per_second=requests_per_second,
+        hedge=hedge,
+        hedge_model=hedge_model,
+        compact_prompt=compact_prompt,
+        max_output_tokens=max_output_tokens,
+        answer_only=answer_only,
+        coalesce=coalesce,
+        parallel_slots=parallel_slots,
+        prompt_cache=prompt_cache,
     )
+    if keep_alive is not None:
+        agent.warm_up(keep_alive)
+    evaluated_agent = CachedAgent(agent) if cache else agent
+    monitor = None
+    if live:
+        monitor = EvaluationMonitor(
+            get_token_usage=agent.get_token_usage,
+            input_price=input_price,
+            output_price=output_price,
+        )
+    recorder = None
+    if triage:
+        recorder = FailureRecorder(
+            FailureStore(triage_path),
+            model=model,
+            get_reasoning=evaluated_agent.get_reasoning,
+        )
+    writer = None
+    if store_run:
+        writer = RunWriter(
+            runs_path,
+            experiment_config=evaluated_agent.get_experiment_config(),
+            get_reasoning=evaluated_agent.get_reasoning,
+        )
+    callbacks = [
+        callback.on_result for callback in (recorder, writer) if callback is not None
+    ]
+
+    def on_result(result):
+        for callback in callbacks:
+            callback(result)
+
+    try:
+        evaluation_result = evaluated_agent.evaluate(
+            dataset_name=dataset,
+            dataset_item_ids=item_ids,
+            task_threads=task_threads,
+            batched_upload=batched_upload,
+            incremental=incremental,
+            sequential=sequential,
+            ci_width=ci_width,
+            baseline_accuracy=baseline_accuracy,
+            on_result=on_result if callbacks else None,
+            monitor=monitor,
+        )
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if writer is not None:
+            writer.close()
     
+    print(f"Token usage: {agent.get_token_usage()}")
+    print(f"Rate limiter: {get_rate_limiter(model.split('/')[0]).get_metrics()}")
+    if hedge:
+        print(f"Hedging: {agent.get_hedging_metrics()}")
+    if coalesce:
+        print(f"Coalescing: {agent.get_coalescing_metrics()}")
+    if sample_size:
+        accuracy = get_weighted_accuracy(evaluation_result, sample_weights)
+        print(f"Estimated dataset accuracy: {accuracy:.3f}")
+    if cache:
+        print(f"Cache: {evaluated_agent.cache.get_metrics()}")
+    if triage:
+        print(f"Failures of run {recorder.run}:")
+        for row in recorder.store.count(where="run = ?", params=(recorder.run,)):
+            print(f"  {row['bucket']}: {row['n_failures']}")
+    if store_run:
+        print(f"Run stored in {writer.path}")
+    if profile:
+        for name, stats in profiler.get_summary().items():
+            print(f"{name}: {stats}")
+        print(f"Trace written to {profiler.export_chrome_trace(profile_path)}")
     print("Evaluation completed successfully!")
     return evaluation_result
 
@@ -0,0 +1,134 @@
+"""
+CLI script to fit a routing policy from the results of incremental evaluations,
+and to evaluate the router on a dataset.
+
+    python scripts/fit_router.py frontier --costs '{"anthropic/claude-sonnet-4-20250514": 0.012}'
+    python scripts/fit_router.py fit --target_accuracy 0.95 --costs '{...}'
+    python scripts/fit_router.py evaluate --dataset beach_challenge_test
+"""
+
+import fire
+
+from beach_challenge_problem.agents import OneShootAgent
+from beach_challenge_problem.routing import (
+    RouterAgent,
+    RoutingPolicy,
+    get_agent_params,
+    get_frontier,
+    load_routing_records,
+)
+
+
+def fit(
+    store: str = 'results/evaluation_store.jsonl',
+    output: str = 'results/routing_policy.json',
+    target_accuracy: float = 0.9,
+    costs: dict | None = None,
+    confidence: float = 0.9,
+    min_samples: int = 20,
+):
+    """
+    Fit a routing policy on every stored result and save it.
+
+    Args:
+        store: Path of the result store written by evaluate_agent.py --incremental
+        output: Path of the JSON file the policy is written to
+        target_accuracy: Accuracy on within_1_percent each group of problems must
+            reach
+        costs: Cost in dollars of one request to each model, or to each agent
+            name for specific prompt settings, models missing being free
+        confidence: Confidence level of the accuracy interval whose lower bound
+            must reach the target
+        min_samples: Number of results below which a group of problems uses the
+            accuracy of the enclosing group
+    """
+    records = load_routing_records(store)
+    print(f'Fitting on {len(records)} results')
+    policy = RoutingPolicy.fit(
+        records,
+        target_accuracy=target_accuracy,
+        costs=costs,
+        confidence=confidence,
+        min_samples=min_samples,
+    )
+    routed = [policy.choose(record.input) for record in records]
+    for agent in sorted(policy.agents):
+        print(f'{agent:<50} {routed.count(agent) / len(routed):>7.1%} of problems')
+    print(f'Policy saved to {policy.save(output)}')
+
+
+def frontier(
+    store: str = 'results/evaluation_store.jsonl',
+    costs: dict | None = None,
+    targets: tuple[float, ...] = (0.8, 0.9, 0.95, 0.99),
+    test_fraction: float = 0.3,
+    confidence: float = 0.9,
+    min_samples: int = 20,
+):
+    """
+    Print the cost, latency and accuracy of each agent and of the router at each
+    target, on problems held out of the fit.
+
+    Args:
+        store: Path of the result store written by evaluate_agent.py --incremental
+        costs: Cost in dollars of one request to each model, or to each agent
+            name for specific prompt settings, models missing being free
+        targets: Target accuracies of the fitted policies
+        test_fraction: Fraction of the problems held out to replay the policies
+        confidence: Confidence level of the accuracy interval of the policies
+        min_samples: Number of results below which a group of problems uses the
+            accuracy of the enclosing group
+    """
+    points = get_frontier(
+        load_routing_records(store),
+        targets=tuple(targets),
+        costs=costs,
+        test_fraction=test_fraction,
+        confidence=confidence,
+        min_samples=min_samples,
+    )
+    print(f'{"":<50} {"$/problem":>10} {"latency":>9} {"accuracy":>9} {"n":>6}')
+    for point in sorted(points, key=lambda point: point['cost']):
+        print(
+            f'{point["name"]:<50} {point["cost"]:>10.5f} {point["latency"]:>7.2f} s '
+            f'{point["accuracy"]:>9.1%} {point["n_problems"]:>6}'
+            f'{"  *" if point["pareto"] else ""}'
+        )
+    print('* on the cost/latency/accuracy frontier')
+
+
+def evaluate(
+    dataset: str,
+    policy: str = 'results/routing_policy.json',
+    base_url: str = 'http://localhost:11434/v1',
+    base_urls: dict | None = None,
+    task_threads: int = 1,
+):
+    """
+    Evaluate the router on a dataset, and print its realized cost, latency and
+    accuracy per agent. The agents are OneShootAgents rebuilt from their names.
+
+    Args:
+        dataset: Name of the Opik dataset
+        policy: Path of the policy written by the fit command
+        base_url: Base URL of the model APIs
+        base_urls: Base URL of specific models, overriding base_url
+        task_threads: Number of dataset items evaluated concurrently
+    """
+    routing_policy = RoutingPolicy.load(policy)
+    base_urls = base_urls or {}
+    agents = []
+    for name in routing_policy.agents:
+        params = get_agent_params(name)
+        agents.append(
+            OneShootAgent(**params, base_url=base_urls.get(params['model'], base_url))
+        )
+    router = RouterAgent(agents, routing_policy)
+    router.evaluate(
+        dataset_name=dataset, task_threads=task_threads, on_result=router.on_result
+    )
+    print(router.get_report())
+
+
+if __name__ == '__main__':
+    fire.Fire({'fit': fit, 'frontier': frontier, 'evaluate': evaluate})
@@ -0,0 +1,95 @@
+"""
+CLI script to inspect the runs stored by `evaluate_agent.py --store_run`.
+
+    python scripts/inspect_runs.py list
+    python scripts/inspect_runs.py summary 20261019T163000
+    python scripts/inspect_runs.py show 20261019T163000 --failed --limit 5
+"""
+
+from pathlib import Path
+
+import fire
+import numpy as np
+
+from beach_challenge_problem.run_store import StoredRun, list_runs
+
+
+def list_(root: str = 'results/runs'):
+    """
+    Print the stored runs with their size and accuracy.
+
+    Args:
+        root: Directory of the stored runs
+    """
+    for run in list_runs(root):
+        path = Path(root) / run
+        size = sum(file.stat().st_size for file in path.iterdir())
+        with StoredRun(path) as stored:
+            scores = stored.get_average_scores()
+            accuracy = scores.get('within_1_percent', float('nan'))
+            print(
+                f'{run:<30} {len(stored):>8} items {size / 1e6:>8.1f} MB {accuracy:>7.1%}'
+            )
+
+
+def summary(run: str, root: str = 'results/runs'):
+    """
+    Print the configuration, average scores and latencies of a run.
+
+    Args:
+        run: Name of the run
+        root: Directory of the stored runs
+    """
+    with StoredRun(Path(root) / run) as stored:
+        print(f'Run {stored.run}: {len(stored)} items')
+        print(f'Config: {stored.experiment_config}')
+        for metric, value in stored.get_average_scores().items():
+            print(f'{metric:<25} {value:.4f}')
+        latency = stored.columns['latency']
+        if len(latency):
+            print(
+                f'{"latency":<25} p50 {np.percentile(latency, 50):.2f} s, '
+                f'p95 {np.percentile(latency, 95):.2f} s'
+            )
+        print(f'{"errors":<25} {int((stored.columns["error_id"] >= 0).sum())}')
+
+
+def show(
+    run: str,
+    root: str = 'results/runs',
+    failed: bool = False,
+    metric: str = 'within_1_percent',
+    limit: int = 10,
+):
+    """
+    Print results of a run with their question and reasoning, decompressed only
+    for the results shown.
+
+    Args:
+        run: Name of the run
+        root: Directory of the stored runs
+        failed: Whether to only show the results failing the metric
+        metric: Binary metric used with failed
+        limit: Maximum number of results shown
+    """
+    with StoredRun(Path(root) / run) as stored:
+        indices = np.arange(len(stored))
+        if failed:
+            indices = indices[stored.get_scores(metric) != 1.0]
+        for index in indices[:limit]:
+            result = stored.get_item_result(int(index))
+            print(
+                f'Item {result.dataset_item_id}: answered {result.answer}, '
+                f'expected {result.expected_output:.4f} ({result.latency:.2f} s)'
+            )
+            print(result.input)
+            reasoning = stored.get_reasoning(int(index))
+            if reasoning:
+                print(f'Reasoning: {reasoning}')
+            if result.error:
+                print(f'Error: {result.error}')
+            print('-' * 100)
+
+
+if __name__ == '__main__':
+    fire.Fire({'list': list_, 'summary': summary, 'show': show})
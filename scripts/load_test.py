@@ -0,0 +1,211 @@
+"""
+CLI script to load test OneShootAgent, in process or through the HTTP endpoint of
+serve_agent.py, optionally against a local stand-in LLM.
+"""
+
+import asyncio
+import json
+import math
+from pathlib import Path
+
+import aiohttp
+import fire
+from aiohttp import web
+from loguru import logger
+
+from beach_challenge_problem.agents import OneShootAgent
+from beach_challenge_problem.loadtest import (
+    compare_reports,
+    create_mock_llm_app,
+    generate_questions,
+    http_sender,
+    run_closed_loop,
+    run_open_loop,
+    save_report,
+    start_mock_llm,
+)
+
+
+async def _run(
+    model: str,
+    base_url: str,
+    url: str | None,
+    mode: str,
+    qps: float,
+    concurrency: int,
+    duration: float,
+    questions: list[str],
+    requests_per_second: float,
+    mock_llm_port: int | None,
+    mock_latency: float,
+    mock_error_rate: float,
+):
+    mock_runner = None
+    if mock_llm_port is not None:
+        mock_runner = await start_mock_llm(
+            mock_llm_port, latency=mock_latency, error_rate=mock_error_rate
+        )
+
+    session = None
+    try:
+        if url is not None:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0),
+                timeout=aiohttp.ClientTimeout(total=300),
+            )
+            send = http_sender(session, url)
+        else:
+            agent = OneShootAgent(
+                model=model,
+                base_url=base_url,
+                requests_per_second=requests_per_second,
+            )
+            send = agent.get_answer_async
+
+        if mode == 'open':
+            return await run_open_loop(send, questions, qps, duration)
+        if mode == 'closed':
+            return await run_closed_loop(send, questions, concurrency, duration)
+        raise ValueError(f"mode must be 'open' or 'closed', got {mode!r}")
+    finally:
+        if session is not None:
+            await session.close()
+        if mock_runner is not None:
+            await mock_runner.cleanup()
+
+
+def run(
+    model: str = 'openai-generic/mock',
+    base_url: str = 'http://localhost:11434/v1',
+    url: str | None = None,
+    mode: str = 'open',
+    qps: float = 10.0,
+    concurrency: int = 10,
+    duration: float = 60.0,
+    n_questions: int = 1000,
+    requests_per_second: float = math.inf,
+    mock_llm: bool = False,
+    mock_llm_port: int = 8100,
+    mock_latency: float = 1.0,
+    mock_error_rate: float = 0.0,
+    window: float = 1.0,
+    output: str = 'results/load_test.json',
+):
+    """
+    Replay generated problems against an agent at a target load and write a report.
+
+    Args:
+        model: Model identifier used when the agent runs in process
+        base_url: Base URL for the model API
+        url: URL of a /solve endpoint. If given, requests go over HTTP instead of
+            to an in-process agent
+        mode: 'open' for Poisson arrivals at `qps`, 'closed' for `concurrency`
+            clients sending requests back to back
+        qps: Target requests per second in open-loop mode
+        concurrency: Number of clients in closed-loop mode
+        duration: Number of seconds during which requests are sent
+        n_questions: Number of distinct generated problems replayed in a loop
+        requests_per_second: Rate limit of the in-process agent. Unlimited by
+            default, so that the load test measures the agent and not the limiter
+        mock_llm: Start a stand-in LLM on localhost and point the agent at it
+        mock_llm_port: Port of the stand-in LLM
+        mock_latency: Median latency of the stand-in LLM in seconds
+        mock_error_rate: Fraction of failed responses of the stand-in LLM
+        window: Length in seconds of the time windows of the report timeline
+        output: Path of the JSON report
+
+    Examples:
+        python load_test.py run --mock_llm --qps 50 --duration 30
+
+        python load_test.py run --url http://localhost:8000/solve --mode closed
+    """
+    if mock_llm:
+        base_url = f'http://127.0.0.1:{mock_llm_port}/v1'
+
+    config = {
+        'target': url or model,
+        'base_url': None if url else base_url,
+        'mode': mode,
+        'qps': qps if mode == 'open' else None,
+        'concurrency': concurrency if mode == 'closed' else None,
+        'duration': duration,
+        'n_questions': n_questions,
+        'mock_llm': {'latency': mock_latency, 'error_rate': mock_error_rate}
+        if mock_llm
+        else None,
+    }
+    logger.info(f'Running load test: {config}')
+
+    records = asyncio.run(
+        _run(
+            model=model,
+            base_url=base_url,
+            url=url,
+            mode=mode,
+            qps=qps,
+            concurrency=concurrency,
+            duration=duration,
+            questions=generate_questions(n_questions),
+            requests_per_second=requests_per_second,
+            mock_llm_port=mock_llm_port if mock_llm else None,
+            mock_latency=mock_latency,
+            mock_error_rate=mock_error_rate,
+        )
+    )
+
+    report = save_report(records, config, output, window=window)
+    logger.info(f'Report written to {output}')
+    for row in report['timeline']:
+        logger.info(
+            f't={row["t"]:>6.1f}s  throughput={row["throughput"]:>7.2f}/s  '
+            f'errors={row["error_rate"]:>6.1%}  p50={row["p50"]}  p99={row["p99"]}'
+        )
+    print(json.dumps(report['summary'], indent=2))
+
+
+def mock_llm(
+    port: int = 8100,
+    latency: float = 1.0,
+    latency_sigma: float = 0.5,
+    error_rate: float = 0.0,
+):
+    """
+    Run a stand-in OpenAI-compatible LLM that answers the problems exactly.
+
+    Args:
+        port: Port to listen on
+        latency: Median response time in seconds
+        latency_sigma: Standard deviation of the log of the response time
+        error_rate: Fraction of requests answered with a 500 error
+
+    Examples:
+        python load_test.py mock_llm --port 8100
+
+        python serve_agent.py --model openai-generic/mock --base_url http://127.0.0.1:8100/v1
+    """
+    app = create_mock_llm_app(
+        latency=latency, latency_sigma=latency_sigma, error_rate=error_rate
+    )
+    web.run_app(app, host='127.0.0.1', port=port)
+
+
+def compare(baseline: str, candidate: str):
+    """
+    Compare the summaries of two load test reports.
+
+    Args:
+        baseline: Path of the reference report
+        candidate: Path of the new report
+    """
+    comparison = compare_reports(
+        json.loads(Path(baseline).read_text()), json.loads(Path(candidate).read_text())
+    )
+    for name, row in comparison.items():
+        change = f'{row["change"]:+.1%}' if row['change'] is not None else 'n/a'
+        print(
+            f'{name:<12} {row["baseline"]!s:>22} {row["candidate"]!s:>22} {change:>9}'
+        )
+
+
+if __name__ == '__main__':
+    fire.Fire({'run': run, 'mock_llm': mock_llm, 'compare': compare})
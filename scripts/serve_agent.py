@@ -0,0 +1,61 @@
+"""
+CLI script to serve OneShootAgent over HTTP.
+"""
+
+import fire
+
+from beach_challenge_problem.agents import OneShootAgent
+from beach_challenge_problem.serving import serve
+from beach_challenge_problem.speculative import SpeculativeAgent
+
+
+def serve_one_shoot_agent(
+    model: str,
+    base_url: str = 'http://localhost:11434/v1',
+    host: str = '0.0.0.0',
+    port: int = 8000,
+    max_batch_size: int = 16,
+    max_wait: float = 0.01,
+    max_queue_size: int = 1024,
+    max_concurrency: int = 64,
+    speculative: bool = False,
+    disagreement_log: str = 'results/disagreements.jsonl',
+):
+    """
+    Serve OneShootAgent with a /solve endpoint and Prometheus metrics on /metrics.
+
+    Args:
+        model: Model identifier (e.g., anthropic/claude-sonnet-4-20250514)
+        base_url: Base URL for the model API
+        host: Interface to listen on
+        port: Port to listen on
+        max_batch_size: Maximum number of requests per micro-batch
+        max_wait: Maximum number of seconds a request waits for its batch to fill
+        max_queue_size: Maximum number of waiting requests before answering 503
+        max_concurrency: Maximum number of problems being solved at once
+        speculative: Whether to answer straight away with the exact solver, and
+            verify the answers with the model in the background
+        disagreement_log: In speculative mode, path of the JSON lines file the
+            answers the model disagrees with are appended to
+
+    Examples:
+        python serve_agent.py --model anthropic/claude-sonnet-4-20250514
+
+        curl -X POST localhost:8000/solve -d '{"problem": "Kai and Sofia start..."}'
+    """
+    agent = OneShootAgent(model=model, base_url=base_url)
+    if speculative:
+        agent = SpeculativeAgent(agent, disagreement_log=disagreement_log)
+    serve(
+        agent,
+        host=host,
+        port=port,
+        max_batch_size=max_batch_size,
+        max_wait=max_wait,
+        max_queue_size=max_queue_size,
+        max_concurrency=max_concurrency,
+    )
+
+
+if __name__ == '__main__':
+    fire.Fire(serve_one_shoot_agent)
@@ -0,0 +1,100 @@
+"""
+CLI script to triage the wrong answers stored by `evaluate_agent.py --triage`.
+
+    python scripts/triage_failures.py summary --by model,bucket
+    python scripts/triage_failures.py show --bucket ignored_current --limit 5
+    python scripts/triage_failures.py sql "SELECT buoy_angle, COUNT(*) FROM failures
+        WHERE bucket = 'sign_error' GROUP BY buoy_angle"
+"""
+
+import fire
+
+from beach_challenge_problem.triage import FailureStore
+
+
+def summary(
+    db: str = 'results/failures.sqlite',
+    by: str | tuple[str, ...] = 'bucket',
+    run: str | None = None,
+    model: str | None = None,
+):
+    """
+    Print the number of failures per group.
+
+    Args:
+        db: Path of the SQLite failure store
+        by: Columns to group by, e.g. model,bucket or bucket,error_band
+        run: Only count the failures of this run
+        model: Only count the failures of this model
+    """
+    if isinstance(by, str):
+        by = tuple(by.split(','))
+    conditions, params = _filters(run=run, model=model)
+    for row in FailureStore(db).count(by, where=conditions, params=params):
+        group = ' '.join(f'{row[column]!s:<22}' for column in by)
+        print(
+            f'{group} {row["n_failures"]:>8} '
+            f'{row["mean_relative_error"] or 0:>10.3f} {row["mean_latency"]:>8.2f} s'
+        )
+
+
+def show(
+    db: str = 'results/failures.sqlite',
+    bucket: str | None = None,
+    run: str | None = None,
+    model: str | None = None,
+    error_band: str | None = None,
+    limit: int = 10,
+):
+    """
+    Print the latest failures matching the filters, with the model reasoning.
+
+    Args:
+        db: Path of the SQLite failure store
+        bucket: Cause of the failure, e.g. sign_error or ignored_current
+        run: Name of the run
+        model: Model identifier
+        error_band: Relative error band, e.g. 5-10%
+        limit: Maximum number of failures shown
+    """
+    conditions, params = _filters(
+        bucket=bucket, run=run, model=model, error_band=error_band
+    )
+    rows = FailureStore(db).query(
+        f'SELECT * FROM failures WHERE {conditions} ORDER BY id DESC LIMIT ?',
+        (*params, limit),
+    )
+    for row in rows:
+        print(
+            f'[{row["bucket"]}] {row["model"]} item {row["dataset_item_id"]}: '
+            f'answered {row["answer"]}, expected {row["expected_output"]:.4f} '
+            f'({row["error_band"]}, {row["latency"]:.2f} s)'
+        )
+        print(row['input'])
+        if row['reasoning']:
+            print(f'Reasoning: {row["reasoning"]}')
+        if row['error']:
+            print(f'Error: {row["error"]}')
+        print('-' * 100)
+
+
+def sql(query: str, db: str = 'results/failures.sqlite'):
+    """
+    Print the rows returned by a SQL query on the failures table.
+
+    Args:
+        query: The SQL query
+        db: Path of the SQLite failure store
+    """
+    for row in FailureStore(db).query(query):
+        print(row)
+
+
+def _filters(**values: str | None) -> tuple[str, tuple]:
+    values = {column: value for column, value in values.items() if value is not None}
+    conditions = ' AND '.join(f'{column} = ?' for column in values) or '1'
+    return conditions, tuple(values.values())
+
+
+if __name__ == '__main__':
+    fire.Fire({'summary': summary, 'show': show, 'sql': sql})
@@ -4,5 +4,6 @@ Agent classes for solving the beach challenge problem.
 
 from .generic_agent import GenericAgent
 from .one_shoot_agent import OneShootAgent
+from .oracle_agent import OracleAgent
 
-__all__ = ['GenericAgent', 'OneShootAgent']
\ No newline at end of file
+__all__ = ['GenericAgent', 'OneShootAgent', 'OracleAgent']
\ No newline at end of file
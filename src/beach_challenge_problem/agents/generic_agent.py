@@ -2,13 +2,21 @@
 Abstract base class for problem-solving agents.
 """
 
+import asyncio
 from abc import ABC, abstractmethod
+from collections.abc import Callable
+from contextlib import nullcontext
 from typing import Optional, List
 
 from opik import Opik
 from opik.evaluation import evaluate
 
-from beach_challenge_problem.metrics import RelativeErrorMetric, WithinBoundsMetric
+from beach_challenge_problem.dashboard import EvaluationMonitor, live_dashboard
+from beach_challenge_problem.evaluation import ItemResult, evaluate_batched
+from beach_challenge_problem.incremental import evaluate_incremental
+from beach_challenge_problem.metrics import get_scoring_metrics
+from beach_challenge_problem.profiling import span
+from beach_challenge_problem.sequential import SequentialStopper, evaluate_sequential
 
 
 class GenericAgent(ABC):
@@ -29,6 +37,36 @@ class GenericAgent(ABC):
         """
         pass
     
+    async def get_answer_async(self, problem: str) -> float:
+        """
+        Async version of `get_answer`. By default, runs `get_answer` in a worker
+        thread. Agents with a native async call path should override it.
+
+        Args:
+            problem: The problem statement as a string
+
+        Returns:
+            The numeric answer as a float
+        """
+        return await asyncio.to_thread(self.get_answer, problem)
+
+    async def get_answers_async(
+        self, problems: list[str]
+    ) -> list[float | BaseException]:
+        """
+        Solves a batch of problems concurrently.
+
+        Args:
+            problems: The problem statements
+
+        Returns:
+            The answer to each problem, or the exception raised while solving it
+        """
+        return await asyncio.gather(
+            *(self.get_answer_async(problem) for problem in problems),
+            return_exceptions=True,
+        )
+
     @abstractmethod
     def get_params(self) -> dict:
         """
@@ -39,10 +77,27 @@ class GenericAgent(ABC):
         """
         pass
 
+    def get_experiment_config(self) -> dict:
+        """
+        Returns the configuration stored with the Opik experiments of the agent.
+        """
+        return {
+            'agent_type': self.__class__.__name__,
+            'agent_params': self.get_params(),
+        }
+
     def evaluate(
         self,
         dataset_name: str,
         dataset_item_ids: Optional[str | List[str]] = None,
+        task_threads: int = 1,
+        batched_upload: bool = False,
+        incremental: bool = False,
+        sequential: bool = False,
+        ci_width: float = 0.1,
+        baseline_accuracy: float | None = None,
+        on_result: Callable[[ItemResult], None] | None = None,
+        monitor: EvaluationMonitor | None = None,
     ):
         """
         Evaluates the agent on the given dataset using Opik.
@@ -50,37 +105,119 @@ class GenericAgent(ABC):
         Args:
             dataset_name: Name of the dataset to evaluate on
             dataset_item_ids: Optional list of specific dataset item IDs to evaluate
+            task_threads: Number of dataset items evaluated concurrently
+            batched_upload: Whether to upload the results to Opik in batches from a
+                background thread, so that a slow tracking server does not slow
+                down the model calls
+            incremental: Whether to only solve the items without a stored result
+                for the current agent parameters and BAML sources, and reuse the
+                stored results for the others
+            sequential: Whether to evaluate items in random order and stop as soon
+                as the accuracy on within_1_percent is known precisely enough
+            ci_width: In sequential mode, width of the 95% confidence interval of
+                the accuracy at which the evaluation stops
+            baseline_accuracy: In sequential mode, accuracy of a model to compare
+                against, treated as exact. The evaluation stops once an
+                anytime-valid test shows the accuracy differs from it
+            on_result: Callback called with each result as soon as it is ready.
+                Streaming results needs the local evaluation loop, so it implies
+                batched_upload unless another mode is chosen
+            monitor: Monitor shown as a live dashboard in the terminal during the
+                evaluation, also implying batched_upload
 
         Returns:
             The evaluation results from Opik
         """
+        experiment_config = self.get_experiment_config()
+        if isinstance(dataset_item_ids, str):
+            dataset_item_ids = [dataset_item_ids]
+
+        get_answer = self.get_answer
+        callbacks = [on_result] if on_result is not None else []
+        if monitor is not None:
+            get_answer = monitor.track(get_answer)
+            callbacks.append(monitor.on_result)
+            if monitor.n_items is None and dataset_item_ids is not None:
+                monitor.n_items = len(dataset_item_ids)
+
+        def emit(result: ItemResult) -> None:
+            for callback in callbacks:
+                callback(result)
+
+        streaming = {'on_result': emit} if callbacks else {}
+        if callbacks and not (sequential or incremental):
+            batched_upload = True
+
+        with live_dashboard(monitor) if monitor is not None else nullcontext():
+            if sequential:
+                stopper = SequentialStopper(
+                    ci_width=ci_width, baseline_accuracy=baseline_accuracy
+                )
+                evaluation = evaluate_sequential(
+                    get_answer=get_answer,
+                    dataset_name=dataset_name,
+                    experiment_config=experiment_config,
+                    stopper=stopper,
+                    dataset_item_ids=dataset_item_ids,
+                    task_threads=task_threads,
+                    **streaming,
+                )
+            elif incremental:
+                evaluation = evaluate_incremental(
+                    get_answer=get_answer,
+                    dataset_name=dataset_name,
+                    experiment_config=experiment_config,
+                    dataset_item_ids=dataset_item_ids,
+                    task_threads=task_threads,
+                    **streaming,
+                )
+            elif batched_upload:
+                evaluation = evaluate_batched(
+                    get_answer=get_answer,
+                    dataset_name=dataset_name,
+                    experiment_config=experiment_config,
+                    dataset_item_ids=dataset_item_ids,
+                    task_threads=task_threads,
+                    **streaming,
+                )
+            else:
+                evaluation = self._evaluate_with_opik(
+                    dataset_name, experiment_config, dataset_item_ids, task_threads
+                )
+
+        # Print and return the evaluation results
+        print(evaluation)
+        if sequential:
+            print(stopper.get_summary())
+        return evaluation
+
+    def _evaluate_with_opik(
+        self,
+        dataset_name: str,
+        experiment_config: dict,
+        dataset_item_ids: list[str] | None,
+        task_threads: int,
+    ):
         # Load the dataset from Opik
         client = Opik()
-        dataset = client.get_or_create_dataset(name=dataset_name)
+        with span('opik.get_dataset', dataset=dataset_name):
+            dataset = client.get_or_create_dataset(name=dataset_name)
 
         # Define the evaluation task
         def evaluation_task(x):
-            return {
-                'answer': self.get_answer(x['input']),
-            }
-
-        # Kick off the evaluation process
-        evaluation = evaluate(
-            dataset=dataset,
-            task=evaluation_task,
-            scoring_metrics=[
-                RelativeErrorMetric(name='relative_error'),
-                WithinBoundsMetric(tolerance=0.01, name='within_1_percent'),
-            ],
-            experiment_config={
-                'agent_type': self.__class__.__name__,
-                'agent_params': self.get_params(),
-            },
-            task_threads=1,
-            dataset_item_ids=[dataset_item_ids] if isinstance(dataset_item_ids, str) else dataset_item_ids,
-        )
+            with span('evaluate.task'):
+                return {
+                    'answer': self.get_answer(x['input']),
+                }
 
-        # Print and return the evaluation results
-        # breakpoint()
-        print(evaluation)
-        return evaluation
+        # Kick off the evaluation process. Opik logs traces and scores and flushes
+        # them to the server inside this span.
+        with span('opik.evaluate'):
+            return evaluate(
+                dataset=dataset,
+                task=evaluation_task,
+                scoring_metrics=get_scoring_metrics(),
+                experiment_config=experiment_config,
+                task_threads=task_threads,
+                dataset_item_ids=dataset_item_ids,
+            )
@@ -3,15 +3,80 @@ The easiest agentic workflow, with a single LLM being called once.
 One-shoot attempt to solve the problem.
 """
 
+import asyncio
 import os
+import re
+import threading
+from collections import OrderedDict
 from typing import Literal
 
-from baml_py import ClientRegistry
+from baml_py import ClientRegistry, Collector
 from loguru import logger
 
 from beach_challenge_problem.baml_client import b
+from beach_challenge_problem.baml_client.async_client import b as async_b
 from beach_challenge_problem.baml_client.types import ProblemSolution
 from beach_challenge_problem.agents.generic_agent import GenericAgent
+from beach_challenge_problem.coalescing import (
+    get_coalescer,
+    get_parallel_slots,
+    warm_up_model,
+)
+from beach_challenge_problem.hedging import HedgingPolicy, hedged_call
+from beach_challenge_problem.problem import Problem
+from beach_challenge_problem.profiling import profiler, span
+from beach_challenge_problem.rate_limiter import get_rate_limiter
+
+# Number of recent reasonings kept for `OneShootAgent.get_reasoning`
+MAX_KEPT_REASONINGS = 10_000
+
+# A bare number, optionally with a label, bold markers, units or a final period
+_ANSWER_PATTERN = re.compile(
+    r'(?:(?:final\s+)?answer\s*[:=]\s*)?\**\s*'
+    r'([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?)'
+    r'\s*\**\s*(?:km)?\s*\.?',
+    re.IGNORECASE,
+)
+
+
+def parse_answer(text: str) -> float:
+    """
+    Extracts the numeric answer from a reply of SolveProblemAnswerOnly. Bare numbers
+    are read with a regex, anything else goes through BAML's parser.
+
+    Raises:
+        BamlValidationError: If no number can be extracted from the reply
+    """
+    match = _ANSWER_PATTERN.fullmatch(text.strip())
+    if match is not None:
+        return float(match.group(1))
+    return b.parse.ExtractAnswer(text)
+
+
+def get_cache_tokens(collector: Collector) -> tuple[int, int]:
+    """
+    Returns the number of prompt tokens read from and written to the prompt cache of
+    the provider by the last call of a collector. BAML does not expose them, so they
+    are read from the raw responses: Anthropic reports cache reads and writes,
+    OpenAI-compatible providers only report cache reads.
+    """
+    log = collector.last
+    if log is None:
+        return 0, 0
+
+    read = written = 0
+    for call in log.calls:
+        response = call.http_response
+        if response is None:
+            continue
+        try:
+            usage = response.body.json().get('usage') or {}
+        except ValueError:
+            continue
+        read += usage.get('cache_read_input_tokens') or 0
+        read += (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+        written += usage.get('cache_creation_input_tokens') or 0
+    return read, written
 
 
 class OneShootAgent(GenericAgent):
@@ -19,29 +84,137 @@ class OneShootAgent(GenericAgent):
     Tries to solve the problem with just one call to a (hopefully good) LLM.
     """
 
-    def __init__(self, model: str, base_url: str | None = 'http://localhost:11434/v1'):
+    def __init__(
+        self,
+        model: str,
+        base_url: str | None = 'http://localhost:11434/v1',
+        requests_per_second: float = 10.0,
+        max_retries: int = 5,
+        hedge: bool = False,
+        hedge_model: str | None = None,
+        hedge_budget: float = 0.05,
+        compact_prompt: bool = False,
+        max_reasoning_words: int = 150,
+        max_output_tokens: int | None = None,
+        answer_only: bool = False,
+        coalesce: bool = False,
+        parallel_slots: int | None = None,
+        prompt_cache: bool = True,
+    ):
+        """
+        Args:
+            model: Model identifier as provider/name, e.g. anthropic/claude-sonnet-4-20250514
+            base_url: Base URL for openai-generic providers
+            requests_per_second: Initial request rate, adapted to the provider's limits.
+                `math.inf` disables the rate limiting
+            max_retries: Maximum number of retries for rate-limited or failed requests
+            hedge: Whether to send a duplicate request when the LLM is slower than p95
+            hedge_model: Model identifier (provider/name) or BAML client name (e.g.
+                CustomFast) used for hedged requests. Defaults to `model`
+            hedge_budget: Maximum ratio of hedged requests to primary requests
+            compact_prompt: Whether to send a parameter-only version of the problem
+                and ask for a short reasoning (SolveProblemCompact)
+            max_reasoning_words: Reasoning length requested with the compact prompt
+            max_output_tokens: Maximum number of tokens the LLM can generate
+            answer_only: Whether to ask for the number only, without reasoning
+                (SolveProblemAnswerOnly). Combines with `compact_prompt`
+            coalesce: Whether to send at most `parallel_slots` requests at once to
+                `base_url` and to send identical concurrent prompts only once, for
+                models served locally
+            parallel_slots: Number of requests the server decodes in parallel.
+                Defaults to `OLLAMA_NUM_PARALLEL`, or Ollama's default
+            prompt_cache: Whether to let Anthropic cache the static instructions
+                that start the prompts. Prompts shorter than the minimum cacheable
+                length of the model are never cached
+        """
 
         logger.info(f'Initializing OneShootAgent with model {model} and base_url {base_url}')
         self.model = model
         self.base_url = base_url
+        self.max_retries = max_retries
+        self.compact_prompt = compact_prompt
+        self.max_reasoning_words = max_reasoning_words
+        self.max_output_tokens = max_output_tokens
+        self.answer_only = answer_only
+        self.prompt_cache = prompt_cache
         model_provider, model_name = model.split('/')
 
+        # Shared by all agents calling the same provider
+        self._rate_limiter = get_rate_limiter(
+            model_provider, rate=requests_per_second
+        )
+
         logger.info(f'Initializing client registry for {model_provider} {model_name}')
         self._client_registry = self._init_client_registry(
-            model_provider, model_name, base_url
+            model_provider, model_name, base_url, max_output_tokens, prompt_cache
         )
         logger.info('Client registry initialized')
 
+        self._usage = {
+            'n_calls': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cache_read_tokens': 0,
+            'cache_write_tokens': 0,
+        }
+        self._usage_lock = threading.Lock()
+        self._reasonings: OrderedDict[str, str] = OrderedDict()
+        self._reasonings_lock = threading.Lock()
+
+        self.hedge = hedge
+        self.hedge_model = hedge_model
+        self._hedging_policy = HedgingPolicy(budget=hedge_budget) if hedge else None
+        if hedge:
+            self._hedge_client_registry, self._hedge_rate_limiter = (
+                self._init_hedge_client(hedge_model, base_url)
+            )
+
+        self.coalesce = coalesce
+        self._coalescer = None
+        if coalesce:
+            # Shared by all agents calling the same server, whatever their model
+            self._coalescer = get_coalescer(
+                base_url, max_in_flight=parallel_slots or get_parallel_slots()
+            )
+
+    def _init_hedge_client(self, hedge_model: str | None, base_url: str | None):
+        """
+        Initializes the client registry and rate limiter used for hedged requests.
+        """
+        if hedge_model is None:
+            return self._client_registry, self._rate_limiter
+
+        if '/' in hedge_model:
+            model_provider, model_name = hedge_model.split('/')
+            cr = self._init_client_registry(
+                model_provider,
+                model_name,
+                base_url,
+                self.max_output_tokens,
+                self.prompt_cache,
+            )
+            return cr, get_rate_limiter(model_provider)
+
+        # A client defined in clients.baml, e.g. the CustomFast round-robin pool
+        cr = ClientRegistry()
+        cr.set_primary(hedge_model)
+        return cr, get_rate_limiter(hedge_model)
+
     @staticmethod
     def _init_client_registry(
         model_provider: Literal['anthropic', 'openai-generic'],
         model_name: str,
         base_url: str | None = 'http://localhost:11434/v1',
+        max_output_tokens: int | None = None,
+        prompt_cache: bool = True,
     ) -> ClientRegistry:
         """
         Initializes the client registry for the given model.
         """
         cr = ClientRegistry()
+        extra_options = (
+            {'max_tokens': max_output_tokens} if max_output_tokens is not None else {}
+        )
 
         if model_provider == 'anthropic':
             cr.add_llm_client(
@@ -51,6 +224,13 @@ class OneShootAgent(GenericAgent):
                     'model': model_name,
                     'temperature': 0.0,
                     'api_key': os.environ.get('ANTHROPIC_API_KEY'),
+                    # Keeps the cache breakpoints of the prompts
+                    **(
+                        {'allowed_role_metadata': ['cache_control']}
+                        if prompt_cache
+                        else {}
+                    ),
+                    **extra_options,
                 },
             )
 
@@ -62,6 +242,7 @@ class OneShootAgent(GenericAgent):
                     'model': model_name,
                     'temperature': 0.0,
                     'base_url': base_url,
+                    **extra_options,
                 },
             )
 
@@ -71,20 +252,185 @@ class OneShootAgent(GenericAgent):
         cr.set_primary('MyDynamicClient')
         return cr
 
+    def warm_up(self, keep_alive: str | int = '30m') -> None:
+        """
+        Loads the model on the Ollama server at `base_url` before a run, and keeps it
+        loaded for `keep_alive` after the last request.
+        """
+        warm_up_model(self.base_url, self.model.split('/')[1], keep_alive=keep_alive)
+
+    def _get_request_key(self, problem: str) -> tuple:
+        # Agents with other prompt settings send other prompts for the same problem
+        return self.model, tuple(sorted(self.get_params().items())), problem
+
     def get_answer(self, problem: str) -> float:
         """
         Solves the problem using the configured LLM.
         """
-        output: ProblemSolution = b.SolveProblem(problem, {'client_registry': self._client_registry})
+        if self._coalescer is not None:
+            return self._coalescer.call(
+                self._get_request_key(problem), lambda: self._get_answer(problem)
+            )
+        return self._get_answer(problem)
+
+    def _get_answer(self, problem: str) -> float:
+        with span('agent.get_answer', model=self.model):
+            if self.hedge:
+                return asyncio.run(self._get_answer_hedged(problem))
+
+            output: ProblemSolution = self._rate_limiter.call(
+                lambda collector: self._solve(
+                    b, problem, self._client_registry, collector
+                ),
+                max_retries=self.max_retries,
+            )
+            return self._keep_reasoning(problem, output)
+
+    def _solve(self, client, problem: str, client_registry, collector: Collector):
+        """
+        Calls the BAML function matching the prompt settings of the agent, with the
+        sync or async BAML client.
+        """
+        baml_options = {'client_registry': client_registry, 'collector': collector}
+
+        with span('agent.compact_prompt'):
+            parsed = Problem.from_question(problem) if self.compact_prompt else None
+        if self.answer_only:
+            question = problem if parsed is None else parsed.get_compact_question()
+            output = client.SolveProblemAnswerOnly(question, baml_options)
+        elif parsed is None:
+            output = client.SolveProblem(problem, baml_options)
+        else:
+            output = client.SolveProblemCompact(
+                parsed.get_compact_question(), self.max_reasoning_words, baml_options
+            )
+
+        if asyncio.iscoroutine(output):
+            return self._finish_async(output, collector)
+        return self._finish(output, collector)
+
+    def _finish(self, output: ProblemSolution | str, collector: Collector):
+        self._record_usage(collector)
+        if isinstance(output, str):
+            # Raw reply of SolveProblemAnswerOnly
+            with span('agent.parse_answer'):
+                return ProblemSolution(reasoning='', answer=parse_answer(output))
+        return output
+
+    async def _finish_async(self, output, collector: Collector):
+        return self._finish(await output, collector)
+
+    def _record_usage(self, collector: Collector) -> None:
+        profiler.add_baml_spans(collector)
+
+        usage = collector.usage
+        cache_read, cache_write = get_cache_tokens(collector)
+        with self._usage_lock:
+            self._usage['n_calls'] += 1
+            self._usage['input_tokens'] += usage.input_tokens or 0
+            self._usage['output_tokens'] += usage.output_tokens or 0
+            self._usage['cache_read_tokens'] += cache_read
+            self._usage['cache_write_tokens'] += cache_write
+
+    def get_token_usage(self) -> dict:
+        """
+        Returns the number of LLM calls and tokens used by the agent so far. With
+        Anthropic, input tokens exclude the tokens read from or written to the cache.
+        """
+        with self._usage_lock:
+            return dict(self._usage)
+
+    async def get_answer_async(self, problem: str) -> float:
+        """
+        Solves the problem using the async BAML client.
+        """
+        if self._coalescer is not None:
+            return await self._coalescer.call_async(
+                self._get_request_key(problem),
+                lambda: self._get_answer_async(problem),
+            )
+        return await self._get_answer_async(problem)
+
+    async def _get_answer_async(self, problem: str) -> float:
+        with span('agent.get_answer_async', model=self.model):
+            if self.hedge:
+                return await self._get_answer_hedged(problem)
+
+            output: ProblemSolution = await self._rate_limiter.call_async(
+                lambda collector: self._solve(
+                    async_b, problem, self._client_registry, collector
+                ),
+                max_retries=self.max_retries,
+            )
+            return self._keep_reasoning(problem, output)
+
+    async def _get_answer_hedged(self, problem: str) -> float:
+        """
+        Solves the problem, racing a hedged request against slow primary requests.
+        """
+
+        def solve(client_registry, rate_limiter):
+            return lambda: rate_limiter.call_async(
+                lambda collector: self._solve(
+                    async_b, problem, client_registry, collector
+                ),
+                max_retries=self.max_retries,
+            )
+
+        output: ProblemSolution = await hedged_call(
+            primary=solve(self._client_registry, self._rate_limiter),
+            hedge=solve(self._hedge_client_registry, self._hedge_rate_limiter),
+            policy=self._hedging_policy,
+        )
+        return self._keep_reasoning(problem, output)
+
+    def _keep_reasoning(self, problem: str, output: ProblemSolution) -> float:
+        with self._reasonings_lock:
+            self._reasonings[problem] = output.reasoning
+            self._reasonings.move_to_end(problem)
+            if len(self._reasonings) > MAX_KEPT_REASONINGS:
+                self._reasonings.popitem(last=False)
         return output.answer
-    
+
+    def get_reasoning(self, problem: str) -> str | None:
+        """
+        Returns the reasoning of the last answer to the problem, if it is among the
+        `MAX_KEPT_REASONINGS` last problems solved.
+        """
+        with self._reasonings_lock:
+            return self._reasonings.get(problem)
+
+    def get_hedging_metrics(self) -> dict | None:
+        """
+        Returns the hedging counters, or None if hedging is disabled.
+        """
+        if self._hedging_policy is None:
+            return None
+        return self._hedging_policy.get_metrics()
+
+    def get_coalescing_metrics(self) -> dict | None:
+        """
+        Returns the coalescing counters, or None if coalescing is disabled.
+        """
+        if self._coalescer is None:
+            return None
+        return self._coalescer.get_metrics()
+
     def get_params(self) -> dict:
         """
         Returns the parameters of the agent.
         """
-        return {
+        params = {
             'model': self.model,
         }
+        if self.compact_prompt:
+            params['compact_prompt'] = True
+            params['max_reasoning_words'] = self.max_reasoning_words
+        if self.max_output_tokens is not None:
+            params['max_output_tokens'] = self.max_output_tokens
+        if self.answer_only:
+            params['answer_only'] = True
+        return params
 
 
 def run():
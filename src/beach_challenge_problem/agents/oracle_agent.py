@@ -0,0 +1,71 @@
+"""
+Solver for problems following the question templates, without any LLM. Useful as
+a high-QPS oracle behind the serving endpoint and as a fast draft agent.
+
+Only the templates that state every parameter, e.g. 'explicit_turn_time' and
+'compact', determine the answer. The other ones say that Kai turns after 1 hour,
+while generated problems turn after 1 or 2 hours, so answers to their questions
+are only right for half of a generated dataset and cannot serve as ground truth.
+"""
+
+from pathlib import Path
+
+from beach_challenge_problem.agents.generic_agent import GenericAgent
+from beach_challenge_problem.answer_index import AnswerIndex
+from beach_challenge_problem.templates import TEMPLATES
+
+
+class OracleAgent(GenericAgent):
+    """
+    Answers problems phrased with a registered template from a precomputed
+    answer index, and solves the ones off the index grid with
+    `calculate_final_distance`.
+    """
+
+    def __init__(self, index_path: str | Path | None = None, approximate: bool = False):
+        """
+        Args:
+            index_path: Path of an index written by `AnswerIndex.save`. Defaults to
+                building the index in memory
+            approximate: Whether to also answer questions of templates with fixed
+                parameters, assuming the values the question states, e.g. for
+                draft answers that are verified anyway
+        """
+        self.index_path = index_path
+        self.approximate = approximate
+        self.index = AnswerIndex.load(index_path) if index_path else AnswerIndex.build()
+
+    def get_answer(self, problem: str) -> float:
+        """
+        Returns the answer to the problem, for the parameters its question states.
+
+        Raises:
+            ValueError: If the problem follows none of the question templates, or
+                follows a template with fixed parameters and the agent is not
+                approximate
+        """
+        parsed = TEMPLATES.parse(problem)
+        if parsed is None:
+            raise ValueError('The problem follows none of the question templates')
+        name, parsed = parsed
+        if not self.approximate and TEMPLATES.get(name).fixed_params:
+            raise ValueError(
+                f'Template {name} fixes {sorted(TEMPLATES.get(name).fixed_params)}, '
+                'which may differ from the problem, so the answer is not determined'
+            )
+
+        answer = self.index.lookup(parsed.get_params())
+        return answer if answer is not None else parsed.get_correct_answer()
+
+    async def get_answer_async(self, problem: str) -> float:
+        # No I/O, so no need for a worker thread
+        return self.get_answer(problem)
+
+    def get_params(self) -> dict:
+        """
+        Returns the parameters of the agent.
+        """
+        return {
+            'index_path': str(self.index_path) if self.index_path else None,
+            'approximate': self.approximate,
+        }
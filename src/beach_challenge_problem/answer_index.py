@@ -0,0 +1,139 @@
+"""
+Precomputed answers for every problem on the integer parameter grid that
+`ProblemGenerator` samples from.
+
+The grid has about 10^5 points, so the answers fit in a dense float64 array of
+under 1 MB, indexed by the offset of each parameter from the start of its range.
+The array is saved as .npy and memory-mapped, so answering a templated problem is
+one array read after parsing the question.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from beach_challenge_problem.problem import (
+    PARAMETER_NAMES,
+    ProblemBatch,
+    ProblemGenerator,
+)
+from beach_challenge_problem.templates import TEMPLATES
+
+
+def get_generator_ranges(generator: ProblemGenerator) -> list[tuple[int, int]]:
+    """
+    Returns the inclusive integer range of each parameter, in the order of
+    `PARAMETER_NAMES`.
+    """
+    return [
+        tuple(generator.buoy_offshore_distance_range),
+        tuple(generator.buoy_angle_range),
+        tuple(generator.sofia_speed_range),
+        tuple(generator.ocean_current_speed_range),
+        tuple(generator.kai_initial_speed_range),
+        tuple(generator.kai_change_direction_time_range),
+        tuple(generator.kai_final_speed_range),
+        tuple(generator.time_range),
+    ]
+
+
+class AnswerIndex:
+    """
+    Dense array of answers over an integer parameter grid.
+    """
+
+    def __init__(self, ranges: list[tuple[int, int]], answers: np.ndarray):
+        """
+        Args:
+            ranges: Inclusive integer range of each parameter
+            answers: Answers with one axis per parameter, of size high - low + 1
+        """
+        self.ranges = [tuple(map(int, r)) for r in ranges]
+        self.answers = answers
+        self._low = np.array([low for low, _ in self.ranges])
+        self._shape = np.array([high - low + 1 for low, high in self.ranges])
+        self._strides = np.array(
+            [int(np.prod(self._shape[i + 1 :])) for i in range(len(self._shape))]
+        )
+        self._flat = answers.reshape(-1)
+        # Plain Python ints keep the scalar lookup free of NumPy overhead
+        self._scalar_layout = list(
+            zip(
+                self._low.tolist(),
+                self._shape.tolist(),
+                self._strides.tolist(),
+                strict=True,
+            )
+        )
+
+    @classmethod
+    def build(cls, generator: ProblemGenerator | None = None) -> 'AnswerIndex':
+        """
+        Solves every problem on the grid of the generator.
+        """
+        ranges = get_generator_ranges(generator or ProblemGenerator())
+        axes = [np.arange(low, high + 1) for low, high in ranges]
+        grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+        answers = ProblemBatch(grid.reshape(-1, len(ranges))).get_correct_answers()
+        return cls(ranges, answers.reshape(grid.shape[:-1]))
+
+    def save(self, path: str | Path) -> Path:
+        """
+        Writes the answers to a .npy file, and the ranges to a .json file next to it.
+        """
+        path = Path(path).with_suffix('.npy')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path, self.answers)
+        path.with_suffix('.json').write_text(
+            json.dumps({'parameters': list(PARAMETER_NAMES), 'ranges': self.ranges})
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> 'AnswerIndex':
+        """
+        Memory-maps an index written by `save`.
+        """
+        path = Path(path).with_suffix('.npy')
+        meta = json.loads(path.with_suffix('.json').read_text())
+        if tuple(meta['parameters']) != PARAMETER_NAMES:
+            raise ValueError(f'Index {path} was built for other parameters')
+        return cls(meta['ranges'], np.load(path, mmap_mode='r'))
+
+    def lookup(self, params: tuple[float, ...]) -> float | None:
+        """
+        Returns the answer for the given parameters, in the order of
+        `PARAMETER_NAMES`, or None if they are not on the grid.
+        """
+        index = 0
+        for value, (low, size, stride) in zip(params, self._scalar_layout, strict=True):
+            offset = int(value) - low
+            if offset != value - low or not 0 <= offset < size:
+                return None
+            index += offset * stride
+        return self._flat.item(index)
+
+    def lookup_batch(self, batch: ProblemBatch) -> np.ndarray:
+        """
+        Returns the answers of a batch of problems, NaN for problems off the grid.
+        """
+        offsets = batch.params - self._low
+        on_grid = np.all(
+            (offsets == np.round(offsets)) & (offsets >= 0) & (offsets < self._shape),
+            axis=1,
+        )
+        answers = np.full(len(batch), np.nan)
+        flat_index = offsets[on_grid].astype(np.int64) @ self._strides
+        answers[on_grid] = self._flat[flat_index]
+        return answers
+
+    def lookup_question(self, question: str) -> float | None:
+        """
+        Returns the answer to a question following a template that states every
+        parameter, or None if it cannot be parsed or is not on the grid. Questions
+        of templates with fixed parameters, e.g. the original one, are not
+        answered: the turn time they state is not always the one of their problem.
+        """
+        parsed = TEMPLATES.parse(question, TEMPLATES.names(complete=True))
+        return self.lookup(parsed[1].get_params()) if parsed is not None else None
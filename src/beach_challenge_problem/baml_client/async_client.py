@@ -73,6 +73,13 @@ class BamlAsyncClient:
     def parse_stream(self):
       return self.__llm_stream_parser
     
+    async def ExtractAnswer(self, text: str,
+        baml_options: BamlCallOptions = {},
+    ) -> float:
+        result = await self.__options.merge_options(baml_options).call_function_async(function_name="ExtractAnswer", args={
+            "text": text,
+        })
+        return typing.cast(float, result.cast_to(types, types, stream_types, False, __runtime__))
     async def SolveProblem(self, problem: str,
         baml_options: BamlCallOptions = {},
     ) -> types.ProblemSolution:
@@ -80,6 +87,20 @@ class BamlAsyncClient:
             "problem": problem,
         })
         return typing.cast(types.ProblemSolution, result.cast_to(types, types, stream_types, False, __runtime__))
+    async def SolveProblemAnswerOnly(self, problem: str,
+        baml_options: BamlCallOptions = {},
+    ) -> str:
+        result = await self.__options.merge_options(baml_options).call_function_async(function_name="SolveProblemAnswerOnly", args={
+            "problem": problem,
+        })
+        return typing.cast(str, result.cast_to(types, types, stream_types, False, __runtime__))
+    async def SolveProblemCompact(self, problem: str,max_reasoning_words: int,
+        baml_options: BamlCallOptions = {},
+    ) -> types.ProblemSolution:
+        result = await self.__options.merge_options(baml_options).call_function_async(function_name="SolveProblemCompact", args={
+            "problem": problem,"max_reasoning_words": max_reasoning_words,
+        })
+        return typing.cast(types.ProblemSolution, result.cast_to(types, types, stream_types, False, __runtime__))
     
 
 
@@ -89,6 +110,18 @@ class BamlStreamClient:
     def __init__(self, options: DoNotUseDirectlyCallManager):
         self.__options = options
 
+    def ExtractAnswer(self, text: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.BamlStream[float, float]:
+        ctx, result = self.__options.merge_options(baml_options).create_async_stream(function_name="ExtractAnswer", args={
+            "text": text,
+        })
+        return baml_py.BamlStream[float, float](
+          result,
+          lambda x: typing.cast(float, x.cast_to(types, types, stream_types, True, __runtime__)),
+          lambda x: typing.cast(float, x.cast_to(types, types, stream_types, False, __runtime__)),
+          ctx,
+        )
     def SolveProblem(self, problem: str,
         baml_options: BamlCallOptions = {},
     ) -> baml_py.BamlStream[stream_types.ProblemSolution, types.ProblemSolution]:
@@ -101,6 +134,30 @@ class BamlStreamClient:
           lambda x: typing.cast(types.ProblemSolution, x.cast_to(types, types, stream_types, False, __runtime__)),
           ctx,
         )
+    def SolveProblemAnswerOnly(self, problem: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.BamlStream[str, str]:
+        ctx, result = self.__options.merge_options(baml_options).create_async_stream(function_name="SolveProblemAnswerOnly", args={
+            "problem": problem,
+        })
+        return baml_py.BamlStream[str, str](
+          result,
+          lambda x: typing.cast(str, x.cast_to(types, types, stream_types, True, __runtime__)),
+          lambda x: typing.cast(str, x.cast_to(types, types, stream_types, False, __runtime__)),
+          ctx,
+        )
+    def SolveProblemCompact(self, problem: str,max_reasoning_words: int,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.BamlStream[stream_types.ProblemSolution, types.ProblemSolution]:
+        ctx, result = self.__options.merge_options(baml_options).create_async_stream(function_name="SolveProblemCompact", args={
+            "problem": problem,"max_reasoning_words": max_reasoning_words,
+        })
+        return baml_py.BamlStream[stream_types.ProblemSolution, types.ProblemSolution](
+          result,
+          lambda x: typing.cast(stream_types.ProblemSolution, x.cast_to(types, types, stream_types, True, __runtime__)),
+          lambda x: typing.cast(types.ProblemSolution, x.cast_to(types, types, stream_types, False, __runtime__)),
+          ctx,
+        )
     
 
 class BamlHttpRequestClient:
@@ -109,6 +166,13 @@ class BamlHttpRequestClient:
     def __init__(self, options: DoNotUseDirectlyCallManager):
         self.__options = options
 
+    async def ExtractAnswer(self, text: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = await self.__options.merge_options(baml_options).create_http_request_async(function_name="ExtractAnswer", args={
+            "text": text,
+        }, mode="request")
+        return result
     async def SolveProblem(self, problem: str,
         baml_options: BamlCallOptions = {},
     ) -> baml_py.baml_py.HTTPRequest:
@@ -116,6 +180,20 @@ class BamlHttpRequestClient:
             "problem": problem,
         }, mode="request")
         return result
+    async def SolveProblemAnswerOnly(self, problem: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = await self.__options.merge_options(baml_options).create_http_request_async(function_name="SolveProblemAnswerOnly", args={
+            "problem": problem,
+        }, mode="request")
+        return result
+    async def SolveProblemCompact(self, problem: str,max_reasoning_words: int,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = await self.__options.merge_options(baml_options).create_http_request_async(function_name="SolveProblemCompact", args={
+            "problem": problem,"max_reasoning_words": max_reasoning_words,
+        }, mode="request")
+        return result
     
 
 class BamlHttpStreamRequestClient:
@@ -124,6 +202,13 @@ class BamlHttpStreamRequestClient:
     def __init__(self, options: DoNotUseDirectlyCallManager):
         self.__options = options
 
+    async def ExtractAnswer(self, text: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = await self.__options.merge_options(baml_options).create_http_request_async(function_name="ExtractAnswer", args={
+            "text": text,
+        }, mode="stream")
+        return result
     async def SolveProblem(self, problem: str,
         baml_options: BamlCallOptions = {},
     ) -> baml_py.baml_py.HTTPRequest:
@@ -131,6 +216,20 @@ class BamlHttpStreamRequestClient:
             "problem": problem,
         }, mode="stream")
         return result
+    async def SolveProblemAnswerOnly(self, problem: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = await self.__options.merge_options(baml_options).create_http_request_async(function_name="SolveProblemAnswerOnly", args={
+            "problem": problem,
+        }, mode="stream")
+        return result
+    async def SolveProblemCompact(self, problem: str,max_reasoning_words: int,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = await self.__options.merge_options(baml_options).create_http_request_async(function_name="SolveProblemCompact", args={
+            "problem": problem,"max_reasoning_words": max_reasoning_words,
+        }, mode="stream")
+        return result
     
 
 b = BamlAsyncClient(DoNotUseDirectlyCallManager({}))
\ No newline at end of file
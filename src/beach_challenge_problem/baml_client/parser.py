@@ -22,12 +22,30 @@ class LlmResponseParser:
     def __init__(self, options: DoNotUseDirectlyCallManager):
         self.__options = options
 
+    def ExtractAnswer(
+        self, llm_response: str, baml_options: BamlCallOptions = {},
+    ) -> float:
+        result = self.__options.merge_options(baml_options).parse_response(function_name="ExtractAnswer", llm_response=llm_response, mode="request")
+        return typing.cast(float, result)
+
     def SolveProblem(
         self, llm_response: str, baml_options: BamlCallOptions = {},
     ) -> types.ProblemSolution:
         result = self.__options.merge_options(baml_options).parse_response(function_name="SolveProblem", llm_response=llm_response, mode="request")
         return typing.cast(types.ProblemSolution, result)
 
+    def SolveProblemAnswerOnly(
+        self, llm_response: str, baml_options: BamlCallOptions = {},
+    ) -> str:
+        result = self.__options.merge_options(baml_options).parse_response(function_name="SolveProblemAnswerOnly", llm_response=llm_response, mode="request")
+        return typing.cast(str, result)
+
+    def SolveProblemCompact(
+        self, llm_response: str, baml_options: BamlCallOptions = {},
+    ) -> types.ProblemSolution:
+        result = self.__options.merge_options(baml_options).parse_response(function_name="SolveProblemCompact", llm_response=llm_response, mode="request")
+        return typing.cast(types.ProblemSolution, result)
+
     
 
 class LlmStreamParser:
@@ -36,10 +54,28 @@ class LlmStreamParser:
     def __init__(self, options: DoNotUseDirectlyCallManager):
         self.__options = options
 
+    def ExtractAnswer(
+        self, llm_response: str, baml_options: BamlCallOptions = {},
+    ) -> float:
+        result = self.__options.merge_options(baml_options).parse_response(function_name="ExtractAnswer", llm_response=llm_response, mode="stream")
+        return typing.cast(float, result)
+
     def SolveProblem(
         self, llm_response: str, baml_options: BamlCallOptions = {},
     ) -> stream_types.ProblemSolution:
         result = self.__options.merge_options(baml_options).parse_response(function_name="SolveProblem", llm_response=llm_response, mode="stream")
         return typing.cast(stream_types.ProblemSolution, result)
 
+    def SolveProblemAnswerOnly(
+        self, llm_response: str, baml_options: BamlCallOptions = {},
+    ) -> str:
+        result = self.__options.merge_options(baml_options).parse_response(function_name="SolveProblemAnswerOnly", llm_response=llm_response, mode="stream")
+        return typing.cast(str, result)
+
+    def SolveProblemCompact(
+        self, llm_response: str, baml_options: BamlCallOptions = {},
+    ) -> stream_types.ProblemSolution:
+        result = self.__options.merge_options(baml_options).parse_response(function_name="SolveProblemCompact", llm_response=llm_response, mode="stream")
+        return typing.cast(stream_types.ProblemSolution, result)
+
     
\ No newline at end of file
@@ -85,6 +85,13 @@ class BamlSyncClient:
     def parse_stream(self):
       return self.__llm_stream_parser
     
+    def ExtractAnswer(self, text: str,
+        baml_options: BamlCallOptions = {},
+    ) -> float:
+        result = self.__options.merge_options(baml_options).call_function_sync(function_name="ExtractAnswer", args={
+            "text": text,
+        })
+        return typing.cast(float, result.cast_to(types, types, stream_types, False, __runtime__))
     def SolveProblem(self, problem: str,
         baml_options: BamlCallOptions = {},
     ) -> types.ProblemSolution:
@@ -92,6 +99,20 @@ class BamlSyncClient:
             "problem": problem,
         })
         return typing.cast(types.ProblemSolution, result.cast_to(types, types, stream_types, False, __runtime__))
+    def SolveProblemAnswerOnly(self, problem: str,
+        baml_options: BamlCallOptions = {},
+    ) -> str:
+        result = self.__options.merge_options(baml_options).call_function_sync(function_name="SolveProblemAnswerOnly", args={
+            "problem": problem,
+        })
+        return typing.cast(str, result.cast_to(types, types, stream_types, False, __runtime__))
+    def SolveProblemCompact(self, problem: str,max_reasoning_words: int,
+        baml_options: BamlCallOptions = {},
+    ) -> types.ProblemSolution:
+        result = self.__options.merge_options(baml_options).call_function_sync(function_name="SolveProblemCompact", args={
+            "problem": problem,"max_reasoning_words": max_reasoning_words,
+        })
+        return typing.cast(types.ProblemSolution, result.cast_to(types, types, stream_types, False, __runtime__))
     
 
 
@@ -101,6 +122,18 @@ class BamlStreamClient:
     def __init__(self, options: DoNotUseDirectlyCallManager):
         self.__options = options
 
+    def ExtractAnswer(self, text: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.BamlSyncStream[float, float]:
+        ctx, result = self.__options.merge_options(baml_options).create_sync_stream(function_name="ExtractAnswer", args={
+            "text": text,
+        })
+        return baml_py.BamlSyncStream[float, float](
+          result,
+          lambda x: typing.cast(float, x.cast_to(types, types, stream_types, True, __runtime__)),
+          lambda x: typing.cast(float, x.cast_to(types, types, stream_types, False, __runtime__)),
+          ctx,
+        )
     def SolveProblem(self, problem: str,
         baml_options: BamlCallOptions = {},
     ) -> baml_py.BamlSyncStream[stream_types.ProblemSolution, types.ProblemSolution]:
@@ -113,6 +146,30 @@ class BamlStreamClient:
           lambda x: typing.cast(types.ProblemSolution, x.cast_to(types, types, stream_types, False, __runtime__)),
           ctx,
         )
+    def SolveProblemAnswerOnly(self, problem: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.BamlSyncStream[str, str]:
+        ctx, result = self.__options.merge_options(baml_options).create_sync_stream(function_name="SolveProblemAnswerOnly", args={
+            "problem": problem,
+        })
+        return baml_py.BamlSyncStream[str, str](
+          result,
+          lambda x: typing.cast(str, x.cast_to(types, types, stream_types, True, __runtime__)),
+          lambda x: typing.cast(str, x.cast_to(types, types, stream_types, False, __runtime__)),
+          ctx,
+        )
+    def SolveProblemCompact(self, problem: str,max_reasoning_words: int,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.BamlSyncStream[stream_types.ProblemSolution, types.ProblemSolution]:
+        ctx, result = self.__options.merge_options(baml_options).create_sync_stream(function_name="SolveProblemCompact", args={
+            "problem": problem,"max_reasoning_words": max_reasoning_words,
+        })
+        return baml_py.BamlSyncStream[stream_types.ProblemSolution, types.ProblemSolution](
+          result,
+          lambda x: typing.cast(stream_types.ProblemSolution, x.cast_to(types, types, stream_types, True, __runtime__)),
+          lambda x: typing.cast(types.ProblemSolution, x.cast_to(types, types, stream_types, False, __runtime__)),
+          ctx,
+        )
     
 
 class BamlHttpRequestClient:
@@ -121,6 +178,13 @@ class BamlHttpRequestClient:
     def __init__(self, options: DoNotUseDirectlyCallManager):
         self.__options = options
 
+    def ExtractAnswer(self, text: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = self.__options.merge_options(baml_options).create_http_request_sync(function_name="ExtractAnswer", args={
+            "text": text,
+        }, mode="request")
+        return result
     def SolveProblem(self, problem: str,
         baml_options: BamlCallOptions = {},
     ) -> baml_py.baml_py.HTTPRequest:
@@ -128,6 +192,20 @@ class BamlHttpRequestClient:
             "problem": problem,
         }, mode="request")
         return result
+    def SolveProblemAnswerOnly(self, problem: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = self.__options.merge_options(baml_options).create_http_request_sync(function_name="SolveProblemAnswerOnly", args={
+            "problem": problem,
+        }, mode="request")
+        return result
+    def SolveProblemCompact(self, problem: str,max_reasoning_words: int,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = self.__options.merge_options(baml_options).create_http_request_sync(function_name="SolveProblemCompact", args={
+            "problem": problem,"max_reasoning_words": max_reasoning_words,
+        }, mode="request")
+        return result
     
 
 class BamlHttpStreamRequestClient:
@@ -136,6 +214,13 @@ class BamlHttpStreamRequestClient:
     def __init__(self, options: DoNotUseDirectlyCallManager):
         self.__options = options
 
+    def ExtractAnswer(self, text: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = self.__options.merge_options(baml_options).create_http_request_sync(function_name="ExtractAnswer", args={
+            "text": text,
+        }, mode="stream")
+        return result
     def SolveProblem(self, problem: str,
         baml_options: BamlCallOptions = {},
     ) -> baml_py.baml_py.HTTPRequest:
@@ -143,6 +228,20 @@ class BamlHttpStreamRequestClient:
             "problem": problem,
         }, mode="stream")
         return result
+    def SolveProblemAnswerOnly(self, problem: str,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = self.__options.merge_options(baml_options).create_http_request_sync(function_name="SolveProblemAnswerOnly", args={
+            "problem": problem,
+        }, mode="stream")
+        return result
+    def SolveProblemCompact(self, problem: str,max_reasoning_words: int,
+        baml_options: BamlCallOptions = {},
+    ) -> baml_py.baml_py.HTTPRequest:
+        result = self.__options.merge_options(baml_options).create_http_request_sync(function_name="SolveProblemCompact", args={
+            "problem": problem,"max_reasoning_words": max_reasoning_words,
+        }, mode="stream")
+        return result
     
 
 b = BamlSyncClient(DoNotUseDirectlyCallManager({}))
\ No newline at end of file
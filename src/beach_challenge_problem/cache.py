@@ -0,0 +1,158 @@
+"""
+Answer cache keyed on the canonical parameters of a problem.
+
+Generated problems are sampled from small integer ranges, so many questions are
+identical or differ only in formatting. Parsing each question back into its
+parameters lets equivalent problems share one answer even when the text differs.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+
+from beach_challenge_problem.agents.generic_agent import GenericAgent
+from beach_challenge_problem.problem import Problem
+
+
+def get_cache_key(problem: str) -> Hashable:
+    """
+    Returns the canonical key of a problem.
+
+    Args:
+        problem: The problem statement as a string
+
+    Returns:
+        The tuple of problem parameters if the problem follows the question
+        template, otherwise the whitespace- and case-normalized text
+    """
+    parsed = Problem.from_question(problem)
+    if parsed is not None:
+        return parsed.get_params()
+    return ' '.join(problem.lower().split())
+
+
+class ProblemCache:
+    """
+    Thread-safe LRU cache of answers keyed on the canonical problem parameters,
+    with the reasoning of the model behind each answer when there is one.
+    """
+
+    def __init__(self, max_size: int | None = 100_000):
+        """
+        Args:
+            max_size: Maximum number of answers kept, or None for no limit
+        """
+        self.max_size = max_size
+        self._answers: OrderedDict[Hashable, float] = OrderedDict()
+        self._reasonings: dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, problem: str) -> float | None:
+        """
+        Returns the cached answer for the problem, or None on a cache miss.
+        """
+        key = get_cache_key(problem)
+        with self._lock:
+            if key not in self._answers:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._answers.move_to_end(key)
+            return self._answers[key]
+
+    def get_reasoning(self, problem: str) -> str | None:
+        """
+        Returns the reasoning behind the cached answer for the problem, if any.
+        """
+        key = get_cache_key(problem)
+        with self._lock:
+            return self._reasonings.get(key)
+
+    def set(self, problem: str, answer: float, reasoning: str | None = None) -> None:
+        """
+        Stores the answer for the problem and every problem equivalent to it, with
+        the reasoning behind it.
+        """
+        key = get_cache_key(problem)
+        with self._lock:
+            self._answers[key] = answer
+            self._answers.move_to_end(key)
+            if reasoning is not None:
+                self._reasonings[key] = reasoning
+            else:
+                self._reasonings.pop(key, None)
+            if self.max_size is not None and len(self._answers) > self.max_size:
+                evicted, _ = self._answers.popitem(last=False)
+                self._reasonings.pop(evicted, None)
+
+    def get_metrics(self) -> dict:
+        """
+        Returns the cache size and hit rate.
+        """
+        with self._lock:
+            n_lookups = self._hits + self._misses
+            return {
+                'size': len(self._answers),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / n_lookups if n_lookups else 0.0,
+            }
+
+
+class CachedAgent(GenericAgent):
+    """
+    Wraps an agent so that equivalent problems are only solved once.
+    """
+
+    def __init__(self, agent: GenericAgent, cache: ProblemCache | None = None):
+        """
+        Args:
+            agent: The agent used on cache misses
+            cache: The cache to use. Defaults to a new in-memory cache
+        """
+        self.agent = agent
+        self.cache = cache if cache is not None else ProblemCache()
+
+    def get_answer(self, problem: str) -> float:
+        """
+        Returns the cached answer if an equivalent problem was solved before,
+        otherwise solves the problem with the wrapped agent.
+        """
+        answer = self.cache.get(problem)
+        if answer is None:
+            answer = self.agent.get_answer(problem)
+            self.cache.set(problem, answer, self._get_inner_reasoning(problem))
+        return answer
+
+    async def get_answer_async(self, problem: str) -> float:
+        """
+        Async version of `get_answer`, using the async path of the wrapped agent.
+        """
+        answer = self.cache.get(problem)
+        if answer is None:
+            answer = await self.agent.get_answer_async(problem)
+            self.cache.set(problem, answer, self._get_inner_reasoning(problem))
+        return answer
+
+    def _get_inner_reasoning(self, problem: str) -> str | None:
+        get_reasoning = getattr(self.agent, 'get_reasoning', None)
+        return get_reasoning(problem) if get_reasoning is not None else None
+
+    def get_reasoning(self, problem: str) -> str | None:
+        """
+        Returns the reasoning behind the answer to the problem, also for problems
+        answered from the cache, if the wrapped agent has a `get_reasoning` method.
+        """
+        return self.cache.get_reasoning(problem)
+
+    def get_params(self) -> dict:
+        """
+        Returns the parameters of the wrapped agent.
+        """
+        return {
+            **self.agent.get_params(),
+            'wrapped_agent_type': self.agent.__class__.__name__,
+            'cache': True,
+        }
@@ -0,0 +1,248 @@
+"""
+Request coalescing for LLMs served locally, e.g. by Ollama.
+
+A local server only decodes a fixed number of requests at once (its parallel
+slots, `OLLAMA_NUM_PARALLEL` for Ollama) and queues the others. Sending more
+requests than slots only adds queueing and memory pressure on the GPU, while
+sending fewer leaves it idle. `RequestCoalescer` keeps the number of requests in
+flight at the number of slots, and sends identical concurrent prompts only once,
+every caller receiving the answer of the single request.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import urllib.request
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable
+from concurrent.futures import Future
+from typing import TypeVar
+
+from loguru import logger
+
+from beach_challenge_problem.profiling import span
+
+T = TypeVar('T')
+
+# Number of parallel requests Ollama serves per model when memory allows it
+DEFAULT_PARALLEL_SLOTS = 4
+
+
+class RequestCoalescer:
+    """
+    Bounds the number of requests in flight and shares the result of a request
+    between all the concurrent callers with the same key.
+    """
+
+    def __init__(self, name: str, max_in_flight: int = DEFAULT_PARALLEL_SLOTS):
+        """
+        Args:
+            name: Name of the server this coalescer sends requests to
+            max_in_flight: Maximum number of requests sent at once, usually the
+                number of parallel slots of the server
+        """
+        self.name = name
+        self.max_in_flight = max_in_flight
+
+        self._pending: dict[Hashable, Future] = {}
+        # Callers waiting for a slot, in order of arrival
+        self._waiters: deque[Future] = deque()
+        self._n_in_flight = 0
+        self._lock = threading.Lock()
+
+        # metrics
+        self._n_calls = 0
+        self._n_coalesced = 0
+        self._max_n_in_flight = 0
+        self._max_n_waiting = 0
+
+    def _join(self, key: Hashable) -> tuple[Future, bool]:
+        """
+        Returns the future of the pending request with this key, and whether the
+        caller has to send the request because none was pending.
+        """
+        with self._lock:
+            self._n_calls += 1
+            if key in self._pending:
+                self._n_coalesced += 1
+                return self._pending[key], False
+            future = self._pending[key] = Future()
+            return future, True
+
+    def _acquire_slot(self) -> Future | None:
+        """
+        Takes a free slot, or returns a future resolved once a slot is handed over
+        to the caller.
+        """
+        with self._lock:
+            if self._n_in_flight < self.max_in_flight:
+                self._n_in_flight += 1
+                self._max_n_in_flight = max(self._max_n_in_flight, self._n_in_flight)
+                return None
+            waiter = Future()
+            self._waiters.append(waiter)
+            self._max_n_waiting = max(self._max_n_waiting, len(self._waiters))
+            return waiter
+
+    def _release_slot(self) -> None:
+        """
+        Hands the slot over to the first waiter that was not cancelled, or frees it.
+        """
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if waiter.set_running_or_notify_cancel():
+                    break
+            else:
+                self._n_in_flight -= 1
+                return
+        waiter.set_result(None)
+
+    def _finish(self, key: Hashable) -> None:
+        with self._lock:
+            del self._pending[key]
+        self._release_slot()
+
+    def call(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Calls `fn` once a slot is free, unless a call with the same key is already
+        pending, in which case its result is returned instead.
+
+        Args:
+            key: Key identifying the request, e.g. the model and the prompt
+            fn: Function that sends the request
+
+        Returns:
+            The return value of `fn`, or of the pending call with the same key
+
+        Raises:
+            Exception: The exception raised by `fn`, to every caller sharing it
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        waiter = self._acquire_slot()
+        if waiter is not None:
+            with span('coalescer.acquire', server=self.name):
+                waiter.result()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            self._finish(key)
+        return future.result()
+
+    async def call_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Async version of `call`, for coroutines built with the async BAML client.
+        Sync and async callers share the slots and the pending requests.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        # Waiting on a future rather than in a thread, which could starve the
+        # executor that the rate limiter and BAML also use
+        waiter = self._acquire_slot()
+        if waiter is not None:
+            try:
+                with span('coalescer.acquire', server=self.name):
+                    await asyncio.wrap_future(waiter)
+            except asyncio.CancelledError as e:
+                # The slot may have been handed over just before the cancellation
+                if not waiter.cancel():
+                    self._release_slot()
+                with self._lock:
+                    del self._pending[key]
+                future.set_exception(e)
+                raise
+
+        try:
+            future.set_result(await fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            self._finish(key)
+        return future.result()
+
+    def get_metrics(self) -> dict:
+        """
+        Returns the request counters of the coalescer.
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self._n_in_flight,
+                'max_in_flight_reached': self._max_n_in_flight,
+                'max_waiting': self._max_n_waiting,
+                'n_calls': self._n_calls,
+                'n_coalesced': self._n_coalesced,
+                'coalesced_rate': self._n_coalesced / self._n_calls
+                if self._n_calls
+                else 0.0,
+            }
+
+
+_coalescers: dict[str, RequestCoalescer] = {}
+_coalescers_lock = threading.Lock()
+
+
+def get_coalescer(server: str, **kwargs) -> RequestCoalescer:
+    """
+    Returns the coalescer shared by every agent calling the given server, so that
+    they share its slots.
+
+    Args:
+        server: Base URL of the server
+        **kwargs: Arguments passed to `RequestCoalescer` on first creation
+
+    Returns:
+        The coalescer for the server
+    """
+    with _coalescers_lock:
+        if server not in _coalescers:
+            _coalescers[server] = RequestCoalescer(name=server, **kwargs)
+        return _coalescers[server]
+
+
+def get_parallel_slots() -> int:
+    """
+    Returns the number of parallel slots of the local Ollama server, as set by
+    `OLLAMA_NUM_PARALLEL`, or Ollama's default.
+    """
+    try:
+        return int(os.environ['OLLAMA_NUM_PARALLEL'])
+    except (KeyError, ValueError):
+        return DEFAULT_PARALLEL_SLOTS
+
+
+def warm_up_model(
+    base_url: str, model: str, keep_alive: str | int = '30m', timeout: float = 600.0
+) -> None:
+    """
+    Loads the model on an Ollama server and keeps it in memory, so that the first
+    requests of a run do not wait for the model to load.
+
+    Args:
+        base_url: Base URL of the OpenAI-compatible API, e.g.
+            http://localhost:11434/v1
+        model: Name of the model, e.g. deepseek-r1:7b
+        keep_alive: How long the model stays loaded after the last request, in
+            Ollama's duration format, e.g. 30m, or in seconds, -1 for ever
+        timeout: Maximum number of seconds to wait for the model to load
+    """
+    url = base_url.rstrip('/').removesuffix('/v1') + '/api/generate'
+    # A request without prompt only loads the model
+    request = urllib.request.Request(
+        url,
+        data=json.dumps({'model': model, 'keep_alive': keep_alive}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    logger.info(f'Loading {model} on {url}, kept alive for {keep_alive}')
+    with span('coalescer.warm_up', model=model):
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
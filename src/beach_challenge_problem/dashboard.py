@@ -0,0 +1,249 @@
+"""
+Live view of a running evaluation in the terminal.
+
+`EvaluationMonitor` keeps running aggregates of the results passed to its
+`on_result` callback and counts the requests in flight through `track`. Both only
+update a few counters under a lock, so they do not slow down the evaluation. The
+dashboard is rendered from these counters by a background refresh thread.
+"""
+
+import collections
+import statistics
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+
+from rich.console import Console
+from rich.live import Live
+from rich.table import Table
+
+from beach_challenge_problem.evaluation import ItemResult
+from beach_challenge_problem.sequential import wilson_interval
+
+# Anthropic's prices of cache reads and 5 minute cache writes, relative to the
+# price of input tokens
+CACHE_READ_PRICE_RATIO = 0.1
+CACHE_WRITE_PRICE_RATIO = 1.25
+
+
+class EvaluationMonitor:
+    """
+    Running aggregates of an evaluation, updated as items complete.
+    """
+
+    def __init__(
+        self,
+        n_items: int | None = None,
+        metric: str = 'within_1_percent',
+        get_token_usage: Callable[[], dict] | None = None,
+        input_price: float | None = None,
+        output_price: float | None = None,
+        window: float = 30.0,
+    ):
+        """
+        Args:
+            n_items: Number of items to evaluate, if known, to show progress
+            metric: Binary metric whose running average is the accuracy
+            get_token_usage: Function returning the token usage of the agent, e.g.
+                `OneShootAgent.get_token_usage`
+            input_price: Price in dollars of one million input tokens
+            output_price: Price in dollars of one million output tokens
+            window: Number of seconds over which the current throughput is measured
+        """
+        self.n_items = n_items
+        self.metric = metric
+        self.get_token_usage = get_token_usage
+        self.input_price = input_price
+        self.output_price = output_price
+        self.window = window
+
+        self.start_time = time.monotonic()
+        self.last_completion_time = self.start_time
+        self.n_done = 0
+        self.n_correct = 0
+        self.n_in_flight = 0
+        self.errors: collections.Counter[str] = collections.Counter()
+        self._completion_times: collections.deque[float] = collections.deque()
+        self._latencies: collections.deque[float] = collections.deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def track(self, get_answer: Callable[[str], float]) -> Callable[[str], float]:
+        """
+        Wraps an answer function to count the requests in flight.
+        """
+
+        @wraps(get_answer)
+        def tracked(problem: str) -> float:
+            with self._lock:
+                self.n_in_flight += 1
+            try:
+                return get_answer(problem)
+            finally:
+                with self._lock:
+                    self.n_in_flight -= 1
+
+        return tracked
+
+    def on_result(self, result: ItemResult) -> None:
+        """
+        Adds a result to the aggregates.
+        """
+        value = result.get_score(self.metric)
+        now = time.monotonic()
+        with self._lock:
+            self.n_done += 1
+            self.last_completion_time = now
+            if value is not None and value >= 0.5:
+                self.n_correct += 1
+            if result.error is not None:
+                self.errors[result.error.split('(', 1)[0]] += 1
+            self._completion_times.append(now)
+            self._latencies.append(result.latency)
+            self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        while self._completion_times and self._completion_times[0] < now - self.window:
+            self._completion_times.popleft()
+
+    def get_summary(self) -> dict:
+        """
+        Returns a snapshot of the aggregates.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            n_recent = len(self._completion_times)
+            latencies = sorted(self._latencies)
+            summary = {
+                'n_done': self.n_done,
+                'n_items': self.n_items,
+                'n_in_flight': self.n_in_flight,
+                'n_errors': sum(self.errors.values()),
+                'errors': dict(self.errors.most_common(3)),
+                'n_correct': self.n_correct,
+            }
+            active_time = self.last_completion_time - self.start_time
+
+        elapsed = now - self.start_time
+        summary['elapsed'] = elapsed
+        # Time spent after the last result, e.g. flushing uploads, does not count
+        summary['throughput'] = summary['n_done'] / active_time if active_time else 0.0
+        summary['recent_throughput'] = (
+            n_recent / min(elapsed, self.window) if elapsed else 0.0
+        )
+        # Errored items count as misses
+        summary['accuracy'] = None
+        summary['accuracy_interval'] = None
+        if summary['n_done']:
+            summary['accuracy'] = summary['n_correct'] / summary['n_done']
+            summary['accuracy_interval'] = wilson_interval(
+                summary['n_correct'], summary['n_done']
+            )
+        summary['latency_p50'] = statistics.median(latencies) if latencies else None
+        summary['latency_p95'] = (
+            latencies[int(0.95 * (len(latencies) - 1))] if latencies else None
+        )
+        summary['eta'] = (
+            (self.n_items - summary['n_done']) / summary['recent_throughput']
+            if self.n_items and summary['recent_throughput']
+            else None
+        )
+
+        usage = self.get_token_usage() if self.get_token_usage else None
+        summary['token_usage'] = usage
+        summary['cost'] = None
+        if usage and self.input_price is not None and self.output_price is not None:
+            # Follows Anthropic, whose input tokens exclude the cached tokens
+            cached_input_tokens = (
+                usage.get('cache_read_tokens', 0) * CACHE_READ_PRICE_RATIO
+                + usage.get('cache_write_tokens', 0) * CACHE_WRITE_PRICE_RATIO
+            )
+            summary['cost'] = (
+                (usage['input_tokens'] + cached_input_tokens) * self.input_price
+                + usage['output_tokens'] * self.output_price
+            ) / 1e6
+        return summary
+
+    def render(self) -> Table:
+        """
+        Returns the dashboard as a rich table.
+        """
+        summary = self.get_summary()
+        table = Table(title='Evaluation', show_header=False, min_width=60)
+        table.add_column(style='bold')
+        table.add_column()
+
+        progress = f'{summary["n_done"]}'
+        if summary['n_items']:
+            progress += (
+                f' / {summary["n_items"]} '
+                f'({summary["n_done"] / summary["n_items"]:.0%})'
+            )
+        table.add_row('Items', progress)
+        table.add_row('In flight', str(summary['n_in_flight']))
+        table.add_row(
+            'Throughput',
+            f'{summary["recent_throughput"]:.2f} items/s '
+            f'(last {self.window:.0f} s), {summary["throughput"]:.2f} overall',
+        )
+        elapsed = f'{summary["elapsed"]:.0f} s'
+        if summary['eta'] is not None:
+            elapsed += f', ETA {summary["eta"]:.0f} s'
+        table.add_row('Elapsed', elapsed)
+
+        if summary['accuracy'] is not None:
+            low, high = summary['accuracy_interval']
+            table.add_row(
+                'Accuracy',
+                f'{summary["accuracy"]:.3f} [{low:.3f}, {high:.3f}] ({self.metric})',
+            )
+        if summary['latency_p50'] is not None:
+            table.add_row(
+                'Latency',
+                f'p50 {summary["latency_p50"]:.2f} s, '
+                f'p95 {summary["latency_p95"]:.2f} s',
+            )
+
+        errors = str(summary['n_errors'])
+        if summary['errors']:
+            by_type = ', '.join(f'{k}: {v}' for k, v in summary['errors'].items())
+            errors += f' ({by_type})'
+        table.add_row('Errors', errors, style='red' if summary['n_errors'] else None)
+
+        if summary['token_usage']:
+            usage = summary['token_usage']
+            tokens = f'{usage["input_tokens"]} in, {usage["output_tokens"]} out'
+            if usage.get('cache_read_tokens') or usage.get('cache_write_tokens'):
+                tokens += (
+                    f', {usage["cache_read_tokens"]} cache read'
+                    f', {usage["cache_write_tokens"]} cache write'
+                )
+            if summary['cost'] is not None:
+                tokens += f', ${summary["cost"]:.4f}'
+            table.add_row('Tokens', tokens)
+        return table
+
+
+@contextmanager
+def live_dashboard(
+    monitor: EvaluationMonitor,
+    refresh_per_second: float = 2.0,
+    console: Console | None = None,
+) -> Iterator[EvaluationMonitor]:
+    """
+    Shows the dashboard of a monitor in the terminal while the block runs, and
+    leaves its final state on screen.
+
+    Args:
+        monitor: The monitor of the evaluation
+        refresh_per_second: Number of times the dashboard is redrawn per second
+        console: Console to draw on. Defaults to stdout
+    """
+    with Live(
+        get_renderable=monitor.render,
+        refresh_per_second=refresh_per_second,
+        console=console,
+    ):
+        yield monitor
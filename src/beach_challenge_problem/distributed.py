@@ -0,0 +1,425 @@
+"""
+Distributed evaluation over a shared SQLite work queue.
+
+A coordinator writes the dataset items to a queue file. Worker processes, on any
+host that can open the file (e.g. on a shared volume), lease small batches of
+items, solve them and write the results back. Workers renew the leases of the
+items they are solving; a lease that is not renewed in time, e.g. because its
+worker crashed, expires and the items are handed out again.
+Once every item is done, the results are merged into a single Opik experiment.
+
+SQLite file locking is reliable on local disks and most shared volumes, but not on
+every network file system. Check yours before running workers on several hosts.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from opik.evaluation.evaluation_result import EvaluationResult
+
+from beach_challenge_problem.evaluation import (
+    BatchedOpikWriter,
+    ItemResult,
+    get_dataset_items,
+    run_items,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    item TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, lease_expires);
+"""
+
+# Number of leases an item gets before it is given up on, for queues created
+# without an explicit value
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Number of renewals per lease period, so that a renewal can be missed, e.g. while
+# the queue file is locked, without losing the lease
+HEARTBEATS_PER_LEASE = 3
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue of dataset items with expiring leases.
+    """
+
+    def __init__(self, path: str | Path, max_attempts: int | None = None):
+        """
+        Args:
+            path: Path of the SQLite file
+            max_attempts: Number of leases an item gets before it is given up on.
+                Defaults to the value the queue was created with
+        """
+        self.path = Path(path)
+        if max_attempts is None:
+            if not self.path.exists():
+                raise FileNotFoundError(f'Work queue {self.path} does not exist')
+            max_attempts = self.get_meta()['max_attempts']
+        self.max_attempts = max_attempts
+
+    @contextmanager
+    def _transaction(self):
+        # One connection per call, so the queue can be used from any thread
+        with closing(
+            sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        ) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    @classmethod
+    def create(
+        cls,
+        path: str | Path,
+        dataset_name: str,
+        experiment_config: dict,
+        items: list[dict[str, Any]],
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> 'WorkQueue':
+        """
+        Creates a queue holding the given dataset items.
+
+        Args:
+            path: Path of the SQLite file, which must not exist yet
+            dataset_name: Name of the dataset the items come from
+            experiment_config: Configuration of the Opik experiment
+            items: Dataset items with 'id', 'input' and 'expected_output' keys
+            max_attempts: Number of leases an item gets before it is given up on,
+                stored in the queue for the workers
+        """
+        path = Path(path)
+        if path.exists():
+            raise FileExistsError(f'Work queue {path} already exists')
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        queue = cls(path, max_attempts=max_attempts)
+        with closing(sqlite3.connect(path)) as connection:
+            connection.executescript(_SCHEMA)
+        with queue._transaction() as connection:
+            connection.executemany(
+                'INSERT INTO meta VALUES (?, ?)',
+                [
+                    ('dataset_name', dataset_name),
+                    ('experiment_config', json.dumps(experiment_config)),
+                    ('max_attempts', str(max_attempts)),
+                ],
+            )
+            connection.executemany(
+                'INSERT INTO items (id, item) VALUES (?, ?)',
+                [(item['id'], json.dumps(item)) for item in items],
+            )
+        return queue
+
+    def get_meta(self) -> dict[str, Any]:
+        """
+        Returns the dataset name, experiment config and maximum number of attempts
+        of the queue.
+        """
+        with self._transaction() as connection:
+            rows = dict(connection.execute('SELECT key, value FROM meta'))
+        return {
+            'dataset_name': rows['dataset_name'],
+            'experiment_config': json.loads(rows['experiment_config']),
+            'max_attempts': int(rows.get('max_attempts', DEFAULT_MAX_ATTEMPTS)),
+        }
+
+    def lease(
+        self, worker: str, n_items: int, lease_seconds: float
+    ) -> list[dict[str, Any]]:
+        """
+        Leases pending items, and items whose lease expired, to a worker.
+
+        Args:
+            worker: Identifier of the worker
+            n_items: Maximum number of items to lease
+            lease_seconds: Number of seconds after which the lease expires
+
+        Returns:
+            The leased dataset items
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            rows = connection.execute(
+                """
+                SELECT id, item FROM items
+                WHERE attempts < ?
+                  AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                ORDER BY attempts, rowid
+                LIMIT ?
+                """,
+                (self.max_attempts, now, n_items),
+            ).fetchall()
+            connection.executemany(
+                """
+                UPDATE items
+                SET status = 'leased', worker = ?, lease_expires = ?,
+                    attempts = attempts + 1
+                WHERE id = ?
+                """,
+                [(worker, now + lease_seconds, item_id) for item_id, _ in rows],
+            )
+        return [json.loads(item) for _, item in rows]
+
+    def renew(self, worker: str, item_ids: list[str], lease_seconds: float) -> int:
+        """
+        Extends the leases of a worker on the given items.
+
+        Args:
+            worker: Identifier of the worker
+            item_ids: IDs of the items the worker is still solving
+            lease_seconds: Number of seconds from now after which the leases expire
+
+        Returns:
+            The number of leases renewed, fewer than the items if some leases were
+            lost to another worker
+        """
+        if not item_ids:
+            return 0
+        expires = time.time() + lease_seconds
+        with self._transaction() as connection:
+            cursor = connection.executemany(
+                """
+                UPDATE items SET lease_expires = ?
+                WHERE id = ? AND worker = ? AND status = 'leased'
+                """,
+                [(expires, item_id, worker) for item_id in item_ids],
+            )
+        return cursor.rowcount
+
+    def complete(self, worker: str, result: ItemResult) -> bool:
+        """
+        Stores the result of a leased item. Items that failed to be solved go back
+        to the queue until they run out of attempts.
+
+        Returns:
+            False if the lease was lost to another worker, in which case the result
+            is discarded
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                """
+                UPDATE items
+                SET status = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'done' END,
+                    result = ?
+                WHERE id = ? AND worker = ? AND status = 'leased'
+                """,
+                (
+                    result.error is not None,
+                    self.max_attempts,
+                    json.dumps(result.to_dict()),
+                    result.dataset_item_id,
+                    worker,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def get_progress(self) -> dict[str, int]:
+        """
+        Returns the number of items done, leased, pending and given up on.
+        """
+        with self._transaction() as connection:
+            rows = connection.execute(
+                """
+                SELECT
+                    CASE
+                        WHEN status = 'done' THEN 'done'
+                        WHEN attempts >= ? AND (
+                            status = 'pending' OR lease_expires < ?
+                        ) THEN 'failed'
+                        ELSE status
+                    END,
+                    COUNT(*)
+                FROM items GROUP BY 1
+                """,
+                (self.max_attempts, time.time()),
+            ).fetchall()
+        return {'done': 0, 'leased': 0, 'pending': 0, 'failed': 0, **dict(rows)}
+
+    def is_finished(self) -> bool:
+        progress = self.get_progress()
+        return progress['leased'] == 0 and progress['pending'] == 0
+
+    def get_results(self) -> list[ItemResult]:
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT result FROM items WHERE status = 'done' ORDER BY rowid"
+            ).fetchall()
+        return [ItemResult.from_dict(json.loads(result)) for (result,) in rows]
+
+
+def create_queue(
+    path: str | Path,
+    dataset_name: str,
+    experiment_config: dict,
+    dataset_item_ids: list[str] | None = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+) -> WorkQueue:
+    """
+    Creates a work queue with the items of an Opik dataset.
+
+    Args:
+        path: Path of the SQLite file of the queue
+        dataset_name: Name of the dataset to evaluate on
+        experiment_config: Configuration stored with the Opik experiment
+        dataset_item_ids: Optional list of specific dataset item IDs to evaluate
+        max_attempts: Number of leases an item gets before it is given up on
+
+    Returns:
+        The work queue
+    """
+    items = get_dataset_items(dataset_name, dataset_item_ids)
+    queue = WorkQueue.create(
+        path, dataset_name, experiment_config, items, max_attempts=max_attempts
+    )
+    logger.info(f'Created work queue {path} with {len(items)} items')
+    return queue
+
+
+@contextmanager
+def _renewing_leases(
+    queue: WorkQueue, worker: str, item_ids: set[str], lease_seconds: float
+) -> Iterator[threading.Lock]:
+    """
+    Renews the leases on the items from a background thread until the block exits.
+    Yields the lock to hold when removing completed items from `item_ids`.
+    """
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        while not stop.wait(lease_seconds / HEARTBEATS_PER_LEASE):
+            with lock:
+                pending = list(item_ids)
+            try:
+                renewed = queue.renew(worker, pending, lease_seconds)
+            except sqlite3.Error as e:
+                logger.warning(f'Could not renew the leases of worker {worker}: {e!r}')
+                continue
+            if renewed < len(pending):
+                logger.warning(
+                    f'Worker {worker} lost {len(pending) - renewed} leases to '
+                    'another worker'
+                )
+
+    thread = threading.Thread(target=heartbeat, name='lease-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield lock
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_worker(
+    get_answer: Callable[[str], float],
+    queue: WorkQueue,
+    worker: str | None = None,
+    task_threads: int = 1,
+    lease_seconds: float = 60.0,
+    poll_interval: float = 5.0,
+) -> int:
+    """
+    Solves leased items until the queue is finished, renewing the leases of the
+    items being solved.
+
+    Args:
+        get_answer: Function returning the answer to a problem
+        queue: The work queue
+        worker: Identifier of the worker. Defaults to host, PID and a random suffix
+        task_threads: Number of items solved concurrently, and leased at once
+        lease_seconds: Number of seconds without renewal after which the leases
+            of the worker expire, e.g. because it crashed, and its items are
+            handed out to another worker
+        poll_interval: Number of seconds to wait when all remaining items are
+            leased by other workers, whose leases may still expire
+
+    Returns:
+        The number of items completed by this worker
+    """
+    worker = worker or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+    n_completed = 0
+    while True:
+        items = queue.lease(worker, task_threads, lease_seconds)
+        if not items:
+            if queue.is_finished():
+                break
+            time.sleep(poll_interval)
+            continue
+
+        leased = {item['id'] for item in items}
+        with _renewing_leases(queue, worker, leased, lease_seconds) as lock:
+            for result in run_items(get_answer, items, task_threads):
+                with lock:
+                    leased.discard(result.dataset_item_id)
+                if queue.complete(worker, result):
+                    n_completed += 1
+                else:
+                    logger.warning(
+                        f'Lease on item {result.dataset_item_id} expired, '
+                        'result dropped'
+                    )
+        logger.info(f'Worker {worker}: {queue.get_progress()}')
+
+    logger.info(f'Worker {worker} completed {n_completed} items')
+    return n_completed
+
+
+def merge_results(queue: WorkQueue, poll_interval: float = 10.0) -> EvaluationResult:
+    """
+    Waits for the queue to be finished, then logs all results to one Opik experiment.
+
+    Args:
+        queue: The work queue
+        poll_interval: Number of seconds between two checks of the progress
+
+    Returns:
+        The evaluation results, in the same format as `opik.evaluation.evaluate`
+    """
+    while not queue.is_finished():
+        logger.info(f'Waiting for workers: {queue.get_progress()}')
+        time.sleep(poll_interval)
+
+    progress = queue.get_progress()
+    if progress['failed']:
+        logger.warning(f'{progress["failed"]} items failed on every attempt')
+
+    meta = queue.get_meta()
+    results = queue.get_results()
+    writer = BatchedOpikWriter(
+        dataset_name=meta['dataset_name'],
+        experiment_config=meta['experiment_config'],
+    )
+    try:
+        for result in results:
+            writer.put(result)
+    finally:
+        writer.close()
+
+    return EvaluationResult(
+        experiment_id=writer.experiment_id,
+        experiment_name=writer.experiment_name,
+        test_results=[result.to_test_result() for result in results],
+    )
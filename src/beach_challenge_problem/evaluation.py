@@ -0,0 +1,497 @@
+"""
+Local evaluation loop with batched, asynchronous upload of the results to Opik.
+
+`opik.evaluation.evaluate` logs traces and scores inline with each task, so a slow
+tracking server slows down the model calls. Here tasks and scoring run locally,
+results go to a buffer, and a background writer flushes them to Opik in large
+batches, or to a local JSONL file when the server is unreachable.
+"""
+
+import dataclasses
+import datetime
+import json
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from opik import ExperimentItemReferences, Opik, id_helpers
+from opik.evaluation.evaluation_result import EvaluationResult
+from opik.evaluation.metrics import score_result
+from opik.evaluation.test_case import TestCase
+from opik.evaluation.test_result import TestResult
+
+from beach_challenge_problem.metrics import get_scoring_metrics
+from beach_challenge_problem.profiling import span
+
+# Number of results whose experiment items are inserted at once, so that a failed
+# upload only has to resume from the last chunk
+UPLOAD_CHUNK_SIZE = 100
+
+
+@dataclasses.dataclass
+class ItemResult:
+    """
+    Outcome of solving and scoring one dataset item.
+    """
+
+    dataset_item_id: str
+    input: str
+    expected_output: float
+    answer: float | None
+    scores: list[score_result.ScoreResult]
+    trace_id: str
+    start_time: datetime.datetime
+    end_time: datetime.datetime
+    error: str | None = None
+
+    @property
+    def latency(self) -> float:
+        return (self.end_time - self.start_time).total_seconds()
+
+    def get_score(self, name: str) -> float | None:
+        """
+        Returns the value of the given metric, or None if it was not computed.
+        """
+        for score in self.scores:
+            if score.name == name and not score.scoring_failed:
+                return score.value
+        return None
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns a JSON-serializable representation of the result.
+        """
+        return {
+            'dataset_item_id': self.dataset_item_id,
+            'input': self.input,
+            'expected_output': self.expected_output,
+            'answer': self.answer,
+            'scores': [
+                {'name': s.name, 'value': s.value, 'reason': s.reason}
+                for s in self.scores
+            ],
+            'trace_id': self.trace_id,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'error': self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, record: dict[str, Any]) -> 'ItemResult':
+        """
+        Rebuilds a result from the output of `to_dict`.
+        """
+        return cls(
+            dataset_item_id=record['dataset_item_id'],
+            input=record['input'],
+            expected_output=record['expected_output'],
+            answer=record['answer'],
+            scores=[
+                score_result.ScoreResult(
+                    name=s['name'], value=s['value'], reason=s['reason']
+                )
+                for s in record['scores']
+            ],
+            trace_id=record['trace_id'],
+            start_time=datetime.datetime.fromisoformat(record['start_time']),
+            end_time=datetime.datetime.fromisoformat(record['end_time']),
+            error=record['error'],
+        )
+
+    def to_test_result(self) -> TestResult:
+        """
+        Converts the result to the type Opik uses in its evaluation results.
+        """
+        return TestResult(
+            test_case=TestCase(
+                trace_id=self.trace_id,
+                dataset_item_id=self.dataset_item_id,
+                scoring_inputs={
+                    'input': self.input,
+                    'expected_output': self.expected_output,
+                    'answer': self.answer,
+                },
+                task_output={'answer': self.answer},
+            ),
+            score_results=self.scores,
+        )
+
+
+def solve_item(
+    get_answer: Callable[[str], float],
+    item: dict[str, Any],
+    scoring_metrics: list | None = None,
+) -> ItemResult:
+    """
+    Solves a dataset item and scores the answer. Errors raised while solving the
+    problem are recorded in the result instead of being raised.
+
+    Args:
+        get_answer: Function returning the answer to a problem, e.g. `agent.get_answer`
+        item: Dataset item with 'id', 'input' and 'expected_output' keys
+        scoring_metrics: Metrics used to score the answer. Defaults to the metrics of
+            `get_scoring_metrics`
+
+    Returns:
+        The result for the item
+    """
+    scoring_metrics = scoring_metrics or get_scoring_metrics()
+    start_time = datetime.datetime.now(datetime.UTC)
+
+    answer, error = None, None
+    try:
+        with span('evaluate.task'):
+            answer = get_answer(item['input'])
+    except Exception as e:
+        logger.warning(f'Failed to solve dataset item {item["id"]}: {e!r}')
+        error = repr(e)
+    end_time = datetime.datetime.now(datetime.UTC)
+
+    scores = []
+    if answer is not None:
+        scores = [
+            metric.score(answer=answer, expected_output=item['expected_output'])
+            for metric in scoring_metrics
+        ]
+
+    return ItemResult(
+        dataset_item_id=item['id'],
+        input=item['input'],
+        expected_output=item['expected_output'],
+        answer=answer,
+        scores=scores,
+        trace_id=id_helpers.generate_id(start_time),
+        start_time=start_time,
+        end_time=end_time,
+        error=error,
+    )
+
+
+def iter_results(
+    get_answer: Callable[[str], float],
+    items: Iterable[dict[str, Any]],
+    task_threads: int = 1,
+) -> Iterator[ItemResult]:
+    """
+    Solves and scores dataset items concurrently, yielding each result as soon as
+    it is ready. Items not started yet are cancelled if the generator is closed
+    early.
+
+    Args:
+        get_answer: Function returning the answer to a problem
+        items: Dataset items with 'id', 'input' and 'expected_output' keys
+        task_threads: Number of items solved concurrently
+
+    Yields:
+        The results, in completion order
+    """
+    pool = ThreadPoolExecutor(max_workers=task_threads)
+    try:
+        futures = [pool.submit(solve_item, get_answer, item) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def run_items(
+    get_answer: Callable[[str], float],
+    items: Iterable[dict[str, Any]],
+    task_threads: int = 1,
+    on_result: Callable[[ItemResult], None] | None = None,
+) -> list[ItemResult]:
+    """
+    Solves and scores dataset items concurrently.
+
+    Args:
+        get_answer: Function returning the answer to a problem
+        items: Dataset items with 'id', 'input' and 'expected_output' keys
+        task_threads: Number of items solved concurrently
+        on_result: Optional callback called with each result as soon as it is ready
+
+    Returns:
+        The results, in completion order
+    """
+    results = []
+    for result in iter_results(get_answer, items, task_threads):
+        if on_result is not None:
+            on_result(result)
+        results.append(result)
+    return results
+
+
+class BatchedOpikWriter:
+    """
+    Uploads evaluation results to an Opik experiment from a background thread.
+
+    Results are buffered and sent in batches of `batch_size`, or every
+    `flush_interval` seconds. Failed uploads are retried with exponential backoff.
+    If the Opik server stays unreachable, the results not uploaded are appended to
+    a local JSONL file instead, and uploads are attempted again after
+    `offline_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        dataset_name: str,
+        experiment_config: dict | None = None,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        fallback_path: str | Path = 'results/opik_fallback.jsonl',
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        offline_interval: float = 60.0,
+    ):
+        """
+        Args:
+            dataset_name: Name of the Opik dataset the results belong to
+            experiment_config: Configuration stored with the Opik experiment
+            batch_size: Maximum number of results uploaded at once
+            flush_interval: Maximum number of seconds a result stays in the buffer
+            fallback_path: JSONL file the results are written to when Opik is
+                unreachable
+            max_retries: Number of retries of a failed upload before the results
+                are written to the fallback file
+            retry_delay: Delay in seconds before the first retry, doubled after
+                each failure
+            offline_interval: Number of seconds during which results go straight
+                to the fallback file after the retries of an upload failed
+        """
+        self.dataset_name = dataset_name
+        self.experiment_config = experiment_config
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fallback_path = Path(fallback_path)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.offline_interval = offline_interval
+
+        self.experiment_id: str | None = None
+        self.experiment_name: str | None = None
+        self.n_uploaded = 0
+        self.n_exported = 0
+
+        self._queue: queue.Queue[ItemResult | None] = queue.Queue()
+        self._client: Opik | None = None
+        self._experiment = None
+        self._offline_until: float | None = None
+        # Trace IDs sent in the chunk being uploaded, not sent again on retry
+        self._traced: set[str] = set()
+        self._thread = threading.Thread(
+            target=self._run, name='opik-writer', daemon=True
+        )
+        self._thread.start()
+
+    def put(self, result: ItemResult) -> None:
+        """
+        Adds a result to the buffer. Never blocks on the network.
+        """
+        self._queue.put(result)
+
+    def close(self) -> None:
+        """
+        Flushes the remaining results and waits for the upload to finish.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        batch: list[ItemResult] = []
+        deadline = time.monotonic() + self.flush_interval
+        done = False
+        while not done:
+            try:
+                result = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                if result is None:
+                    done = True
+                else:
+                    batch.append(result)
+            except queue.Empty:
+                pass
+
+            if done or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+        if self._client is not None and self._offline_until is None:
+            with span('opik.flush'):
+                self._client.flush()
+
+    def _connect(self) -> None:
+        self._client = Opik()
+        self._experiment = self._client.create_experiment(
+            dataset_name=self.dataset_name,
+            experiment_config=self.experiment_config,
+        )
+        self.experiment_id = self._experiment.id
+        self.experiment_name = self._experiment.name
+
+    def _flush(self, batch: list[ItemResult]) -> None:
+        if self._offline_until is not None and time.monotonic() >= self._offline_until:
+            logger.info('Trying to upload the results to Opik again')
+            self._offline_until = None
+        if self._offline_until is None:
+            batch = self._upload_with_retries(batch)
+        if batch:
+            self._export(batch)
+
+    def _upload_with_retries(self, batch: list[ItemResult]) -> list[ItemResult]:
+        """
+        Uploads the batch chunk by chunk, retrying the failed chunk with
+        exponential backoff.
+
+        Returns:
+            The results that could not be uploaded
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with span('opik.upload_batch', size=len(batch)):
+                    if self._experiment is None:
+                        self._connect()
+                    while batch:
+                        chunk = batch[:UPLOAD_CHUNK_SIZE]
+                        self._upload(chunk)
+                        self.n_uploaded += len(chunk)
+                        self._traced.clear()
+                        batch = batch[UPLOAD_CHUNK_SIZE:]
+                return batch
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.warning(
+                        f'Opik is unreachable ({e!r}), writing results to '
+                        f'{self.fallback_path} for the next '
+                        f'{self.offline_interval:.0f} seconds'
+                    )
+                    self._offline_until = time.monotonic() + self.offline_interval
+                    return batch
+                delay = self.retry_delay * 2**attempt
+                logger.info(f'Opik upload failed ({e!r}), retrying in {delay:.1f}s')
+                time.sleep(delay)
+        raise AssertionError('unreachable')
+
+    def _export(self, batch: list[ItemResult]) -> None:
+        self.fallback_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.fallback_path.open('a') as f:
+            for result in batch:
+                record = {
+                    'dataset_name': self.dataset_name,
+                    'experiment_config': self.experiment_config,
+                    **result.to_dict(),
+                }
+                f.write(json.dumps(record) + '\n')
+        self.n_exported += len(batch)
+
+    def _upload(self, batch: list[ItemResult]) -> None:
+        for result in batch:
+            if result.trace_id in self._traced:
+                continue
+            self._client.trace(
+                id=result.trace_id,
+                name='evaluation_task',
+                start_time=result.start_time,
+                end_time=result.end_time,
+                input={'input': result.input},
+                output={'answer': result.answer},
+                metadata={'error': result.error} if result.error else None,
+                feedback_scores=[
+                    {'name': s.name, 'value': s.value, 'reason': s.reason}
+                    for s in result.scores
+                    if not s.scoring_failed
+                ],
+            )
+            self._traced.add(result.trace_id)
+
+        self._experiment.insert(
+            experiment_items_references=[
+                ExperimentItemReferences(
+                    dataset_item_id=result.dataset_item_id, trace_id=result.trace_id
+                )
+                for result in batch
+            ]
+        )
+
+
+def get_dataset_items(
+    dataset_name: str, dataset_item_ids: list[str] | None = None
+) -> list[dict[str, Any]]:
+    """
+    Downloads the items of an Opik dataset.
+
+    Args:
+        dataset_name: Name of the dataset
+        dataset_item_ids: Optional list of specific dataset item IDs to keep
+
+    Returns:
+        The items, as dictionaries with 'id', 'input' and 'expected_output' keys
+    """
+    with span('opik.get_dataset', dataset=dataset_name):
+        items = Opik().get_or_create_dataset(name=dataset_name).get_items()
+    if dataset_item_ids is not None:
+        wanted = set(dataset_item_ids)
+        items = [item for item in items if item['id'] in wanted]
+    return items
+
+
+def evaluate_batched(
+    get_answer: Callable[[str], float],
+    dataset_name: str,
+    experiment_config: dict,
+    dataset_item_ids: list[str] | None = None,
+    task_threads: int = 1,
+    batch_size: int = 500,
+    fallback_path: str | Path = 'results/opik_fallback.jsonl',
+    on_result: Callable[[ItemResult], None] | None = None,
+) -> EvaluationResult:
+    """
+    Evaluates `get_answer` on an Opik dataset, uploading the results in batches
+    from a background thread.
+
+    Args:
+        get_answer: Function returning the answer to a problem
+        dataset_name: Name of the dataset to evaluate on
+        experiment_config: Configuration stored with the Opik experiment
+        dataset_item_ids: Optional list of specific dataset item IDs to evaluate
+        task_threads: Number of dataset items evaluated concurrently
+        batch_size: Maximum number of results uploaded at once
+        fallback_path: JSONL file the results are written to when Opik is
+            unreachable
+        on_result: Optional callback called with each result as soon as it is ready
+
+    Returns:
+        The evaluation results, in the same format as `opik.evaluation.evaluate`
+    """
+    items = get_dataset_items(dataset_name, dataset_item_ids)
+
+    writer = BatchedOpikWriter(
+        dataset_name=dataset_name,
+        experiment_config=experiment_config,
+        batch_size=batch_size,
+        fallback_path=fallback_path,
+    )
+
+    def put(result: ItemResult) -> None:
+        writer.put(result)
+        if on_result is not None:
+            on_result(result)
+
+    try:
+        results = run_items(get_answer, items, task_threads, on_result=put)
+    finally:
+        writer.close()
+
+    logger.info(
+        f'Uploaded {writer.n_uploaded} results to Opik, '
+        f'exported {writer.n_exported} to {writer.fallback_path}'
+    )
+    return EvaluationResult(
+        experiment_id=writer.experiment_id,
+        experiment_name=writer.experiment_name,
+        test_results=[result.to_test_result() for result in results],
+    )
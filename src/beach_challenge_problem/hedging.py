@@ -0,0 +1,158 @@
+"""
+Hedged requests to cut the tail latency of LLM calls.
+
+If a request has not returned after the observed p95 latency, a duplicate request
+is sent and the first valid response wins. The number of duplicates is capped by a
+budget expressed as a fraction of all requests.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from loguru import logger
+
+T = TypeVar('T')
+
+
+class HedgingPolicy:
+    """
+    Decides when to fire a hedged request, based on the latencies observed so far.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        budget: float = 0.05,
+        window: int = 500,
+        min_samples: int = 20,
+    ):
+        """
+        Args:
+            quantile: Latency quantile after which a hedged request is sent
+            budget: Maximum ratio of hedged requests to primary requests
+            window: Number of recent latencies used to estimate the quantile
+            min_samples: Number of latencies needed before hedging starts
+        """
+        self.quantile = quantile
+        self.budget = budget
+        self.min_samples = min_samples
+
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._n_requests = 0
+        self._n_hedges = 0
+        self._n_hedge_wins = 0
+
+    def hedge_delay(self) -> float | None:
+        """
+        Returns the number of seconds to wait before hedging, or None if there are
+        not enough latency samples yet, or if the quantile falls on censored
+        latencies.
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+
+        index = min(len(latencies) - 1, math.ceil(self.quantile * len(latencies)) - 1)
+        return latencies[index] if math.isfinite(latencies[index]) else None
+
+    def on_request(self) -> None:
+        with self._lock:
+            self._n_requests += 1
+
+    def try_acquire_hedge(self) -> bool:
+        """
+        Returns True if the budget allows one more hedged request.
+        """
+        with self._lock:
+            if self._n_hedges + 1 > self.budget * self._n_requests:
+                return False
+            self._n_hedges += 1
+            return True
+
+    def record(self, latency: float, hedge_won: bool = False) -> None:
+        """
+        Records the latency of a primary request.
+
+        Args:
+            latency: Latency of the primary request, ignored if the hedge won
+            hedge_won: Whether the hedged request answered first. The primary
+                latency is then only known to exceed the hedge delay, and is kept
+                as an infinite latency: recording the shorter latency of the hedge
+                would lower the quantile, and hedge ever more often
+        """
+        with self._lock:
+            self._latencies.append(math.inf if hedge_won else latency)
+            self._n_hedge_wins += hedge_won
+
+    def get_metrics(self) -> dict:
+        """
+        Returns the hedging counters and the current hedge delay.
+        """
+        with self._lock:
+            metrics = {
+                'n_requests': self._n_requests,
+                'n_hedges': self._n_hedges,
+                'n_hedge_wins': self._n_hedge_wins,
+                'hedge_rate': self._n_hedges / self._n_requests
+                if self._n_requests
+                else 0.0,
+            }
+        metrics['hedge_delay'] = self.hedge_delay()
+        return metrics
+
+
+async def hedged_call(
+    primary: Callable[[], Awaitable[T]],
+    hedge: Callable[[], Awaitable[T]],
+    policy: HedgingPolicy,
+) -> T:
+    """
+    Runs `primary` and, if it is slower than the policy allows, races it against
+    `hedge`. The first call that succeeds wins and the other one is cancelled.
+
+    Args:
+        primary: Coroutine function for the primary request
+        hedge: Coroutine function for the duplicate request
+        policy: Policy deciding when to hedge and recording latencies
+
+    Returns:
+        The result of the first successful call
+    """
+    start = time.perf_counter()
+    policy.on_request()
+
+    primary_task = asyncio.create_task(primary())
+    pending = {primary_task}
+
+    error: BaseException | None = None
+    try:
+        delay = policy.hedge_delay()
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and policy.try_acquire_hedge():
+                logger.debug(f'No response after {delay:.2f}s, sending hedged request')
+                pending.add(asyncio.create_task(hedge()))
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    policy.record(
+                        time.perf_counter() - start, hedge_won=task is not primary_task
+                    )
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise error
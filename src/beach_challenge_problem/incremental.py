@@ -0,0 +1,256 @@
+"""
+Incremental evaluation: only the dataset items whose result is missing or stale for
+the current agent configuration are solved again.
+
+A result is identified by two fingerprints. The config fingerprint covers the agent
+type and parameters and the BAML sources the client was generated from, so editing
+a prompt or switching models invalidates all results. The item fingerprint covers
+the content of the dataset item, so adding or editing items only runs those items.
+"""
+
+import dataclasses
+import hashlib
+import json
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from opik import id_helpers
+from opik.evaluation.evaluation_result import EvaluationResult
+
+from beach_challenge_problem.baml_client.inlinedbaml import get_baml_files
+from beach_challenge_problem.evaluation import (
+    BatchedOpikWriter,
+    ItemResult,
+    get_dataset_items,
+    run_items,
+)
+
+
+def _hash(value: Any) -> str:
+    data = json.dumps(value, sort_keys=True, default=str).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_baml_source_hash() -> str:
+    """
+    Returns a hash of the BAML sources the BAML client was generated from.
+    """
+    return _hash(get_baml_files())
+
+
+def get_config_fingerprint(experiment_config: dict) -> str:
+    """
+    Returns the fingerprint of an agent configuration and the current BAML sources.
+
+    Args:
+        experiment_config: Configuration of the experiment, with the agent type
+            and parameters
+    """
+    return _hash({'config': experiment_config, 'baml': get_baml_source_hash()})
+
+
+def get_item_fingerprint(item: dict[str, Any]) -> str:
+    """
+    Returns the fingerprint of the content of a dataset item, regardless of its ID.
+    """
+    return _hash({'input': item['input'], 'expected_output': item['expected_output']})
+
+
+class ResultStore:
+    """
+    Append-only JSONL store of item results, indexed by config and item fingerprint.
+    """
+
+    def __init__(self, path: str | Path = 'results/evaluation_store.jsonl'):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def load(self, config_fingerprint: str) -> dict[str, ItemResult]:
+        """
+        Returns the successful results stored for a configuration.
+
+        Returns:
+            Dictionary mapping item fingerprints to their latest result
+        """
+        results = {}
+        if not self.path.exists():
+            return results
+
+        with self.path.open() as f:
+            for line in f:
+                record = json.loads(line)
+                if record['config_fingerprint'] != config_fingerprint:
+                    continue
+                if record['error'] is not None:
+                    continue
+                results[record['item_fingerprint']] = ItemResult.from_dict(record)
+        return results
+
+    def load_all(self) -> list[tuple[dict[str, Any], ItemResult]]:
+        """
+        Returns every stored result, failed ones included, with the experiment
+        configuration that produced it. Results stored without their
+        configuration are skipped.
+        """
+        results = []
+        if not self.path.exists():
+            return results
+
+        with self.path.open() as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get('experiment_config') is not None:
+                    results.append(
+                        (record['experiment_config'], ItemResult.from_dict(record))
+                    )
+        return results
+
+    def add(
+        self,
+        result: ItemResult,
+        config_fingerprint: str,
+        experiment_config: dict[str, Any] | None = None,
+    ) -> None:
+        """
+        Stores the result of an item for a configuration.
+
+        Args:
+            result: The result of the item
+            config_fingerprint: Fingerprint of the configuration
+            experiment_config: The configuration itself, stored to tell which
+                agent produced the result, e.g. to fit a routing policy
+        """
+        record = {
+            'config_fingerprint': config_fingerprint,
+            'item_fingerprint': get_item_fingerprint(
+                {'input': result.input, 'expected_output': result.expected_output}
+            ),
+            'experiment_config': experiment_config,
+            **result.to_dict(),
+        }
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open('a') as f:
+                f.write(json.dumps(record) + '\n')
+
+
+@dataclasses.dataclass
+class EvaluationPlan:
+    """
+    Dataset items to solve, and the stored results reused for the other items.
+    """
+
+    config_fingerprint: str
+    to_run: list[dict[str, Any]]
+    reused: list[ItemResult]
+
+
+def plan_evaluation(
+    items: list[dict[str, Any]], config_fingerprint: str, store: ResultStore
+) -> EvaluationPlan:
+    """
+    Splits dataset items between the ones with a valid stored result and the ones
+    that need to be solved.
+
+    Args:
+        items: Dataset items with 'id', 'input' and 'expected_output' keys
+        config_fingerprint: Fingerprint of the evaluated configuration
+        store: Store of previous results
+
+    Returns:
+        The evaluation plan
+    """
+    stored = store.load(config_fingerprint)
+
+    to_run, reused = [], []
+    for item in items:
+        result = stored.get(get_item_fingerprint(item))
+        if result is None:
+            to_run.append(item)
+        else:
+            # Same content under a new ID, e.g. when the dataset was recreated
+            reused.append(dataclasses.replace(result, dataset_item_id=item['id']))
+
+    return EvaluationPlan(config_fingerprint, to_run, reused)
+
+
+def evaluate_incremental(
+    get_answer: Callable[[str], float],
+    dataset_name: str,
+    experiment_config: dict,
+    dataset_item_ids: list[str] | None = None,
+    task_threads: int = 1,
+    store_path: str | Path = 'results/evaluation_store.jsonl',
+    on_result: Callable[[ItemResult], None] | None = None,
+) -> EvaluationResult:
+    """
+    Evaluates `get_answer` on an Opik dataset, solving only the items without a
+    stored result for the current configuration. Stored and new results are logged
+    together to a new Opik experiment.
+
+    Args:
+        get_answer: Function returning the answer to a problem
+        dataset_name: Name of the dataset to evaluate on
+        experiment_config: Configuration stored with the Opik experiment, used to
+            fingerprint the evaluated configuration
+        dataset_item_ids: Optional list of specific dataset item IDs to evaluate
+        task_threads: Number of dataset items evaluated concurrently
+        store_path: JSONL file where the results are stored between runs
+        on_result: Optional callback called with each reused result, then with each
+            new result as soon as it is ready
+
+    Returns:
+        The evaluation results for all the items, in the same format as
+        `opik.evaluation.evaluate`
+    """
+    config_fingerprint = get_config_fingerprint(experiment_config)
+    store = ResultStore(store_path)
+
+    items = get_dataset_items(dataset_name, dataset_item_ids)
+    plan = plan_evaluation(items, config_fingerprint, store)
+    logger.info(
+        f'Config {config_fingerprint[:12]}: solving {len(plan.to_run)} items, '
+        f'reusing {len(plan.reused)} stored results'
+    )
+
+    writer = BatchedOpikWriter(
+        dataset_name=dataset_name,
+        experiment_config={
+            **experiment_config,
+            'config_fingerprint': config_fingerprint,
+            'baml_source_hash': get_baml_source_hash(),
+        },
+    )
+
+    def put(result: ItemResult) -> None:
+        writer.put(result)
+        if on_result is not None:
+            on_result(result)
+
+    def add(result: ItemResult) -> None:
+        store.add(result, config_fingerprint, experiment_config)
+        put(result)
+
+    try:
+        # Reused results get new trace IDs, as their traces belong to the
+        # experiments that produced them
+        reused = [
+            dataclasses.replace(
+                result, trace_id=id_helpers.generate_id(result.start_time)
+            )
+            for result in plan.reused
+        ]
+        for result in reused:
+            put(result)
+        results = run_items(get_answer, plan.to_run, task_threads, on_result=add)
+    finally:
+        writer.close()
+
+    return EvaluationResult(
+        experiment_id=writer.experiment_id,
+        experiment_name=writer.experiment_name,
+        test_results=[result.to_test_result() for result in reused + results],
+    )
@@ -0,0 +1,367 @@
+"""
+Load generation against an agent, the HTTP serving endpoint, or a local stand-in
+LLM, with throughput, error rate and latency percentiles reported over time.
+
+Open-loop mode sends requests at a target rate regardless of how fast they
+complete, which is how real traffic behaves. Closed-loop mode keeps a fixed number
+of clients busy, each one sending its next request when the previous one returns.
+"""
+
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+from beach_challenge_problem.problem import Problem, ProblemGenerator
+
+SendFn = Callable[[str], Awaitable[float]]
+
+
+@dataclass
+class RequestRecord:
+    """
+    Timing and outcome of one request. `start` is relative to the start of the run.
+    """
+
+    start: float
+    latency: float
+    ok: bool
+    error: str | None = None
+
+
+async def _timed(send: SendFn, question: str, t0: float) -> RequestRecord:
+    start = time.perf_counter()
+    try:
+        await send(question)
+    except Exception as e:
+        return RequestRecord(start - t0, time.perf_counter() - start, False, repr(e))
+    return RequestRecord(start - t0, time.perf_counter() - start, True)
+
+
+async def run_open_loop(
+    send: SendFn,
+    questions: list[str],
+    qps: float,
+    duration: float,
+    max_in_flight: int = 10_000,
+) -> list[RequestRecord]:
+    """
+    Sends requests with Poisson arrivals at `qps` requests per second.
+
+    Args:
+        send: Coroutine function sending one question
+        questions: Questions replayed in a loop
+        qps: Target number of requests per second
+        duration: Number of seconds during which requests are sent
+        max_in_flight: Requests are dropped (and counted as errors) beyond this
+            number of outstanding requests, to protect the load generator
+
+    Returns:
+        One record per request
+    """
+    t0 = time.perf_counter()
+    tasks: list[asyncio.Task] = []
+    dropped: list[RequestRecord] = []
+    in_flight = 0
+
+    async def tracked(question: str) -> RequestRecord:
+        nonlocal in_flight
+        in_flight += 1
+        try:
+            return await _timed(send, question, t0)
+        finally:
+            in_flight -= 1
+
+    next_arrival = 0.0
+    i = 0
+    while next_arrival < duration:
+        delay = t0 + next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if in_flight >= max_in_flight:
+            dropped.append(RequestRecord(next_arrival, 0.0, False, 'dropped'))
+        else:
+            question = questions[i % len(questions)]
+            tasks.append(asyncio.create_task(tracked(question)))
+        i += 1
+        next_arrival += random.expovariate(qps)
+
+    return [*(await asyncio.gather(*tasks)), *dropped]
+
+
+async def run_closed_loop(
+    send: SendFn,
+    questions: list[str],
+    concurrency: int,
+    duration: float,
+    think_time: float = 0.0,
+) -> list[RequestRecord]:
+    """
+    Runs `concurrency` clients that each send a request as soon as their previous
+    one returned, plus an optional think time.
+
+    Args:
+        send: Coroutine function sending one question
+        questions: Questions replayed in a loop
+        concurrency: Number of concurrent clients
+        duration: Number of seconds during which requests are sent
+        think_time: Number of seconds a client waits between two requests
+
+    Returns:
+        One record per request
+    """
+    t0 = time.perf_counter()
+    records: list[RequestRecord] = []
+
+    async def client(client_id: int) -> None:
+        i = client_id
+        while time.perf_counter() - t0 < duration:
+            records.append(await _timed(send, questions[i % len(questions)], t0))
+            i += concurrency
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    return records
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """
+    Returns the q-th percentile (0-100) of the values, with the nearest-rank method.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def _stats(records: list[RequestRecord], duration: float) -> dict:
+    latencies = [r.latency for r in records if r.ok]
+    n_errors = sum(not r.ok for r in records)
+    return {
+        'n_requests': len(records),
+        'n_errors': n_errors,
+        'error_rate': n_errors / len(records) if records else 0.0,
+        'throughput': len(latencies) / duration if duration else 0.0,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies, default=None),
+    }
+
+
+def summarize(records: list[RequestRecord], window: float = 1.0) -> dict:
+    """
+    Aggregates the records of a run over the whole run and per time window.
+
+    Args:
+        records: Records returned by `run_open_loop` or `run_closed_loop`
+        window: Length in seconds of the time windows of the timeline
+
+    Returns:
+        Dictionary with a 'summary' of the run and a 'timeline' of per-window stats
+    """
+    if not records:
+        return {'summary': _stats([], 0.0), 'timeline': []}
+
+    duration = max(r.start + r.latency for r in records)
+    windows: dict[int, list[RequestRecord]] = {}
+    for record in records:
+        # requests are assigned to the window in which they completed
+        windows.setdefault(int((record.start + record.latency) // window), []).append(
+            record
+        )
+
+    timeline = [
+        {'t': index * window, **_stats(windows.get(index, []), window)}
+        for index in range(int(duration // window) + 1)
+    ]
+    return {'summary': _stats(records, duration), 'timeline': timeline}
+
+
+def get_machine_metadata() -> dict:
+    """
+    Returns information about the machine and code version a run was made with.
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'timestamp': datetime.datetime.now(datetime.UTC).isoformat(),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def save_report(
+    records: list[RequestRecord], config: dict, path: str | Path, window: float = 1.0
+) -> dict:
+    """
+    Writes the summary, timeline and raw records of a run to a JSON file.
+
+    Returns:
+        The report that was written
+    """
+    report = {
+        'config': config,
+        'metadata': get_machine_metadata(),
+        **summarize(records, window),
+        'records': [asdict(r) for r in records],
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+    return report
+
+
+def compare_reports(baseline: dict, candidate: dict) -> dict[str, dict]:
+    """
+    Compares the summaries of two load test reports.
+
+    Returns:
+        Dictionary mapping each summary metric to its baseline and candidate values
+        and the relative change
+    """
+    comparison = {}
+    for name, base in baseline['summary'].items():
+        new = candidate['summary'].get(name)
+        change = (new - base) / base if base and new is not None else None
+        comparison[name] = {'baseline': base, 'candidate': new, 'change': change}
+    return comparison
+
+
+def generate_questions(n_questions: int = 1000, seed: int = 0) -> list[str]:
+    """
+    Returns questions sampled with `ProblemGenerator`, the same for a given seed.
+    The global random state is left untouched.
+    """
+    batch = ProblemGenerator().generate_batch(n_questions, seed=seed)
+    return [batch[i].get_question() for i in range(len(batch))]
+
+
+def http_sender(session: aiohttp.ClientSession, url: str) -> SendFn:
+    """
+    Returns a function sending questions to the `/solve` endpoint of `serving.py`.
+    """
+
+    async def send(question: str) -> float:
+        async with session.post(url, json={'problem': question}) as response:
+            response.raise_for_status()
+            return (await response.json())['answer']
+
+    return send
+
+
+def create_mock_llm_app(
+    latency: float = 1.0, latency_sigma: float = 0.5, error_rate: float = 0.0
+) -> web.Application:
+    """
+    Creates a stand-in for an OpenAI-compatible LLM endpoint, to load test agents
+    with the openai-generic provider without calling a real model.
+
+    Known problems are answered with their exact solution, after a log-normally
+    distributed delay. System messages seen before are reported as cached prompt
+    tokens, like the prefix caching of OpenAI.
+
+    Args:
+        latency: Median response time in seconds
+        latency_sigma: Standard deviation of the log of the response time
+        error_rate: Fraction of requests answered with a 500 error
+    """
+
+    seen_prefixes = set()
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(random.lognormvariate(math.log(latency), latency_sigma))
+        if random.random() < error_rate:
+            return web.json_response({'error': 'mock failure'}, status=500)
+
+        texts = {}
+        for message in body['messages']:
+            content = message['content']
+            if isinstance(content, list):
+                content = ' '.join(part.get('text', '') for part in content)
+            texts[message['role']] = texts.get(message['role'], '') + content
+        content = texts.get('user', '')
+        prompt = texts.get('system', '') + content
+        cached_tokens = len(texts.get('system', '')) // 4
+        if texts.get('system') not in seen_prefixes:
+            seen_prefixes.add(texts.get('system'))
+            cached_tokens = 0
+
+        problem = Problem.from_question(content.strip().split('\n\n')[0])
+        answer = problem.get_correct_answer() if problem is not None else 0.0
+        if 'Reply with only the final answer' in prompt:
+            reply = str(answer)
+        else:
+            reply = json.dumps({'reasoning': 'mock', 'answer': answer})
+
+        return web.json_response(
+            {
+                'id': 'mock',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'mock'),
+                'choices': [
+                    {
+                        'index': 0,
+                        'message': {
+                            'role': 'assistant',
+                            'content': reply,
+                        },
+                        'finish_reason': 'stop',
+                    }
+                ],
+                'usage': {
+                    'prompt_tokens': len(prompt) // 4,
+                    'completion_tokens': 10,
+                    'total_tokens': len(prompt) // 4 + 10,
+                    'prompt_tokens_details': {'cached_tokens': cached_tokens},
+                },
+            }
+        )
+
+    async def generate(request: web.Request) -> web.Response:
+        # Ollama's native endpoint, only used to load models
+        body = await request.json()
+        return web.json_response(
+            {'model': body.get('model', 'mock'), 'response': '', 'done': True}
+        )
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat_completions)
+    app.router.add_post('/api/generate', generate)
+    return app
+
+
+async def start_mock_llm(port: int = 8100, **kwargs) -> web.AppRunner:
+    """
+    Starts the stand-in LLM endpoint on localhost in the running event loop.
+
+    Returns:
+        The runner, to be cleaned up with `await runner.cleanup()`
+    """
+    runner = web.AppRunner(create_mock_llm_app(**kwargs))
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
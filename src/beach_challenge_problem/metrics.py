@@ -2,10 +2,26 @@
 Evaluation metrics for the beach challenge problem.
 """
 
+import functools
 from typing import Any
 
 from opik.evaluation.metrics import base_metric, score_result
 
+from beach_challenge_problem.profiling import span
+
+
+def traced_score(score):
+    """
+    Decorator recording each call of a metric's `score` method as a profiling span.
+    """
+
+    @functools.wraps(score)
+    def wrapper(self, *args, **kwargs):
+        with span(f'metric.{self.name}'):
+            return score(self, *args, **kwargs)
+
+    return wrapper
+
 
 class RelativeErrorMetric(base_metric.BaseMetric):
     """
@@ -17,6 +33,7 @@ class RelativeErrorMetric(base_metric.BaseMetric):
     def __init__(self, name: str = "relative_error"):
         self.name = name
 
+    @traced_score
     def score(self, answer: dict, expected_output: dict, **ignored_kwargs: Any):
         """
         Compute the relative error between predicted and expected answers.
@@ -59,6 +76,7 @@ class WithinBoundsMetric(base_metric.BaseMetric):
         self.tolerance = tolerance
         self.name = name
 
+    @traced_score
     def score(self, answer: dict, expected_output: dict, **ignored_kwargs: Any) -> score_result.ScoreResult:
         """
         Compute whether the relative error is within the specified tolerance.
@@ -86,4 +104,33 @@ class WithinBoundsMetric(base_metric.BaseMetric):
             value=within_bounds * 1.0,  # Convert to float
             name=self.name,
             reason=reason
-        )
\ No newline at end of file
+        )
+
+
+def get_scoring_metrics() -> list[base_metric.BaseMetric]:
+    """
+    Returns the metrics every evaluation is scored with.
+    """
+    return [
+        RelativeErrorMetric(name='relative_error'),
+        WithinBoundsMetric(tolerance=0.01, name='within_1_percent'),
+    ]
+
+
+def get_average_scores(evaluation) -> dict[str, float]:
+    """
+    Averages each metric over the test results of an Opik evaluation.
+
+    Args:
+        evaluation: The evaluation results returned by `GenericAgent.evaluate`
+
+    Returns:
+        Dictionary mapping each metric name to its average value
+    """
+    values: dict[str, list[float]] = {}
+    for test_result in evaluation.test_results:
+        for result in test_result.score_results:
+            if not result.scoring_failed:
+                values.setdefault(result.name, []).append(result.value)
+
+    return {name: sum(v) / len(v) for name, v in values.items()}
@@ -0,0 +1,420 @@
+"""
+The Beach Challenge Problem: parametrized problem instances, their exact solution
+and a random generator of problems.
+"""
+
+import math
+import random
+import re
+import string
+
+import numpy as np
+
+PARAMETER_NAMES = (
+    'buoy_offshore_distance',
+    'buoy_angle',
+    'sofia_speed',
+    'ocean_current_speed',
+    'kai_initial_speed',
+    'kai_change_direction_time',
+    'kai_final_speed',
+    'final_time',
+)
+
+# Kai always turns after exactly 1 hour in the question text, so
+# `kai_change_direction_time` is not part of the template.
+QUESTION_TEMPLATE = "Kai and Sofia start at the same point on a beach. Sofia decides to swim directly toward a buoy that's {buoy_offshore_distance} km offshore at a {buoy_angle}° angle from the shoreline. She swims at {sofia_speed} km/hour, but ocean currents push her sideways at {ocean_current_speed} km/hour perpendicular to her intended direction. Meanwhile, Kai takes his longboard and paddles along the shoreline at {kai_initial_speed} km/hour for the first hour. After exactly 1 hour, he turns and paddles directly toward Sofia's current position at {kai_final_speed} km/hour (slower because he's now fighting waves). If both continue for a total of {final_time} hours from the start, what is the distance between them at the end?"
+
+# Parameter-only version of the question, used to save prompt tokens
+COMPACT_QUESTION_TEMPLATE = "Beach problem. Axes: x along the shoreline, y offshore; Kai and Sofia start at the origin. Sofia: heads toward a buoy {buoy_offshore_distance} km away at {buoy_angle}° from the shoreline at {sofia_speed} km/h, plus a {ocean_current_speed} km/h current perpendicular to her heading (rotated 90° counterclockwise). Constant velocity. Kai: along the shoreline at {kai_initial_speed} km/h until t={kai_change_direction_time} h, then at {kai_final_speed} km/h in a straight line toward Sofia's position at t={kai_change_direction_time} h. Find the distance between them at t={final_time} h."
+
+_NUMBER = r'[-+]?(?:\d+(?:\.\d*)?|\.\d+)'
+
+
+def _compile_template(template: str) -> re.Pattern:
+    """
+    Turns a question template into a regex with one named group per parameter.
+    A parameter that appears several times must have the same value everywhere.
+    """
+    pattern = ''
+    seen = set()
+    for literal, field, _, _ in string.Formatter().parse(template):
+        pattern += r'\s*'.join(re.escape(word) for word in literal.split(' '))
+        if field in seen:
+            pattern += rf'\s*(?P={field})\s*'
+        elif field is not None:
+            pattern += rf'\s*(?P<{field}>{_NUMBER})\s*'
+            seen.add(field)
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _normalize_question(question: str) -> str:
+    return ' '.join(question.replace('\u2019', "'").split())
+
+
+def _parse_number(value: str | float) -> float:
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+_QUESTION_PATTERN = _compile_template(QUESTION_TEMPLATE)
+
+
+class Problem:
+    """
+    A particular instance of a BeachChallengeProblem for the given parameters in its
+    init method.
+    """
+
+    def __init__(
+        self,
+        buoy_offshore_distance: float,
+        buoy_angle: float,
+        sofia_speed: float,
+        ocean_current_speed: float,
+        kai_initial_speed: float,
+        kai_change_direction_time: float,
+        kai_final_speed: float,
+        final_time: float,
+    ):
+        self.buoy_offshore_distance = buoy_offshore_distance
+        self.buoy_angle = buoy_angle
+        self.sofia_speed = sofia_speed
+        self.ocean_current_speed = ocean_current_speed
+        self.kai_initial_speed = kai_initial_speed
+        self.kai_change_direction_time = kai_change_direction_time
+        self.kai_final_speed = kai_final_speed
+        self.final_time = final_time
+
+    def get_question(self) -> str:
+        """
+        Get the question for the problem.
+        """
+        return QUESTION_TEMPLATE.format(**vars(self))
+
+    def get_compact_question(self) -> str:
+        """
+        Get a compact, parameter-only version of the question.
+        """
+        return COMPACT_QUESTION_TEMPLATE.format(**vars(self))
+
+    @classmethod
+    def from_question(cls, question: str) -> 'Problem | None':
+        """
+        Parses a question rendered by `get_question` back into a Problem.
+
+        Whitespace, letter case and number formatting (e.g. 6 vs 6.0) are ignored.
+
+        Args:
+            question: The question text
+
+        Returns:
+            The problem with the parameters found in the question, or None if the
+            question does not follow the template
+        """
+        match = _QUESTION_PATTERN.fullmatch(_normalize_question(question))
+        if match is None:
+            return None
+
+        params = {
+            name: _parse_number(value) for name, value in match.groupdict().items()
+        }
+        return cls(**params, kai_change_direction_time=1)
+
+    def get_params(self) -> tuple[float, ...]:
+        """
+        Get the canonical tuple of problem parameters, in the order of `__init__`.
+        """
+        return tuple(float(getattr(self, name)) for name in PARAMETER_NAMES)
+
+    def get_correct_answer(self) -> float:
+        """
+        Calculate the distance between Sofia and Kai after they navigate from the same starting point.
+        """
+        return calculate_final_distance(
+            buoy_offshore_distance=self.buoy_offshore_distance,
+            buoy_angle=self.buoy_angle,
+            sofia_speed=self.sofia_speed,
+            ocean_current_speed=self.ocean_current_speed,
+            kai_initial_speed=self.kai_initial_speed,
+            kai_change_direction_time=self.kai_change_direction_time,
+            kai_final_speed=self.kai_final_speed,
+            final_time=self.final_time,
+        )
+
+
+def calculate_final_distance(
+    buoy_offshore_distance: float,
+    buoy_angle: float,
+    sofia_speed: float,
+    ocean_current_speed: float,
+    kai_initial_speed: float,
+    kai_change_direction_time: float,
+    kai_final_speed: float,
+    final_time: float,
+) -> float:
+    """
+    Calculate the distance between Sofia and Kai after they navigate from the same starting point.
+
+    Args:
+        buoy_offshore_distance: Distance to buoy in km
+        buoy_angle: Angle of buoy from shoreline in degrees
+        sofia_speed: Sofia's swimming speed toward buoy in km/h
+        ocean_current_speed: Ocean current speed perpendicular to Sofia's intended direction in km/h
+        kai_initial_speed: Kai's speed along shoreline in km/h
+        kai_change_direction_time: Time when Kai changes direction in hours
+        kai_final_speed: Kai's speed when paddling toward Sofia in km/h
+        final_time: Total time for the journey in hours
+
+    Returns:
+        Distance between Sofia and Kai at final_time in km
+    """
+    # Convert angle to radians
+    buoy_angle_rad = math.radians(buoy_angle)
+
+    # Calculate buoy position (using shoreline as x-axis, perpendicular as y-axis)
+    buoy_x = buoy_offshore_distance * math.cos(buoy_angle_rad)
+    buoy_y = buoy_offshore_distance * math.sin(buoy_angle_rad)
+
+    # Sofia's intended direction (unit vector toward buoy)
+    sofia_intended_x = buoy_x / buoy_offshore_distance
+    sofia_intended_y = buoy_y / buoy_offshore_distance
+
+    # Perpendicular direction to Sofia's intended path (90° counterclockwise rotation)
+    perp_x = -sofia_intended_y
+    perp_y = sofia_intended_x
+
+    # Sofia's actual velocity (intended speed + current drift)
+    sofia_vel_x = sofia_speed * sofia_intended_x + ocean_current_speed * perp_x
+    sofia_vel_y = sofia_speed * sofia_intended_y + ocean_current_speed * perp_y
+
+    # Sofia's final position (constant velocity throughout)
+    sofia_final_x = sofia_vel_x * final_time
+    sofia_final_y = sofia_vel_y * final_time
+
+    # Kai's position at direction change time
+    kai_change_x = kai_initial_speed * kai_change_direction_time
+    kai_change_y = 0.0  # Kai moves along shoreline initially
+
+    # Sofia's position when Kai changes direction
+    sofia_at_change_x = sofia_vel_x * kai_change_direction_time
+    sofia_at_change_y = sofia_vel_y * kai_change_direction_time
+
+    # Calculate Kai's direction toward Sofia's position at change time
+    delta_x = sofia_at_change_x - kai_change_x
+    delta_y = sofia_at_change_y - kai_change_y
+    distance_to_sofia = math.sqrt(delta_x**2 + delta_y**2)
+
+    # Handle edge case where Kai and Sofia are at same position
+    if distance_to_sofia == 0:
+        kai_dir_x, kai_dir_y = 0.0, 0.0
+    else:
+        kai_dir_x = delta_x / distance_to_sofia
+        kai_dir_y = delta_y / distance_to_sofia
+
+    # Kai's movement in second phase
+    phase_2_duration = final_time - kai_change_direction_time
+    phase_2_distance = kai_final_speed * phase_2_duration
+
+    # Kai's final position
+    kai_final_x = kai_change_x + phase_2_distance * kai_dir_x
+    kai_final_y = kai_change_y + phase_2_distance * kai_dir_y
+
+    # Calculate final distance between them
+    final_distance = math.sqrt(
+        (sofia_final_x - kai_final_x) ** 2 + (sofia_final_y - kai_final_y) ** 2
+    )
+
+    return final_distance
+
+
+def calculate_final_distances(
+    buoy_offshore_distance: np.ndarray,
+    buoy_angle: np.ndarray,
+    sofia_speed: np.ndarray,
+    ocean_current_speed: np.ndarray,
+    kai_initial_speed: np.ndarray,
+    kai_change_direction_time: np.ndarray,
+    kai_final_speed: np.ndarray,
+    final_time: np.ndarray,
+) -> np.ndarray:
+    """
+    Vectorized version of `calculate_final_distance`, solving many problems at once.
+
+    Args:
+        Same as `calculate_final_distance`, with one array element per problem
+
+    Returns:
+        Distance between Sofia and Kai at final_time in km, for each problem
+    """
+    buoy_angle_rad = np.radians(buoy_angle)
+    sofia_intended_x = np.cos(buoy_angle_rad)
+    sofia_intended_y = np.sin(buoy_angle_rad)
+
+    sofia_vel_x = (
+        sofia_speed * sofia_intended_x - ocean_current_speed * sofia_intended_y
+    )
+    sofia_vel_y = (
+        sofia_speed * sofia_intended_y + ocean_current_speed * sofia_intended_x
+    )
+
+    kai_change_x = kai_initial_speed * kai_change_direction_time
+
+    delta_x = sofia_vel_x * kai_change_direction_time - kai_change_x
+    delta_y = sofia_vel_y * kai_change_direction_time
+    distance_to_sofia = np.hypot(delta_x, delta_y)
+
+    # Kai stays put if he is already at Sofia's position when he turns
+    phase_2_distance = kai_final_speed * (final_time - kai_change_direction_time)
+    scale = np.divide(
+        phase_2_distance,
+        distance_to_sofia,
+        out=np.zeros_like(distance_to_sofia),
+        where=distance_to_sofia != 0,
+    )
+
+    kai_final_x = kai_change_x + scale * delta_x
+    kai_final_y = scale * delta_y
+
+    return np.hypot(
+        sofia_vel_x * final_time - kai_final_x, sofia_vel_y * final_time - kai_final_y
+    )
+
+
+class ProblemBatch:
+    """
+    Many problems stored as one array of parameters, for vectorized computations.
+    """
+
+    def __init__(self, params: np.ndarray):
+        """
+        Args:
+            params: Array of shape (n_problems, 8) with the parameters in the order
+                of `PARAMETER_NAMES`
+        """
+        self.params = np.asarray(params, dtype=np.float64).reshape(
+            -1, len(PARAMETER_NAMES)
+        )
+
+    @classmethod
+    def from_problems(cls, problems: list[Problem]) -> 'ProblemBatch':
+        return cls(np.array([problem.get_params() for problem in problems]))
+
+    def __len__(self) -> int:
+        return len(self.params)
+
+    def __getitem__(self, index: int) -> Problem:
+        values = self.params[index].tolist()
+        return Problem(
+            **{
+                name: _parse_number(value)
+                for name, value in zip(PARAMETER_NAMES, values, strict=True)
+            }
+        )
+
+    def get_column(self, name: str) -> np.ndarray:
+        """
+        Returns the values of one parameter for all the problems.
+        """
+        return self.params[:, PARAMETER_NAMES.index(name)]
+
+    def get_correct_answers(self) -> np.ndarray:
+        """
+        Calculate the correct answer of every problem in the batch.
+        """
+        return calculate_final_distances(
+            **{name: self.get_column(name) for name in PARAMETER_NAMES}
+        )
+
+
+class ProblemGenerator:
+    def __init__(self):
+        """
+        Sets range of possible values for the problem parameters:
+        - buoy_offshore_distance: float
+        - buoy_angle: float
+        - sofia_speed: float
+        - ocean_current_speed: float
+        - kai_initial_speed: float
+        - kai_change_direction_time: float
+        - kai_final_speed: float
+        - final_time: float
+        """
+        self.buoy_offshore_distance_range = (5, 10)
+        self.buoy_angle_range = (15, 45)
+        self.sofia_speed_range = (1, 3)
+        self.ocean_current_speed_range = (0, 2)
+        self.kai_initial_speed_range = (2, 5)
+        self.kai_change_direction_time_range = (1, 2)
+        self.kai_final_speed_range = (1, 4)
+        self.time_range = (2, 3)
+
+    def generate_problems(self, n_problems: int) -> list[Problem]:
+        """
+        Generate a problem with the given parameters.
+        """
+        problems = []
+        for _ in range(n_problems):
+            # sample random parameters
+            buoy_offshore_distance = random.randint(
+                self.buoy_offshore_distance_range[0],
+                self.buoy_offshore_distance_range[1],
+            )
+            buoy_angle = random.randint(
+                self.buoy_angle_range[0], self.buoy_angle_range[1]
+            )
+            sofia_speed = random.randint(
+                self.sofia_speed_range[0], self.sofia_speed_range[1]
+            )
+            ocean_current_speed = random.randint(
+                self.ocean_current_speed_range[0], self.ocean_current_speed_range[1]
+            )
+            kai_initial_speed = random.randint(
+                self.kai_initial_speed_range[0], self.kai_initial_speed_range[1]
+            )
+            kai_change_direction_time = random.randint(
+                self.kai_change_direction_time_range[0],
+                self.kai_change_direction_time_range[1],
+            )
+            kai_final_speed = random.randint(
+                self.kai_final_speed_range[0], self.kai_final_speed_range[1]
+            )
+            final_time = random.randint(self.time_range[0], self.time_range[1])
+
+            problems.append(
+                Problem(
+                    buoy_offshore_distance=buoy_offshore_distance,
+                    buoy_angle=buoy_angle,
+                    sofia_speed=sofia_speed,
+                    ocean_current_speed=ocean_current_speed,
+                    kai_initial_speed=kai_initial_speed,
+                    kai_change_direction_time=kai_change_direction_time,
+                    kai_final_speed=kai_final_speed,
+                    final_time=final_time,
+                )
+            )
+
+        return problems
+
+    def generate_batch(self, n_problems: int, seed: int | None = None) -> ProblemBatch:
+        """
+        Generate problems from the same distribution as `generate_problems`, as a
+        ProblemBatch.
+        """
+        ranges = np.array(
+            [
+                self.buoy_offshore_distance_range,
+                self.buoy_angle_range,
+                self.sofia_speed_range,
+                self.ocean_current_speed_range,
+                self.kai_initial_speed_range,
+                self.kai_change_direction_time_range,
+                self.kai_final_speed_range,
+                self.time_range,
+            ]
+        )
+        rng = np.random.default_rng(seed)
+        params = rng.integers(
+            ranges[:, 0], ranges[:, 1], size=(n_problems, len(ranges)), endpoint=True
+        )
+        return ProblemBatch(params)
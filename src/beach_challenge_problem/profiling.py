@@ -0,0 +1,160 @@
+"""
+Lightweight profiler for the agent pipeline, exported as a Chrome trace.
+
+BAML's own `trace` helpers ship spans to Boundary Studio, so this module keeps
+spans locally instead. Open the exported file in https://ui.perfetto.dev or
+chrome://tracing to see where the time of an evaluation run goes.
+"""
+
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from baml_py import Collector
+
+
+class Profiler:
+    """
+    Records named spans from any thread. Recording is a no-op until enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._events: list[dict] = []
+        self._lock = threading.Lock()
+        # offset to convert wall-clock timestamps (e.g. from BAML) to perf_counter
+        self._wall_offset = time.time() - time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[None]:
+        """
+        Context manager recording the time spent in its body as a span.
+
+        Args:
+            name: Name of the span, e.g. 'agent.get_answer'
+            **args: Extra attributes attached to the span
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter(), **args)
+
+    def add_span(self, name: str, start: float, end: float, **args) -> None:
+        """
+        Records a span between two `time.perf_counter` timestamps.
+        """
+        if not self.enabled:
+            return
+
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': start * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            self._events.append(event)
+
+    def add_baml_spans(self, collector: Collector) -> None:
+        """
+        Records the HTTP time of the last BAML call reported to the collector, and
+        the remaining time spent by BAML rendering the prompt and parsing the output.
+        """
+        if not self.enabled or collector.last is None:
+            return
+
+        log = collector.last
+        if log.timing.duration_ms is None:
+            return
+        start = log.timing.start_time_utc_ms / 1000 - self._wall_offset
+        duration = log.timing.duration_ms / 1000
+
+        http_duration = 0.0
+        for call in log.calls:
+            if call.timing.duration_ms is None:
+                continue
+            call_start = call.timing.start_time_utc_ms / 1000 - self._wall_offset
+            call_duration = call.timing.duration_ms / 1000
+            http_duration += call_duration
+            self.add_span(
+                'baml.http',
+                call_start,
+                call_start + call_duration,
+                client=call.client_name,
+                provider=call.provider,
+            )
+
+        self.add_span(
+            'baml.render_and_parse',
+            start,
+            start + max(duration - http_duration, 0.0),
+            function=log.function_name,
+        )
+
+    def get_summary(self) -> dict[str, dict]:
+        """
+        Aggregates the recorded spans by name.
+
+        Returns:
+            Dictionary mapping each span name to its count, total, mean and max
+            duration in seconds
+        """
+        with self._lock:
+            events = list(self._events)
+
+        summary: dict[str, dict] = {}
+        for event in events:
+            stats = summary.setdefault(
+                event['name'], {'count': 0, 'total': 0.0, 'max': 0.0}
+            )
+            duration = event['dur'] / 1e6
+            stats['count'] += 1
+            stats['total'] += duration
+            stats['max'] = max(stats['max'], duration)
+
+        for stats in summary.values():
+            stats['mean'] = stats['total'] / stats['count']
+        return dict(sorted(summary.items(), key=lambda kv: -kv[1]['total']))
+
+    def export_chrome_trace(self, path: str | Path) -> Path:
+        """
+        Writes the recorded spans to a Chrome trace event file.
+
+        Args:
+            path: Path of the JSON file to write
+
+        Returns:
+            The path of the written file
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            trace = {'traceEvents': list(self._events), 'displayTimeUnit': 'ms'}
+        path.write_text(json.dumps(trace))
+        return path
+
+
+profiler = Profiler()
+
+
+def enable_profiling() -> Profiler:
+    """
+    Starts recording spans in the global profiler.
+    """
+    profiler.enabled = True
+    return profiler
+
+
+span = profiler.span
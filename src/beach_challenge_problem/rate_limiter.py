@@ -0,0 +1,374 @@
+"""
+Client-side adaptive rate limiting for LLM providers.
+
+BAML retry policies defined in `clients.baml` do not apply to the clients we
+register at runtime through a `ClientRegistry`, so agents use the limiter in this
+module to pace their requests and to retry rate-limited calls.
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any, TypeVar
+
+from baml_py import Collector
+from baml_py.errors import BamlClientHttpError
+from loguru import logger
+
+from beach_challenge_problem.profiling import span
+
+T = TypeVar('T')
+
+# HTTP status codes worth retrying after a backoff
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Longest time between two successful requests that counts towards the additive
+# increase, so that a request after an idle period does not jump the rate up
+MAX_INCREASE_INTERVAL = 1.0
+
+# Header names used by the providers we support to advertise their limits
+LIMIT_HEADERS = ('anthropic-ratelimit-requests-limit', 'x-ratelimit-limit-requests')
+REMAINING_HEADERS = (
+    'anthropic-ratelimit-requests-remaining',
+    'x-ratelimit-remaining-requests',
+)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to the limits reported by the provider.
+
+    The rate grows linearly in time while requests succeed and is cut
+    multiplicatively on every 429 (AIMD). Since the growth does not depend on how
+    many requests are sent, the throughput converges to the provider's real limit
+    instead of oscillating around it. When the provider
+    sends rate-limit headers, the rate is capped to the advertised limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float = 10.0,
+        burst: int = 10,
+        min_rate: float = 0.1,
+        max_rate: float = 100.0,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+    ):
+        """
+        Args:
+            name: Name of the provider this limiter paces
+            rate: Initial number of requests per second. `math.inf` disables the
+                pacing, e.g. for benchmarks against a local server, while still
+                retrying failed requests
+            burst: Maximum number of tokens the bucket can hold
+            min_rate: Lower bound for the adapted rate (requests per second)
+            max_rate: Upper bound for the adapted rate (requests per second),
+                raised to the initial rate if it is lower
+            increase: Requests per second added per second of successful requests
+            decrease: Factor applied to the rate after each rate-limited request
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_increase = time.monotonic()
+        self._lock = threading.Lock()
+
+        # metrics
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._n_requests = 0
+        self._n_rate_limited = 0
+        self._total_wait = 0.0
+
+    def _refill(self, now: float) -> None:
+        if math.isinf(self.rate):
+            self._tokens = float(self.burst)
+            self._last_refill = now
+            return
+        elapsed = now - self._last_refill
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request can be sent to the provider.
+
+        Returns:
+            The number of seconds spent waiting
+        """
+        with span('rate_limiter.acquire', provider=self.name):
+            return self._acquire()
+
+    async def acquire_async(self) -> float:
+        """
+        Async version of `acquire`, waiting on the event loop rather than in a
+        worker thread, which could starve the default executor.
+        """
+        with span('rate_limiter.acquire', provider=self.name):
+            start = time.monotonic()
+            self._enter_queue()
+            try:
+                while (wait := self._try_acquire(start)) > 0:
+                    await asyncio.sleep(wait)
+            finally:
+                self._leave_queue()
+            return time.monotonic() - start
+
+    def _acquire(self) -> float:
+        start = time.monotonic()
+        self._enter_queue()
+        try:
+            while (wait := self._try_acquire(start)) > 0:
+                time.sleep(wait)
+        finally:
+            self._leave_queue()
+        return time.monotonic() - start
+
+    def _enter_queue(self) -> None:
+        with self._lock:
+            self._queue_depth += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+
+    def _leave_queue(self) -> None:
+        with self._lock:
+            self._queue_depth -= 1
+
+    def _try_acquire(self, start: float) -> float:
+        """
+        Takes a token if one is available and returns 0, otherwise returns the
+        number of seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self._blocked_until and self._tokens >= 1:
+                self._tokens -= 1
+                self._n_requests += 1
+                self._total_wait += now - start
+                return 0.0
+            return max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+
+    def on_success(self, headers: Mapping[str, Any] | None = None) -> None:
+        """
+        Additively increases the rate by `increase` per second elapsed since the
+        last adjustment.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = min(now - self._last_increase, MAX_INCREASE_INTERVAL)
+            self._last_increase = now
+            self.rate = min(self.max_rate, self.rate + self.increase * elapsed)
+            self._apply_headers(headers or {})
+
+    def on_rate_limited(
+        self, retry_after: float | None = None, headers: Mapping[str, Any] | None = None
+    ) -> None:
+        """
+        Multiplicatively decreases the rate after a rate-limited request, and stops
+        sending requests for `retry_after` seconds if the provider asked us to.
+        """
+        with self._lock:
+            self._n_rate_limited += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._last_increase = time.monotonic()
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after is not None:
+                self._blocked_until = max(
+                    self._blocked_until, time.monotonic() + retry_after
+                )
+            self._apply_headers(headers or {})
+
+        logger.warning(
+            f'Rate limited by {self.name}, slowing down to {self.rate:.2f} req/s'
+        )
+
+    def _apply_headers(self, headers: Mapping[str, Any]) -> None:
+        headers = {k.lower(): v for k, v in headers.items()}
+
+        limit = _first_number(headers, LIMIT_HEADERS)
+        if limit is not None and limit > 0:
+            # Limits are advertised per minute
+            self.rate = min(self.rate, limit / 60.0)
+
+        remaining = _first_number(headers, REMAINING_HEADERS)
+        if remaining is not None:
+            self._tokens = min(self._tokens, remaining)
+
+    def call(
+        self,
+        fn: Callable[[Collector], T],
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ) -> T:
+        """
+        Calls `fn` once the limiter allows it, retrying retryable HTTP errors with
+        jittered exponential backoff.
+
+        Args:
+            fn: Function that performs the BAML call, reporting to the given collector
+            max_retries: Maximum number of retries after the first attempt
+            base_delay: Backoff delay in seconds before the first retry
+            max_delay: Maximum backoff delay in seconds
+
+        Returns:
+            The return value of `fn`
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire()
+            collector = Collector(name=f'{self.name}-rate-limiter')
+            try:
+                result = fn(collector)
+            except BamlClientHttpError as e:
+                delay = self._backoff(
+                    e, collector, attempt, max_retries, base_delay, max_delay
+                )
+                time.sleep(delay)
+            else:
+                self.on_success(_last_response_headers(collector))
+                return result
+
+        raise AssertionError('unreachable')
+
+    async def call_async(
+        self,
+        fn: Callable[[Collector], Awaitable[T]],
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ) -> T:
+        """
+        Async version of `call`, for coroutines built with the async BAML client.
+        """
+        for attempt in range(max_retries + 1):
+            await self.acquire_async()
+            collector = Collector(name=f'{self.name}-rate-limiter')
+            try:
+                result = await fn(collector)
+            except BamlClientHttpError as e:
+                delay = self._backoff(
+                    e, collector, attempt, max_retries, base_delay, max_delay
+                )
+                await asyncio.sleep(delay)
+            else:
+                self.on_success(_last_response_headers(collector))
+                return result
+
+        raise AssertionError('unreachable')
+
+    def _backoff(
+        self,
+        error: BamlClientHttpError,
+        collector: Collector,
+        attempt: int,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+    ) -> float:
+        """
+        Returns how long to wait before retrying, or re-raises the error if the
+        request should not be retried.
+        """
+        if error.status_code not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+            raise error
+
+        headers = _last_response_headers(collector)
+        retry_after = _retry_after(headers)
+        if error.status_code == 429:
+            self.on_rate_limited(retry_after, headers)
+
+        # Full jitter backoff, never shorter than what the provider asked for
+        delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+        delay = max(delay, retry_after or 0.0)
+        logger.info(
+            f'{self.name} returned {error.status_code}, retrying in {delay:.2f}s '
+            f'(attempt {attempt + 1}/{max_retries})'
+        )
+        return delay
+
+    def get_metrics(self) -> dict:
+        """
+        Returns the current state of the limiter.
+
+        Returns:
+            A dictionary with the current rate, queue depth and request counters
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'rate': self.rate,
+                'queue_depth': self._queue_depth,
+                'max_queue_depth': self._max_queue_depth,
+                'n_requests': self._n_requests,
+                'n_rate_limited': self._n_rate_limited,
+                'avg_wait': self._total_wait / self._n_requests
+                if self._n_requests
+                else 0.0,
+            }
+
+
+_rate_limiters: dict[str, AdaptiveRateLimiter] = {}
+_rate_limiter_kwargs: dict[str, dict] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, **kwargs) -> AdaptiveRateLimiter:
+    """
+    Returns the rate limiter shared by every agent calling the given provider.
+
+    Args:
+        provider: Name of the provider, e.g. 'anthropic'
+        **kwargs: Arguments passed to `AdaptiveRateLimiter` on first creation.
+            Later calls for the same provider share the first limiter, whatever
+            their arguments
+
+    Returns:
+        The rate limiter for the provider
+    """
+    with _rate_limiters_lock:
+        if provider not in _rate_limiters:
+            _rate_limiters[provider] = AdaptiveRateLimiter(name=provider, **kwargs)
+            _rate_limiter_kwargs[provider] = kwargs
+        elif kwargs and kwargs != _rate_limiter_kwargs[provider]:
+            logger.warning(
+                f'Reusing the {provider} rate limiter created with '
+                f'{_rate_limiter_kwargs[provider]}, ignoring {kwargs}'
+            )
+        return _rate_limiters[provider]
+
+
+def _first_number(headers: Mapping[str, Any], names: tuple[str, ...]) -> float | None:
+    for name in names:
+        try:
+            return float(headers[name])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def _retry_after(headers: Mapping[str, Any]) -> float | None:
+    headers = {k.lower(): v for k, v in headers.items()}
+    retry_after_ms = _first_number(headers, ('retry-after-ms',))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    return _first_number(headers, ('retry-after',))
+
+
+def _last_response_headers(collector: Collector) -> dict:
+    log = collector.last
+    if log is None or not log.calls:
+        return {}
+    response = log.calls[-1].http_response
+    return dict(response.headers) if response is not None else {}
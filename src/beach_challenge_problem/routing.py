@@ -0,0 +1,502 @@
+"""
+Routing of problems to the cheapest model expected to solve them.
+
+`RoutingPolicy` is fitted offline from the results stored by incremental
+evaluations. Problems are grouped by cheap features of their text, i.e. the
+question template and the magnitude of the parameters, and each group is routed
+to the cheapest agent whose accuracy on the group is above a target with high
+confidence. Groups with too few results fall back to the accuracy of the agent on
+the group sharing all their features but the last one, down to all problems.
+`RouterAgent` applies the policy at request time and reports the cost, latency
+and accuracy it actually achieves.
+
+Agents are told apart by their model and all their other parameters, so that e.g.
+the full, compact and answer-only prompts of a model are routed to separately.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from beach_challenge_problem.agents.generic_agent import GenericAgent
+from beach_challenge_problem.evaluation import ItemResult
+from beach_challenge_problem.incremental import ResultStore
+from beach_challenge_problem.problem import PARAMETER_NAMES
+from beach_challenge_problem.profiling import span
+from beach_challenge_problem.sequential import wilson_interval
+from beach_challenge_problem.templates import TEMPLATES
+
+# Upper bounds of the bins of the parameters used as routing features
+ANGLE_BINS = (25, 35)
+DISTANCE_BINS = (7,)
+
+# Maximum number of routed problems kept to match them with their scores
+MAX_TRACKED_ROUTES = 10_000
+
+
+def _bin(value: float, bounds: tuple[float, ...]) -> int:
+    return sum(value >= bound for bound in bounds)
+
+
+def get_features(problem: str) -> tuple[str, ...]:
+    """
+    Returns the routing features of a problem, computed from its text only, from
+    the most to the least significant.
+
+    Args:
+        problem: The problem statement as a string
+
+    Returns:
+        The name of the question template, then binned parameters, or
+        ('unparsed',) if the problem follows none of the templates
+    """
+    parsed = TEMPLATES.parse(problem)
+    if parsed is None:
+        return ('unparsed',)
+    name, parsed = parsed
+    params = dict(zip(PARAMETER_NAMES, parsed.get_params(), strict=True))
+    return (
+        name,
+        'current' if params['ocean_current_speed'] else 'no_current',
+        f'time_{params["final_time"]:g}',
+        f'angle_{_bin(params["buoy_angle"], ANGLE_BINS)}',
+        f'distance_{_bin(params["buoy_offshore_distance"], DISTANCE_BINS)}',
+    )
+
+
+def _get_levels(features: tuple[str, ...]) -> list[str]:
+    """
+    Returns the keys of the groups of a problem, from the most specific one, the
+    full features, to all problems, dropping the last feature at each level.
+    """
+    return ['|'.join(features[:i]) for i in range(len(features), -1, -1)]
+
+
+@dataclass
+class RoutingRecord:
+    """
+    Outcome of one agent on one problem.
+    """
+
+    input: str
+    agent: str
+    correct: bool
+    latency: float
+
+
+def get_agent_name(experiment_config: dict[str, Any]) -> str:
+    """
+    Returns the name of the agent of an experiment: its model, or its agent type
+    for agents without one, followed by its other parameters.
+
+    Example: 'anthropic/claude-sonnet-4-20250514|compact_prompt=true'
+    """
+    params = dict(experiment_config.get('agent_params') or {})
+    name = params.pop('model', None) or experiment_config['agent_type']
+    return '|'.join(
+        [name]
+        + [
+            f'{key}={json.dumps(value, sort_keys=True)}'
+            for key, value in sorted(params.items())
+        ]
+    )
+
+
+def get_agent_params(name: str) -> dict[str, Any]:
+    """
+    Returns the parameters of an agent from its name, as returned by
+    `get_agent_name` for an agent with a model.
+    """
+    model, *params = name.split('|')
+    return {
+        'model': model,
+        **{
+            key: json.loads(value)
+            for key, value in (param.split('=', 1) for param in params)
+        },
+    }
+
+
+def _get_cost(costs: dict[str, float], agent: str) -> float | None:
+    """
+    Returns the cost of a request of the agent, defaulting to the cost of its
+    model.
+    """
+    if agent in costs:
+        return costs[agent]
+    return costs.get(agent.split('|')[0])
+
+
+def load_routing_records(
+    path: str | Path = 'results/evaluation_store.jsonl',
+    metric: str = 'within_1_percent',
+) -> list[RoutingRecord]:
+    """
+    Reads the results stored by incremental evaluations, failed requests counting
+    as wrong answers.
+
+    Args:
+        path: Path of the result store
+        metric: Binary metric telling whether an answer is correct
+
+    Returns:
+        One record per stored result
+    """
+    return [
+        RoutingRecord(
+            input=result.input,
+            agent=get_agent_name(config),
+            correct=result.get_score(metric) == 1.0,
+            latency=result.latency,
+        )
+        for config, result in ResultStore(path).load_all()
+    ]
+
+
+class RoutingPolicy:
+    """
+    Table mapping groups of problems to the agent they are routed to.
+    """
+
+    def __init__(
+        self,
+        table: dict[str, str],
+        target_accuracy: float,
+        costs: dict[str, float],
+    ):
+        """
+        Args:
+            table: Agent name of each group, keyed as in `_get_levels`, with the
+                '' key for problems of unknown groups
+            target_accuracy: Accuracy the policy was fitted for
+            costs: Cost in dollars of one request to each agent
+        """
+        self.table = table
+        self.target_accuracy = target_accuracy
+        self.costs = costs
+
+    @property
+    def agents(self) -> set[str]:
+        """
+        Returns the names of the agents the policy routes to.
+        """
+        return set(self.table.values())
+
+    @classmethod
+    def fit(
+        cls,
+        records: list[RoutingRecord],
+        target_accuracy: float = 0.9,
+        costs: dict[str, float] | None = None,
+        confidence: float = 0.9,
+        min_samples: int = 20,
+    ) -> 'RoutingPolicy':
+        """
+        Routes each group of problems to the cheapest agent whose accuracy on the
+        group is above the target with the given confidence, or to the most
+        accurate agent if none is. Ties on cost are broken by mean latency.
+
+        Args:
+            records: Outcomes of the agents on past problems
+            target_accuracy: Accuracy each group must reach
+            costs: Cost in dollars of one request to each agent, or to each model
+                for all the agents using it. Missing models, e.g. local ones, are
+                free
+            confidence: Confidence level of the interval whose lower bound must
+                reach the target
+            min_samples: Number of results of an agent on a group below which the
+                accuracy on the enclosing group is used
+
+        Returns:
+            The fitted policy
+        """
+        if not records:
+            raise ValueError('Cannot fit a routing policy without results')
+        agents = sorted({record.agent for record in records})
+        agent_costs = {}
+        for agent in agents:
+            cost = _get_cost(costs or {}, agent)
+            if cost is None:
+                logger.warning(f'No cost given for {agent}, assuming it is free')
+                cost = 0.0
+            agent_costs[agent] = cost
+        costs = agent_costs
+
+        # Number of results, of correct ones and sum of latencies per group
+        stats = defaultdict(lambda: [0, 0, 0.0])
+        levels = {}
+        for record in records:
+            features = get_features(record.input)
+            levels[features] = _get_levels(features)
+            for key in levels[features]:
+                group = stats[key, record.agent]
+                group[0] += 1
+                group[1] += record.correct
+                group[2] += record.latency
+
+        def choose(group_levels: list[str]) -> str:
+            candidates = []
+            for agent in agents:
+                n, n_correct, latency = next(
+                    (
+                        stats[key, agent]
+                        for key in group_levels
+                        if stats[key, agent][0] >= min_samples
+                    ),
+                    stats['', agent],
+                )
+                low, _ = wilson_interval(n_correct, n, confidence)
+                accuracy = n_correct / n if n else 0.0
+                mean_latency = latency / n if n else float('inf')
+                candidates.append((agent, low, accuracy, mean_latency))
+
+            eligible = [c for c in candidates if c[1] >= target_accuracy]
+            if eligible:
+                return min(eligible, key=lambda c: (costs[c[0]], c[3]))[0]
+            return max(candidates, key=lambda c: (c[2], -costs[c[0]]))[0]
+
+        table = {}
+        for group_levels in levels.values():
+            for i, key in enumerate(group_levels):
+                if key not in table:
+                    table[key] = choose(group_levels[i:])
+        return cls(table, target_accuracy, costs)
+
+    def choose(self, problem: str) -> str:
+        """
+        Returns the name of the agent the problem is routed to.
+        """
+        for key in _get_levels(get_features(problem)):
+            if key in self.table:
+                return self.table[key]
+        return self.table['']
+
+    def save(self, path: str | Path) -> Path:
+        """
+        Writes the policy to a JSON file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.get_params(), indent=2))
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> 'RoutingPolicy':
+        """
+        Reads a policy written by `save`.
+        """
+        params = json.loads(Path(path).read_text())
+        return cls(params['table'], params['target_accuracy'], params['costs'])
+
+    def get_params(self) -> dict:
+        """
+        Returns the parameters of the policy.
+        """
+        return {
+            'target_accuracy': self.target_accuracy,
+            'costs': self.costs,
+            'table': self.table,
+        }
+
+
+def _is_dominated(point: dict, other: dict) -> bool:
+    no_worse = (
+        other['cost'] <= point['cost']
+        and other['latency'] <= point['latency']
+        and other['accuracy'] >= point['accuracy']
+    )
+    better = (
+        other['cost'] < point['cost']
+        or other['latency'] < point['latency']
+        or other['accuracy'] > point['accuracy']
+    )
+    return no_worse and better
+
+
+def get_frontier(
+    records: list[RoutingRecord],
+    targets: tuple[float, ...] = (0.8, 0.9, 0.95, 0.99),
+    costs: dict[str, float] | None = None,
+    test_fraction: float = 0.3,
+    seed: int = 0,
+    **fit_kwargs,
+) -> list[dict]:
+    """
+    Fits a policy per accuracy target on part of the problems, and replays the
+    policies and each agent alone on the other problems.
+
+    Args:
+        records: Outcomes of the agents on past problems
+        targets: Target accuracies of the policies
+        costs: Cost in dollars of one request to each agent or model
+        test_fraction: Fraction of the problems held out to replay the policies
+        seed: Random seed of the split
+        **fit_kwargs: Arguments passed to `RoutingPolicy.fit`
+
+    Returns:
+        One point per policy and per agent, with the mean cost and latency per
+        problem, the accuracy, the number of replayed problems, and whether no
+        other point is better on every axis
+    """
+    problems = sorted({record.input for record in records})
+    random.Random(seed).shuffle(problems)
+    test_problems = set(problems[: max(1, int(len(problems) * test_fraction))])
+    train = [record for record in records if record.input not in test_problems]
+
+    # Latest outcome of each agent on each held-out problem
+    outcomes = {
+        (record.input, record.agent): record
+        for record in records
+        if record.input in test_problems
+    }
+    agents = sorted({record.agent for record in records})
+    costs = costs or {}
+
+    def replay(name: str, choose) -> dict:
+        replayed = []
+        for problem in test_problems:
+            outcome = outcomes.get((problem, choose(problem)))
+            if outcome is not None:
+                replayed.append(outcome)
+        n = len(replayed)
+        return {
+            'name': name,
+            'cost': sum(_get_cost(costs, r.agent) or 0.0 for r in replayed) / n
+            if n
+            else 0.0,
+            'latency': sum(r.latency for r in replayed) / n if n else 0.0,
+            'accuracy': sum(r.correct for r in replayed) / n if n else 0.0,
+            'n_problems': n,
+        }
+
+    points = [replay(agent, lambda _, agent=agent: agent) for agent in agents]
+    for target in targets:
+        policy = RoutingPolicy.fit(train, target, costs, **fit_kwargs)
+        points.append(replay(f'router@{target:g}', policy.choose))
+
+    for point in points:
+        point['pareto'] = not any(_is_dominated(point, other) for other in points)
+    return points
+
+
+class RouterAgent(GenericAgent):
+    """
+    Solves each problem with the agent chosen by a routing policy.
+    """
+
+    def __init__(
+        self,
+        agents: list[GenericAgent],
+        policy: RoutingPolicy,
+        metric: str = 'within_1_percent',
+    ):
+        """
+        Args:
+            agents: The agents the policy routes to, matched with the policy by
+                `get_agent_name`
+            policy: The routing policy
+            metric: Binary metric telling whether an answer is correct, in the
+                results passed to `on_result`
+        """
+        self.agents = {
+            get_agent_name(agent.get_experiment_config()): agent for agent in agents
+        }
+        missing = policy.agents - set(self.agents)
+        if missing:
+            raise ValueError(f'No agent for {sorted(missing)}')
+        self.policy = policy
+        self.metric = metric
+
+        self._routes: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        # Number of calls, sum of latencies, number of scored and correct answers
+        self._stats = defaultdict(lambda: [0, 0.0, 0, 0])
+
+    def _route(self, problem: str) -> str:
+        with span('router.choose'):
+            agent = self.policy.choose(problem)
+        with self._lock:
+            self._routes[problem] = agent
+            self._routes.move_to_end(problem)
+            if len(self._routes) > MAX_TRACKED_ROUTES:
+                self._routes.popitem(last=False)
+        return agent
+
+    def _record(self, agent: str, latency: float) -> None:
+        with self._lock:
+            self._stats[agent][0] += 1
+            self._stats[agent][1] += latency
+
+    def get_answer(self, problem: str) -> float:
+        """
+        Solves the problem with the agent chosen by the policy.
+        """
+        agent = self._route(problem)
+        start = time.perf_counter()
+        try:
+            return self.agents[agent].get_answer(problem)
+        finally:
+            self._record(agent, time.perf_counter() - start)
+
+    async def get_answer_async(self, problem: str) -> float:
+        """
+        Async version of `get_answer`.
+        """
+        agent = self._route(problem)
+        start = time.perf_counter()
+        try:
+            return await self.agents[agent].get_answer_async(problem)
+        finally:
+            self._record(agent, time.perf_counter() - start)
+
+    def on_result(self, result: ItemResult) -> None:
+        """
+        Records whether the agent a problem was routed to answered correctly. Meant
+        as the `on_result` callback of `GenericAgent.evaluate`.
+        """
+        with self._lock:
+            agent = self._routes.pop(result.input, None)
+            if agent is None:
+                return
+            self._stats[agent][2] += 1
+            self._stats[agent][3] += result.get_score(self.metric) == 1.0
+
+    def get_report(self) -> dict:
+        """
+        Returns the realized cost, latency and accuracy per agent and overall.
+        Accuracies only cover the answers scored through `on_result`.
+        """
+
+        def summarize(n_calls, latency, n_scored, n_correct, cost) -> dict:
+            return {
+                'n_calls': n_calls,
+                'cost': cost,
+                'mean_latency': latency / n_calls if n_calls else None,
+                'accuracy': n_correct / n_scored if n_scored else None,
+            }
+
+        with self._lock:
+            stats = {agent: list(values) for agent, values in self._stats.items()}
+        agents = {
+            agent: summarize(*values, values[0] * self.policy.costs.get(agent, 0.0))
+            for agent, values in stats.items()
+        }
+        totals = [sum(values[i] for values in stats.values()) for i in range(4)]
+        cost = sum(agent['cost'] for agent in agents.values())
+        return {'agents': agents, 'total': summarize(*totals, cost)}
+
+    def get_params(self) -> dict:
+        """
+        Returns the parameters of the policy and of the agents.
+        """
+        return {
+            'policy': self.policy.get_params(),
+            'agents': {name: agent.get_params() for name, agent in self.agents.items()},
+        }
@@ -0,0 +1,355 @@
+"""
+Compact local storage of the results of large evaluation runs.
+
+Each run is stored in its own directory:
+- `table.npz`: one column per field of the results, e.g. the answers, latencies
+  and metric values, each loaded on first access
+- `texts.zst`: the questions, reasonings and errors, deduplicated and compressed
+  one by one with zstd and a dictionary trained on the first texts of the run,
+  so that any text can be decompressed on its own when inspected
+- `dictionary.zstd`: the trained zstd dictionary
+- `meta.json`: the name and configuration of the run
+
+Reasonings of verbose models are long but very repetitive from one problem to the
+next, which the trained dictionary captures even for short texts.
+"""
+
+import datetime
+import hashlib
+import json
+import math
+import mmap
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import zstandard
+from loguru import logger
+from opik.evaluation.metrics import score_result
+
+from beach_challenge_problem.evaluation import ItemResult
+
+# Size in bytes of the trained zstd dictionary
+DICTIONARY_SIZE = 112_640
+
+# Number of distinct texts the dictionary is trained on
+TRAINING_SIZE = 2_000
+
+# Compression level, fast enough to compress texts as results arrive
+COMPRESSION_LEVEL = 9
+
+# Text ID of a missing text
+NO_TEXT = -1
+
+
+def _get_run_name() -> str:
+    return datetime.datetime.now(datetime.UTC).strftime('%Y%m%dT%H%M%S')
+
+
+class RunWriter:
+    """
+    Evaluation callback writing the results of a run to a compact run directory.
+    """
+
+    def __init__(
+        self,
+        root: str | Path = 'results/runs',
+        run: str | None = None,
+        experiment_config: dict[str, Any] | None = None,
+        get_reasoning: Callable[[str], str | None] | None = None,
+        training_size: int = TRAINING_SIZE,
+        level: int = COMPRESSION_LEVEL,
+    ):
+        """
+        Args:
+            root: Directory the run directories are created in
+            run: Name of the run. Defaults to the current time
+            experiment_config: Configuration of the run, e.g. the agent parameters
+            get_reasoning: Function returning the reasoning of the model for a
+                problem, e.g. `OneShootAgent.get_reasoning`
+            training_size: Number of distinct texts buffered to train the zstd
+                dictionary before they are compressed
+            level: zstd compression level
+        """
+        self.run = run or _get_run_name()
+        self.path = Path(root) / self.run
+        if self.path.exists():
+            raise FileExistsError(f'Run {self.run} already exists in {root}')
+        self.path.mkdir(parents=True)
+        self.experiment_config = experiment_config
+        self.get_reasoning = get_reasoning
+        self.training_size = training_size
+        self.level = level
+
+        self._rows: list[tuple] = []
+        self._scores: dict[str, list[tuple[int, float]]] = {}
+        # Text ID of each distinct text, by digest
+        self._text_ids: dict[bytes, int] = {}
+        self._offsets = [0]
+        self._pending: list[bytes] = []
+        self._compressor: zstandard.ZstdCompressor | None = None
+        self._file = (self.path / 'texts.zst').open('wb')
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _add_text(self, text: str | None) -> int:
+        """
+        Returns the ID of the text, compressing it if it was not seen before.
+        """
+        if text is None:
+            return NO_TEXT
+        data = text.encode()
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        text_id = self._text_ids.get(digest)
+        if text_id is not None:
+            return text_id
+
+        text_id = self._text_ids[digest] = len(self._text_ids)
+        if self._compressor is None:
+            self._pending.append(data)
+            if len(self._pending) >= self.training_size:
+                self._train()
+        else:
+            self._write(data)
+        return text_id
+
+    def _train(self) -> None:
+        """
+        Trains the dictionary on the buffered texts, then compresses them.
+        """
+        dictionary = None
+        try:
+            dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, self._pending)
+        except zstandard.ZstdError as e:
+            # Too few or too short texts, e.g. for a small run
+            logger.debug(f'Compressing without dictionary: {e}')
+
+        if dictionary is not None:
+            (self.path / 'dictionary.zstd').write_bytes(dictionary.as_bytes())
+        self._compressor = zstandard.ZstdCompressor(
+            level=self.level, dict_data=dictionary
+        )
+        for data in self._pending:
+            self._write(data)
+        self._pending = []
+
+    def _write(self, data: bytes) -> None:
+        frame = self._compressor.compress(data)
+        self._file.write(frame)
+        self._offsets.append(self._offsets[-1] + len(frame))
+
+    def on_result(self, result: ItemResult) -> None:
+        """
+        Adds the result to the run.
+        """
+        reasoning = self.get_reasoning(result.input) if self.get_reasoning else None
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f'Run {self.run} is already closed')
+            index = len(self._rows)
+            self._rows.append(
+                (
+                    result.dataset_item_id,
+                    result.trace_id,
+                    result.expected_output,
+                    math.nan if result.answer is None else result.answer,
+                    result.start_time.timestamp(),
+                    result.latency,
+                    self._add_text(result.input),
+                    self._add_text(reasoning),
+                    self._add_text(result.error),
+                )
+            )
+            for score in result.scores:
+                if not score.scoring_failed:
+                    self._scores.setdefault(score.name, []).append((index, score.value))
+
+    def close(self) -> Path:
+        """
+        Writes the table and the metadata of the run.
+
+        Returns:
+            The run directory
+        """
+        with self._lock:
+            if self._closed:
+                return self.path
+            self._closed = True
+            if self._compressor is None:
+                self._train()
+            self._file.close()
+
+            n_items = len(self._rows)
+            columns = list(zip(*self._rows, strict=True)) or [()] * 9
+            table = {
+                'dataset_item_id': np.array(columns[0], dtype=np.bytes_),
+                'trace_id': np.array(columns[1], dtype=np.bytes_),
+                'expected_output': np.array(columns[2], dtype=np.float64),
+                'answer': np.array(columns[3], dtype=np.float64),
+                'start_time': np.array(columns[4], dtype=np.float64),
+                'latency': np.array(columns[5], dtype=np.float32),
+                'input_id': np.array(columns[6], dtype=np.int32),
+                'reasoning_id': np.array(columns[7], dtype=np.int32),
+                'error_id': np.array(columns[8], dtype=np.int32),
+                'text_offsets': np.array(self._offsets, dtype=np.int64),
+            }
+            for name, values in self._scores.items():
+                column = np.full(n_items, np.nan, dtype=np.float32)
+                indices, scores = zip(*values, strict=True)
+                column[list(indices)] = scores
+                table[f'score.{name}'] = column
+            np.savez(self.path / 'table.npz', **table)
+
+            meta = {
+                'run': self.run,
+                'experiment_config': self.experiment_config,
+                'n_items': n_items,
+                'n_texts': len(self._text_ids),
+                'metrics': sorted(self._scores),
+            }
+            (self.path / 'meta.json').write_text(json.dumps(meta, indent=2))
+
+        size = sum(path.stat().st_size for path in self.path.iterdir())
+        logger.info(
+            f'Stored {n_items} results of run {self.run} in {self.path} '
+            f'({size / 1e6:.1f} MB, {len(self._text_ids)} distinct texts)'
+        )
+        return self.path
+
+    def __enter__(self) -> 'RunWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class StoredRun:
+    """
+    Run written by `RunWriter`. Columns are loaded on first access, and texts are
+    decompressed one at a time when requested.
+    """
+
+    def __init__(self, path: str | Path):
+        """
+        Args:
+            path: The run directory
+        """
+        self.path = Path(path)
+        meta = json.loads((self.path / 'meta.json').read_text())
+        self.run = meta['run']
+        self.experiment_config = meta['experiment_config']
+        self.metrics = meta['metrics']
+        self.n_items = meta['n_items']
+        self.columns = np.load(self.path / 'table.npz')
+
+        self._texts: mmap.mmap | None = None
+        self._text_offsets: np.ndarray | None = None
+        self._decompressor: zstandard.ZstdDecompressor | None = None
+
+    def __len__(self) -> int:
+        return self.n_items
+
+    def get_scores(self, metric: str) -> np.ndarray:
+        """
+        Returns the values of a metric, NaN where it was not computed.
+        """
+        return self.columns[f'score.{metric}']
+
+    def get_average_scores(self) -> dict[str, float]:
+        """
+        Returns the average value of each metric.
+        """
+        return {
+            metric: float(np.nanmean(self.get_scores(metric)))
+            for metric in self.metrics
+        }
+
+    def get_text(self, text_id: int) -> str | None:
+        """
+        Returns the text with the given ID, or None for `NO_TEXT`.
+        """
+        if text_id == NO_TEXT:
+            return None
+        if self._decompressor is None:
+            dictionary_path = self.path / 'dictionary.zstd'
+            dictionary = (
+                zstandard.ZstdCompressionDict(dictionary_path.read_bytes())
+                if dictionary_path.exists()
+                else None
+            )
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+            self._text_offsets = self.columns['text_offsets']
+            with (self.path / 'texts.zst').open('rb') as f:
+                if self._text_offsets[-1]:
+                    self._texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start, end = self._text_offsets[text_id : text_id + 2]
+        return self._decompressor.decompress(self._texts[start:end]).decode()
+
+    def get_input(self, index: int) -> str:
+        """
+        Returns the question of the result at the given index.
+        """
+        return self.get_text(int(self.columns['input_id'][index]))
+
+    def get_reasoning(self, index: int) -> str | None:
+        """
+        Returns the reasoning of the result at the given index, if it was stored.
+        """
+        return self.get_text(int(self.columns['reasoning_id'][index]))
+
+    def get_error(self, index: int) -> str | None:
+        """
+        Returns the error of the result at the given index, if it failed.
+        """
+        return self.get_text(int(self.columns['error_id'][index]))
+
+    def get_item_result(self, index: int) -> ItemResult:
+        """
+        Rebuilds the result at the given index, without its metric reasons.
+        """
+        answer = float(self.columns['answer'][index])
+        start_time = datetime.datetime.fromtimestamp(
+            float(self.columns['start_time'][index]), datetime.UTC
+        )
+        latency = datetime.timedelta(seconds=float(self.columns['latency'][index]))
+        scores = [
+            score_result.ScoreResult(name=metric, value=float(value))
+            for metric in self.metrics
+            if not math.isnan(value := self.get_scores(metric)[index])
+        ]
+        return ItemResult(
+            dataset_item_id=self.columns['dataset_item_id'][index].decode(),
+            input=self.get_input(index),
+            expected_output=float(self.columns['expected_output'][index]),
+            answer=None if math.isnan(answer) else answer,
+            scores=scores,
+            trace_id=self.columns['trace_id'][index].decode(),
+            start_time=start_time,
+            end_time=start_time + latency,
+            error=self.get_error(index),
+        )
+
+    def close(self) -> None:
+        if self._texts is not None:
+            self._texts.close()
+            self._texts = None
+        self.columns.close()
+
+    def __enter__(self) -> 'StoredRun':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def list_runs(root: str | Path = 'results/runs') -> list[str]:
+    """
+    Returns the names of the runs stored in the directory, oldest first.
+    """
+    root = Path(root)
+    if not root.exists():
+        return []
+    runs = [path for path in root.iterdir() if (path / 'meta.json').exists()]
+    return [path.name for path in sorted(runs, key=lambda path: path.stat().st_mtime)]
@@ -0,0 +1,336 @@
+"""
+Difficulty-aware stratified sampling of evaluation items.
+
+Each item gets a difficulty, the probability that a model misses it. It is estimated
+from features of the problem parameters, fitted on past per-item results when there
+are any, and shrunk towards the observed failure rate of items seen before. Items
+are then stratified by difficulty and sampled with Neyman allocation, which spends
+more of the budget on strata where models disagree. Weights are returned so that
+accuracy on the sample is an unbiased estimate of accuracy on the whole dataset.
+"""
+
+import json
+import random
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from beach_challenge_problem.evaluation import get_dataset_items
+from beach_challenge_problem.problem import Problem, ProblemBatch
+from beach_challenge_problem.templates import TEMPLATES
+from beach_challenge_problem.triage import get_reference_problem
+
+FEATURE_NAMES = (
+    'sofia_proximity',
+    'angle_extremity',
+    'short_second_phase',
+    'current_ratio',
+)
+
+# Per-item results written by incremental evaluations and by the batched writer
+RESULTS_PATHS = ('results/evaluation_store.jsonl', 'results/opik_fallback.jsonl')
+
+
+def get_difficulty_features(problems: list[Problem | None]) -> np.ndarray:
+    """
+    Computes features of the problems that make them hard to solve.
+
+    - sofia_proximity: Kai is close to Sofia when he turns, so his heading is
+      sensitive to small errors
+    - angle_extremity: the buoy angle is at the edge of its range
+    - short_second_phase: Kai turns shortly before the end
+    - current_ratio: the current is strong relative to Sofia's own speed
+
+    Args:
+        problems: The problems, None for questions that could not be parsed
+
+    Returns:
+        Array of shape (n_problems, len(FEATURE_NAMES)), with NaN rows for None
+    """
+    features = np.full((len(problems), len(FEATURE_NAMES)), np.nan)
+    known = [i for i, problem in enumerate(problems) if problem is not None]
+    if not known:
+        return features
+
+    batch = ProblemBatch.from_problems([problems[i] for i in known])
+    angle = np.radians(batch.get_column('buoy_angle'))
+    sofia_speed = batch.get_column('sofia_speed')
+    current = batch.get_column('ocean_current_speed')
+    change_time = batch.get_column('kai_change_direction_time')
+
+    # Same geometry as `calculate_final_distance`, at the time Kai turns
+    delta_x = (
+        sofia_speed * np.cos(angle) - current * np.sin(angle)
+    ) * change_time - batch.get_column('kai_initial_speed') * change_time
+    delta_y = (sofia_speed * np.sin(angle) + current * np.cos(angle)) * change_time
+    distance_to_sofia = np.hypot(delta_x, delta_y)
+
+    features[known, 0] = 1 / (1 + distance_to_sofia)
+    features[known, 1] = np.abs(batch.get_column('buoy_angle') - 30) / 15
+    features[known, 2] = 1 / (1 + batch.get_column('final_time') - change_time)
+    features[known, 3] = current / np.maximum(sofia_speed, 1e-9)
+    return features
+
+
+def parse_problems(
+    questions: list[str], expected_outputs: list[float] | None = None
+) -> list[Problem | None]:
+    """
+    Parses the questions with the question templates. Most templates state that
+    Kai turns after 1 hour whatever the actual turn time, so it is inferred from
+    the expected outputs when they are given.
+
+    Args:
+        questions: The question texts
+        expected_outputs: The expected answer of each question
+
+    Returns:
+        The problems, None for questions that follow no template
+    """
+    if expected_outputs is None:
+        expected_outputs = [None] * len(questions)
+    problems = []
+    for question, expected_output in zip(questions, expected_outputs, strict=True):
+        parsed = TEMPLATES.parse(question)
+        if parsed is None:
+            problems.append(None)
+            continue
+        _, problem = parsed
+        if expected_output is not None:
+            problem = get_reference_problem(problem, expected_output)
+        problems.append(problem)
+    return problems
+
+
+def load_past_results(paths: Iterable[str | Path]) -> list[dict[str, Any]]:
+    """
+    Loads per-item results from JSONL files written by the result store or by the
+    batched Opik writer. Missing files are skipped.
+    """
+    records = []
+    for path in map(Path, paths):
+        if path.exists():
+            with path.open() as f:
+                records.extend(json.loads(line) for line in f)
+    return records
+
+
+def _is_failure(record: dict[str, Any]) -> bool:
+    for score in record['scores']:
+        if score['name'] == 'within_1_percent':
+            return score['value'] < 0.5
+    return True
+
+
+class DifficultyIndex:
+    """
+    Estimates the probability that an item is answered wrongly.
+    """
+
+    def __init__(self, prior_weight: float = 2.0, min_results: int = 20):
+        """
+        Args:
+            prior_weight: Number of pseudo-observations given to the feature-based
+                estimate when combining it with the observed failures of an item
+            min_results: Number of past results needed to fit the feature weights,
+                below which a fixed heuristic is used
+        """
+        self.prior_weight = prior_weight
+        self.min_results = min_results
+
+        self._weights: np.ndarray | None = None
+        self._mean = np.zeros(len(FEATURE_NAMES))
+        self._std = np.ones(len(FEATURE_NAMES))
+        self._bias = 0.0
+        self._observed: dict[str, tuple[int, int]] = {}
+
+    def fit(self, records: list[dict[str, Any]]) -> 'DifficultyIndex':
+        """
+        Fits the index on past per-item results.
+
+        Args:
+            records: Results with 'input', 'expected_output', 'scores' and 'error'
+                keys, as returned by `load_past_results`
+        """
+        inputs = [record['input'] for record in records]
+        failures = np.array([_is_failure(record) for record in records], dtype=float)
+
+        self._observed = {}
+        for question, failed in zip(inputs, failures, strict=True):
+            n, n_failed = self._observed.get(question, (0, 0))
+            self._observed[question] = (n + 1, n_failed + int(failed))
+
+        features = get_difficulty_features(
+            parse_problems(
+                inputs, [record.get('expected_output') for record in records]
+            )
+        )
+        known = ~np.isnan(features).any(axis=1)
+        features, failures = features[known], failures[known]
+        if len(failures) < self.min_results or failures.min() == failures.max():
+            self._weights = None
+            return self
+
+        self._mean = features.mean(axis=0)
+        self._std = features.std(axis=0) + 1e-9
+        self._weights, self._bias = _fit_logistic(
+            (features - self._mean) / self._std, failures
+        )
+        return self
+
+    def predict(
+        self, questions: list[str], expected_outputs: list[float] | None = None
+    ) -> np.ndarray:
+        """
+        Returns the difficulty of each question, between 0 and 1.
+
+        Args:
+            questions: The question texts
+            expected_outputs: The expected answer of each question, used to infer
+                the time Kai turns
+        """
+        features = get_difficulty_features(parse_problems(questions, expected_outputs))
+        if self._weights is None:
+            # Unfitted: every feature pushes the difficulty up equally
+            prior = np.clip(features.mean(axis=1), 0.0, 1.0)
+        else:
+            logits = ((features - self._mean) / self._std) @ self._weights + self._bias
+            prior = 1 / (1 + np.exp(-logits))
+        prior = np.nan_to_num(prior, nan=0.5)
+
+        difficulty = np.empty(len(questions))
+        for i, question in enumerate(questions):
+            n, n_failed = self._observed.get(question, (0, 0))
+            difficulty[i] = (n_failed + self.prior_weight * prior[i]) / (
+                n + self.prior_weight
+            )
+        return difficulty
+
+
+def _fit_logistic(
+    x: np.ndarray, y: np.ndarray, l2: float = 1.0, n_steps: int = 500
+) -> tuple[np.ndarray, float]:
+    weights, bias = np.zeros(x.shape[1]), 0.0
+    learning_rate = 0.5
+    for _ in range(n_steps):
+        p = 1 / (1 + np.exp(-(x @ weights + bias)))
+        weights -= learning_rate * (x.T @ (p - y) / len(y) + l2 * weights / len(y))
+        bias -= learning_rate * float(np.mean(p - y))
+    return weights, bias
+
+
+def stratified_sample(
+    items: list[dict[str, Any]],
+    difficulty: np.ndarray,
+    n_items: int,
+    n_strata: int = 4,
+    seed: int | None = None,
+) -> tuple[list[dict[str, Any]], list[float]]:
+    """
+    Draws items stratified by difficulty, with Neyman allocation.
+
+    Args:
+        items: Dataset items
+        difficulty: Difficulty of each item, from `DifficultyIndex.predict`
+        n_items: Number of items to draw
+        n_strata: Number of difficulty strata, split at quantiles
+        seed: Random seed
+
+    Returns:
+        The sampled items and their weights, the number of dataset items each one
+        stands for
+    """
+    rng = random.Random(seed)
+    n_items = min(n_items, len(items))
+    order = np.argsort(difficulty, kind='stable')
+    strata = [s.tolist() for s in np.array_split(order, n_strata) if len(s)]
+
+    # Neyman allocation: sample size proportional to N_h * sigma_h, with at least
+    # one item per stratum
+    sigmas = [
+        np.sqrt(np.mean(difficulty[s]) * (1 - np.mean(difficulty[s]))) for s in strata
+    ]
+    sizes = np.array(
+        [len(s) * max(sigma, 1e-3) for s, sigma in zip(strata, sigmas, strict=True)]
+    )
+    allocation = np.maximum(1, np.floor(sizes / sizes.sum() * n_items)).astype(int)
+    allocation = np.minimum(allocation, [len(s) for s in strata])
+    # The minimum of one item per stratum can exceed the budget: trim the excess
+    # from the largest allocations
+    while allocation.sum() > n_items:
+        allocation[np.argmax(allocation)] -= 1
+    # Hand out the items lost to rounding to the strata with spare items
+    for h in np.argsort(-sizes):
+        spare = min(n_items - allocation.sum(), len(strata[h]) - allocation[h])
+        allocation[h] += max(spare, 0)
+
+    sample, weights = [], []
+    for stratum, size in zip(strata, allocation, strict=True):
+        for index in rng.sample(stratum, int(size)):
+            sample.append(items[index])
+            weights.append(len(stratum) / size)
+    return sample, weights
+
+
+def get_weighted_accuracy(
+    evaluation, weights_by_item_id: dict[str, float], metric: str = 'within_1_percent'
+) -> float:
+    """
+    Estimates the accuracy on the whole dataset from an evaluation on a stratified
+    sample.
+
+    Args:
+        evaluation: The evaluation results returned by `GenericAgent.evaluate`
+        weights_by_item_id: Weight of each sampled dataset item
+        metric: Binary metric to average
+
+    Returns:
+        The weighted accuracy
+    """
+    total, weighted = 0.0, 0.0
+    for test_result in evaluation.test_results:
+        weight = weights_by_item_id[test_result.test_case.dataset_item_id]
+        value = next(
+            (
+                s.value
+                for s in test_result.score_results
+                if s.name == metric and not s.scoring_failed
+            ),
+            0.0,
+        )
+        total += weight
+        weighted += weight * value
+    return weighted / total if total else 0.0
+
+
+def sample_dataset_items(
+    dataset_name: str,
+    n_items: int,
+    results_paths: Iterable[str | Path] = RESULTS_PATHS,
+    n_strata: int = 4,
+    seed: int | None = None,
+) -> dict[str, float]:
+    """
+    Draws an informative subset of an Opik dataset, using past results to estimate
+    the difficulty of the items.
+
+    Args:
+        dataset_name: Name of the dataset
+        n_items: Number of items to draw
+        results_paths: JSONL files with past per-item results
+        n_strata: Number of difficulty strata
+        seed: Random seed
+
+    Returns:
+        Dictionary mapping the sampled dataset item IDs to their weights, to be
+        passed to `GenericAgent.evaluate` and `get_weighted_accuracy`
+    """
+    items = get_dataset_items(dataset_name)
+    index = DifficultyIndex().fit(load_past_results(results_paths))
+    difficulty = index.predict(
+        [item['input'] for item in items], [item['expected_output'] for item in items]
+    )
+    sample, weights = stratified_sample(items, difficulty, n_items, n_strata, seed)
+    return {item['id']: weight for item, weight in zip(sample, weights, strict=True)}
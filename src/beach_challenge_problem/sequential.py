@@ -0,0 +1,249 @@
+"""
+Sequential evaluation that stops as soon as the accuracy is known precisely enough.
+
+Items are solved in random order and the running accuracy on `within_1_percent` is
+tracked with a Wilson score interval. The evaluation stops when the interval is
+narrower than a target width, or when the accuracy is shown to differ from the one
+of a baseline model, which is enough to decide an A/B comparison.
+
+The baseline comparison is checked after every item, so it uses an anytime-valid
+test rather than the Wilson interval: a fixed-level interval checked repeatedly
+rejects far more often than its nominal level. The baseline accuracy is treated
+as known exactly, not as an estimate with its own uncertainty.
+"""
+
+import itertools
+import math
+import random
+import statistics
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from loguru import logger
+from opik.evaluation.evaluation_result import EvaluationResult
+
+from beach_challenge_problem.evaluation import (
+    BatchedOpikWriter,
+    ItemResult,
+    get_dataset_items,
+    solve_item,
+)
+
+
+def wilson_interval(
+    successes: int, n: int, confidence: float = 0.95
+) -> tuple[float, float]:
+    """
+    Returns the Wilson score interval of a binomial proportion.
+
+    Args:
+        successes: Number of successes
+        n: Number of trials
+        confidence: Confidence level of the interval
+
+    Returns:
+        Lower and upper bounds of the interval
+    """
+    if n == 0:
+        return 0.0, 1.0
+
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def get_log_evidence(
+    successes: int, n: int, p0: float, prior: tuple[float, float] = (1.0, 1.0)
+) -> float:
+    """
+    Returns the log of the beta-binomial mixture likelihood ratio of the results
+    against an accuracy of exactly `p0`.
+
+    Under that accuracy the ratio is a nonnegative martingale starting at 1, so by
+    Ville's inequality it ever exceeds 1 / alpha with probability at most alpha,
+    however often it is checked.
+
+    Args:
+        successes: Number of successes
+        n: Number of trials
+        p0: Accuracy under the null hypothesis
+        prior: Parameters of the beta prior mixed over the alternative accuracies
+
+    Returns:
+        The log likelihood ratio, infinite if the results are impossible under p0
+    """
+    failures = n - successes
+    if (successes and p0 <= 0.0) or (failures and p0 >= 1.0):
+        return math.inf
+
+    a, b = prior
+    log_mixture = (
+        math.lgamma(a + successes)
+        + math.lgamma(b + failures)
+        - math.lgamma(a + b + n)
+        - math.lgamma(a)
+        - math.lgamma(b)
+        + math.lgamma(a + b)
+    )
+    log_null = (successes * math.log(p0) if successes else 0.0) + (
+        failures * math.log1p(-p0) if failures else 0.0
+    )
+    return log_mixture - log_null
+
+
+class SequentialStopper:
+    """
+    Tracks the running accuracy of an evaluation and decides when to stop it.
+    """
+
+    def __init__(
+        self,
+        metric: str = 'within_1_percent',
+        ci_width: float = 0.1,
+        baseline_accuracy: float | None = None,
+        confidence: float = 0.95,
+        min_items: int = 30,
+    ):
+        """
+        Args:
+            metric: Binary metric whose mean is tracked
+            ci_width: The evaluation stops when the confidence interval is narrower
+            baseline_accuracy: Accuracy of the model to compare against, treated as
+                known exactly. The evaluation stops when an anytime-valid test
+                rejects it at level 1 - confidence
+            confidence: Confidence level of the interval and of the baseline test
+            min_items: Number of items evaluated before stopping is considered
+        """
+        self.metric = metric
+        self.ci_width = ci_width
+        self.baseline_accuracy = baseline_accuracy
+        self.confidence = confidence
+        self.min_items = min_items
+
+        self.n = 0
+        self.successes = 0
+        self.stop_reason: str | None = None
+
+    def update(self, result: ItemResult) -> None:
+        """
+        Adds a result. Items that failed to be solved count as wrong answers.
+        """
+        self.n += 1
+        self.successes += (result.get_score(self.metric) or 0.0) >= 0.5
+
+    def get_interval(self) -> tuple[float, float]:
+        return wilson_interval(self.successes, self.n, self.confidence)
+
+    def should_stop(self) -> bool:
+        """
+        Returns True if the accuracy is known precisely enough, and sets
+        `stop_reason` accordingly.
+        """
+        if self.n < self.min_items:
+            return False
+
+        if self.baseline_accuracy is not None:
+            log_evidence = get_log_evidence(
+                self.successes, self.n, self.baseline_accuracy
+            )
+            if log_evidence >= -math.log(1 - self.confidence):
+                self.stop_reason = (
+                    'better than baseline'
+                    if self.successes / self.n > self.baseline_accuracy
+                    else 'worse than baseline'
+                )
+        low, high = self.get_interval()
+        if self.stop_reason is None and high - low <= self.ci_width:
+            self.stop_reason = 'confidence interval width reached'
+        return self.stop_reason is not None
+
+    def get_summary(self) -> dict:
+        """
+        Returns the running accuracy, its confidence interval and the stop reason.
+        """
+        low, high = self.get_interval()
+        return {
+            'n_items': self.n,
+            'accuracy': self.successes / self.n if self.n else None,
+            'ci_low': low,
+            'ci_high': high,
+            'confidence': self.confidence,
+            'stop_reason': self.stop_reason,
+        }
+
+
+def evaluate_sequential(
+    get_answer: Callable[[str], float],
+    dataset_name: str,
+    experiment_config: dict,
+    stopper: SequentialStopper,
+    dataset_item_ids: list[str] | None = None,
+    task_threads: int = 1,
+    seed: int | None = None,
+    on_result: Callable[[ItemResult], None] | None = None,
+) -> EvaluationResult:
+    """
+    Evaluates `get_answer` on dataset items drawn in random order, until `stopper`
+    says the accuracy is known precisely enough or the dataset is exhausted.
+
+    Args:
+        get_answer: Function returning the answer to a problem
+        dataset_name: Name of the dataset to evaluate on
+        experiment_config: Configuration stored with the Opik experiment
+        stopper: Stopping rule, also holding the final accuracy estimate
+        dataset_item_ids: Optional list of specific dataset item IDs to evaluate
+        task_threads: Number of dataset items evaluated concurrently
+        seed: Seed of the random order of the items
+        on_result: Optional callback called with each result as soon as it is ready
+
+    Returns:
+        The evaluation results for the items that were evaluated
+    """
+    items = get_dataset_items(dataset_name, dataset_item_ids)
+    random.Random(seed).shuffle(items)
+    remaining = iter(items)
+
+    writer = BatchedOpikWriter(
+        dataset_name=dataset_name,
+        experiment_config={**experiment_config, 'sequential': True},
+    )
+    results: list[ItemResult] = []
+    try:
+        with ThreadPoolExecutor(max_workers=task_threads) as pool:
+            # Only `task_threads` items are in flight, so little work is wasted
+            # once the stopping rule fires
+            pending = {
+                pool.submit(solve_item, get_answer, item)
+                for item in itertools.islice(remaining, task_threads)
+            }
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results.append(result)
+                    writer.put(result)
+                    stopper.update(result)
+                    if on_result is not None:
+                        on_result(result)
+
+                if stopper.should_stop():
+                    continue
+                for item in itertools.islice(remaining, len(done)):
+                    pending.add(pool.submit(solve_item, get_answer, item))
+    finally:
+        writer.close()
+
+    summary = stopper.get_summary()
+    logger.info(
+        f'Evaluated {summary["n_items"]}/{len(items)} items, accuracy '
+        f'{summary["accuracy"]} [{summary["ci_low"]:.3f}, {summary["ci_high"]:.3f}]'
+        f' ({summary["stop_reason"] or "dataset exhausted"})'
+    )
+    return EvaluationResult(
+        experiment_id=writer.experiment_id,
+        experiment_name=writer.experiment_name,
+        test_results=[result.to_test_result() for result in results],
+    )
@@ -0,0 +1,297 @@
+"""
+Async HTTP service exposing any GenericAgent online.
+
+Requests to `/solve` go through a bounded queue and are grouped into micro-batches
+that are solved with the agent's async batch path. When the queue is full the
+service answers 503 straight away instead of letting latency grow without bound.
+Latency and batching metrics are exposed in Prometheus text format on `/metrics`.
+"""
+
+import asyncio
+import bisect
+import time
+from dataclasses import dataclass, field
+
+from aiohttp import web
+from loguru import logger
+
+from beach_challenge_problem.agents.generic_agent import GenericAgent
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, as used by Prometheus.
+    """
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def to_prometheus(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        cumulative = 0
+        for bound, count in zip(self.buckets, self._counts, strict=False):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self._count}')
+        lines.append(f'{self.name}_sum {self._sum}')
+        lines.append(f'{self.name}_count {self._count}')
+        return lines
+
+
+@dataclass
+class _PendingRequest:
+    problem: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into batches solved with `agent.get_answers_async`.
+
+    A batch is dispatched as soon as it has `max_batch_size` requests or its oldest
+    request has waited `max_wait` seconds. At most `max_concurrency` problems are
+    being solved at any time, and at most `max_queue_size` requests can wait.
+    """
+
+    def __init__(
+        self,
+        agent: GenericAgent,
+        max_batch_size: int = 16,
+        max_wait: float = 0.01,
+        max_queue_size: int = 1024,
+        max_concurrency: int = 64,
+    ):
+        """
+        Args:
+            agent: The agent used to solve the problems
+            max_batch_size: Maximum number of requests per batch
+            max_wait: Maximum number of seconds a request waits for its batch to fill
+            max_queue_size: Maximum number of requests waiting for a batch
+            max_concurrency: Maximum number of problems being solved at once
+        """
+        self.agent = agent
+        # a batch must fit in the concurrency slots, see `_dispatch_loop`
+        self.max_batch_size = min(max_batch_size, max_concurrency)
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+
+        self._queue: asyncio.Queue[_PendingRequest] = asyncio.Queue(max_queue_size)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._dispatcher: asyncio.Task | None = None
+        self._batches: set[asyncio.Task] = set()
+
+        self.in_flight = 0
+        self.n_requests = 0
+        self.n_rejected = 0
+        self.n_errors = 0
+        self.latency = Histogram(
+            'solve_request_duration_seconds',
+            'Time from request arrival to response',
+            LATENCY_BUCKETS,
+        )
+        self.queue_latency = Histogram(
+            'solve_queue_duration_seconds',
+            'Time a request waits before its batch is dispatched',
+            LATENCY_BUCKETS,
+        )
+        self.batch_size = Histogram(
+            'solve_batch_size', 'Number of requests per batch', BATCH_SIZE_BUCKETS
+        )
+
+    def start(self) -> None:
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+
+    async def solve(self, problem: str) -> float:
+        """
+        Solves a problem as part of a micro-batch.
+
+        Raises:
+            asyncio.QueueFull: If too many requests are waiting already
+        """
+        request = _PendingRequest(problem, asyncio.get_running_loop().create_future())
+        try:
+            self._queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.n_rejected += 1
+            raise
+
+        self.n_requests += 1
+        try:
+            return await request.future
+        finally:
+            self.latency.observe(time.perf_counter() - request.enqueued_at)
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = batch[0].enqueued_at + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+
+            # Wait for free slots before dispatching, which lets the queue fill up
+            # and push back on clients when the agent is saturated
+            for _ in batch:
+                await self._slots.acquire()
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list[_PendingRequest]) -> None:
+        now = time.perf_counter()
+        for request in batch:
+            self.queue_latency.observe(now - request.enqueued_at)
+        self.batch_size.observe(len(batch))
+
+        # Identical problems in a batch are solved only once
+        problems = list(dict.fromkeys(request.problem for request in batch))
+        self.in_flight += len(batch)
+        try:
+            answers = await self.agent.get_answers_async(problems)
+        except Exception as e:
+            answers = [e] * len(problems)
+        finally:
+            self.in_flight -= len(batch)
+            for _ in batch:
+                self._slots.release()
+
+        by_problem = dict(zip(problems, answers, strict=True))
+        for request in batch:
+            answer = by_problem[request.problem]
+            if request.future.done():
+                continue
+            if isinstance(answer, BaseException):
+                self.n_errors += 1
+                request.future.set_exception(answer)
+            else:
+                request.future.set_result(answer)
+
+    def get_metrics(self) -> str:
+        """
+        Returns the metrics of the service in Prometheus text format.
+        """
+        gauges = {
+            'solve_queue_depth': ('Requests waiting for a batch', self._queue.qsize()),
+            'solve_in_flight': ('Requests being solved', self.in_flight),
+        }
+        counters = {
+            'solve_requests_total': ('Requests accepted', self.n_requests),
+            'solve_rejected_total': ('Requests rejected with 503', self.n_rejected),
+            'solve_errors_total': ('Requests that failed', self.n_errors),
+        }
+
+        lines = []
+        for name, (help, value) in gauges.items():
+            lines += [
+                f'# HELP {name} {help}',
+                f'# TYPE {name} gauge',
+                f'{name} {value}',
+            ]
+        for name, (help, value) in counters.items():
+            lines += [
+                f'# HELP {name} {help}',
+                f'# TYPE {name} counter',
+                f'{name} {value}',
+            ]
+        for histogram in (self.latency, self.queue_latency, self.batch_size):
+            lines += histogram.to_prometheus()
+        return '\n'.join(lines) + '\n'
+
+
+def create_app(agent: GenericAgent, **batcher_kwargs) -> web.Application:
+    """
+    Creates the aiohttp application serving the agent.
+
+    Args:
+        agent: The agent used to solve the problems
+        **batcher_kwargs: Arguments passed to `MicroBatcher`
+
+    Returns:
+        The aiohttp application
+    """
+    batcher = MicroBatcher(agent, **batcher_kwargs)
+
+    async def solve(request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+            problem = body['problem']
+        except (ValueError, KeyError, TypeError):
+            return web.json_response(
+                {'error': 'Expected a JSON body like {"problem": "..."}'}, status=400
+            )
+
+        try:
+            answer = await batcher.solve(problem)
+        except asyncio.QueueFull:
+            return web.json_response(
+                {'error': 'Too many requests in the queue'},
+                status=503,
+                headers={'Retry-After': '1'},
+            )
+        except Exception as e:
+            logger.warning(f'Failed to solve problem: {e!r}')
+            return web.json_response({'error': repr(e)}, status=500)
+
+        return web.json_response({'answer': answer})
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=batcher.get_metrics(), content_type='text/plain')
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok'})
+
+    async def on_startup(app: web.Application) -> None:
+        batcher.start()
+
+    async def on_cleanup(app: web.Application) -> None:
+        await batcher.stop()
+
+    app = web.Application()
+    app['batcher'] = batcher
+    app.router.add_post('/solve', solve)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/health', health)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def serve(
+    agent: GenericAgent, host: str = '0.0.0.0', port: int = 8000, **batcher_kwargs
+) -> None:
+    """
+    Serves the agent over HTTP until interrupted.
+
+    Args:
+        agent: The agent used to solve the problems
+        host: Interface to listen on
+        port: Port to listen on
+        **batcher_kwargs: Arguments passed to `MicroBatcher`
+    """
+    logger.info(f'Serving {agent.__class__.__name__} on http://{host}:{port}')
+    web.run_app(create_app(agent, **batcher_kwargs), host=host, port=port)
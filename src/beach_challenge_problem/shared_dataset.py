@@ -0,0 +1,418 @@
+"""
+Datasets shared with worker processes without copying them.
+
+The parameters, expected outputs and question texts of a dataset are laid out in a
+single buffer: fixed-size arrays, then the UTF-8 questions concatenated with an
+array of their offsets. The buffer lives in a `multiprocessing.shared_memory`
+segment or in a file, and workers attach to it by name and read it in place
+through NumPy views. A 10M-item dataset is then stored once whatever the number of
+workers, and attaching to it only reads a 64-byte header.
+
+Shared memory suits process pools started by the process owning the segment. On
+Python < 3.13, any other process attaching to a segment removes it when it exits,
+so processes started independently, e.g. from another shell, should use a file.
+"""
+
+import os
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from loguru import logger
+
+from beach_challenge_problem.evaluation import ItemResult, run_items
+from beach_challenge_problem.problem import PARAMETER_NAMES, ProblemBatch
+from beach_challenge_problem.templates import TEMPLATES
+
+_MAGIC = int.from_bytes(b'BEACHDS\0', 'little')
+_VERSION = 1
+_HEADER_SIZE = 64
+_ALIGNMENT = 64
+
+
+def _get_layout(
+    n_items: int, n_text_bytes: int, n_id_bytes: int
+) -> tuple[dict[str, tuple[int, np.dtype, tuple[int, ...]]], int]:
+    """
+    Returns the offset, dtype and shape of each section of the buffer, and the size
+    of the buffer.
+    """
+    sections = {
+        'params': (np.dtype(np.float64), (n_items, len(PARAMETER_NAMES))),
+        'expected_outputs': (np.dtype(np.float64), (n_items,)),
+        'text_offsets': (np.dtype(np.int64), (n_items + 1,)),
+        'id_offsets': (np.dtype(np.int64), (n_items + 1 if n_id_bytes else 0,)),
+        'text': (np.dtype(np.uint8), (n_text_bytes,)),
+        'ids': (np.dtype(np.uint8), (n_id_bytes,)),
+    }
+    layout, offset = {}, _HEADER_SIZE
+    for name, (dtype, shape) in sections.items():
+        layout[name] = (offset, dtype, shape)
+        size = dtype.itemsize * int(np.prod(shape))
+        offset += -(-size // _ALIGNMENT) * _ALIGNMENT
+    return layout, offset
+
+
+def _get_views(
+    buffer: np.ndarray, layout: dict[str, tuple[int, np.dtype, tuple[int, ...]]]
+) -> dict[str, np.ndarray]:
+    return {
+        section: buffer[offset : offset + dtype.itemsize * int(np.prod(shape))]
+        .view(dtype)
+        .reshape(shape)
+        for section, (offset, dtype, shape) in layout.items()
+    }
+
+
+def _concat(texts: Sequence[str]) -> tuple[np.ndarray, bytes]:
+    """
+    Returns the offsets of the UTF-8 encoded texts in their concatenation, and the
+    concatenation.
+    """
+    encoded = [text.encode() for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(
+        np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
+        out=offsets[1:],
+    )
+    return offsets, b''.join(encoded)
+
+
+class SharedDataset:
+    """
+    Dataset items stored in shared memory or in a memory-mapped file.
+
+    Arrays returned by the dataset are views of the shared buffer. Copy the ones
+    that must outlive the dataset, since a shared memory segment cannot be closed
+    while views of it exist.
+    """
+
+    def __init__(
+        self,
+        buffer: np.ndarray,
+        name: str,
+        shm: shared_memory.SharedMemory | None = None,
+        owner: bool = False,
+    ):
+        """
+        Args:
+            buffer: The bytes of the dataset, as a uint8 array
+            name: Name to attach to the dataset with: the name of the shared memory
+                segment, or the path of the file
+            shm: The shared memory segment holding the buffer, if any
+            owner: Whether closing the dataset also removes the segment
+        """
+        header = buffer[:_HEADER_SIZE].view(np.int64).tolist()
+        magic, version, n_items, n_params, n_text_bytes, n_id_bytes = header[:6]
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'{name} is not a shared dataset of version {_VERSION}')
+        if n_params != len(PARAMETER_NAMES):
+            raise ValueError(f'Dataset {name} was built for other parameters')
+
+        self.name = name
+        self._shm = shm
+        self._owner = owner
+        self._buffer = buffer
+        layout, _ = _get_layout(n_items, n_text_bytes, n_id_bytes)
+        self._arrays = _get_views(buffer, layout)
+
+    @classmethod
+    def create(
+        cls,
+        params: np.ndarray,
+        expected_outputs: np.ndarray,
+        questions: Sequence[str],
+        ids: Sequence[str] | None = None,
+        path: str | Path | None = None,
+    ) -> 'SharedDataset':
+        """
+        Creates a dataset in a new shared memory segment, or in a file.
+
+        Args:
+            params: Parameters of each problem, in the order of `PARAMETER_NAMES`,
+                NaN where unknown
+            expected_outputs: Correct answer of each problem
+            questions: Question of each problem
+            ids: Dataset item ID of each problem. Defaults to the index of the item
+            path: Path of the file to write the dataset to, instead of shared memory
+
+        Returns:
+            The dataset. A shared memory segment is removed when the dataset is
+            closed, a file is kept
+        """
+        n_items = len(questions)
+        text_offsets, text = _concat(questions)
+        id_offsets, id_bytes = _concat(ids) if ids is not None else (None, b'')
+        layout, size = _get_layout(n_items, len(text), len(id_bytes))
+
+        shm = None
+        if path is None:
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            buffer = np.frombuffer(shm.buf, dtype=np.uint8)
+        else:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            buffer = np.memmap(path, dtype=np.uint8, mode='w+', shape=(size,))
+
+        values = {
+            'params': params,
+            'expected_outputs': expected_outputs,
+            'text_offsets': text_offsets,
+            'id_offsets': id_offsets,
+            'text': np.frombuffer(text, dtype=np.uint8),
+            'ids': np.frombuffer(id_bytes, dtype=np.uint8),
+        }
+        view = None
+        try:
+            buffer[:_HEADER_SIZE].view(np.int64)[:6] = (
+                _MAGIC,
+                _VERSION,
+                n_items,
+                len(PARAMETER_NAMES),
+                len(text),
+                len(id_bytes),
+            )
+            for section, view in _get_views(buffer, layout).items():
+                if values[section] is not None:
+                    view[...] = values[section]
+        except BaseException:
+            if shm is not None:
+                # The segment cannot be closed while arrays still point into it
+                buffer = view = None
+                shm.close()
+                shm.unlink()
+            raise
+
+        if shm is not None:
+            return cls(buffer, shm.name, shm=shm, owner=True)
+        buffer.flush()
+        return cls.attach(str(path))
+
+    @classmethod
+    def from_batch(
+        cls,
+        batch: ProblemBatch,
+        templates: str | Sequence[str] = 'explicit_turn_time',
+        seed: int | None = None,
+        path: str | Path | None = None,
+    ) -> 'SharedDataset':
+        """
+        Creates a dataset from generated problems, e.g. with
+        `ProblemGenerator().generate_batch`.
+
+        Args:
+            batch: The problems
+            templates: Question template, or templates each problem draws one from
+            seed: Random seed of the template draws
+            path: Path of the file to write the dataset to, instead of shared memory
+        """
+        questions, _ = TEMPLATES.render_batch(batch, templates, seed=seed)
+        return cls.create(
+            batch.params, batch.get_correct_answers(), questions, path=path
+        )
+
+    @classmethod
+    def from_items(
+        cls, items: Sequence[dict[str, Any]], path: str | Path | None = None
+    ) -> 'SharedDataset':
+        """
+        Creates a dataset from dataset items, e.g. from `get_dataset_items`. The
+        parameters of questions that follow no template are NaN.
+
+        Args:
+            items: Dataset items with 'id', 'input' and 'expected_output' keys
+            path: Path of the file to write the dataset to, instead of shared memory
+        """
+        params = np.full((len(items), len(PARAMETER_NAMES)), np.nan)
+        for i, item in enumerate(items):
+            parsed = TEMPLATES.parse(item['input'])
+            if parsed is not None:
+                params[i] = parsed[1].get_params()
+        return cls.create(
+            params,
+            np.array([item['expected_output'] for item in items], dtype=np.float64),
+            [item['input'] for item in items],
+            ids=[str(item['id']) for item in items],
+            path=path,
+        )
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedDataset':
+        """
+        Attaches to a dataset by the name of its shared memory segment, or by the
+        path of its file.
+        """
+        if os.path.isfile(name):
+            return cls(np.memmap(name, dtype=np.uint8, mode='r'), name)
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(np.frombuffer(shm.buf, dtype=np.uint8), name, shm=shm)
+
+    def __len__(self) -> int:
+        return len(self._arrays['expected_outputs'])
+
+    @property
+    def params(self) -> np.ndarray:
+        return self._arrays['params']
+
+    @property
+    def expected_outputs(self) -> np.ndarray:
+        return self._arrays['expected_outputs']
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer)
+
+    def get_batch(self, start: int = 0, stop: int | None = None) -> ProblemBatch:
+        """
+        Returns the problems of a range of items, as a view of the shared buffer.
+        """
+        return ProblemBatch(self.params[start:stop])
+
+    def get_question(self, index: int) -> str:
+        start, stop = self._arrays['text_offsets'][index : index + 2].tolist()
+        return self._arrays['text'][start:stop].tobytes().decode()
+
+    def get_items(
+        self, start: int = 0, stop: int | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Returns a range of items as dataset items, with 'id', 'input' and
+        'expected_output' keys.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        questions = self._split('text_offsets', 'text', start, stop)
+        if len(self._arrays['ids']):
+            ids = self._split('id_offsets', 'ids', start, stop)
+        else:
+            ids = [str(i) for i in range(start, stop)]
+        expected_outputs = self.expected_outputs[start:stop].tolist()
+        return [
+            {'id': item_id, 'input': question, 'expected_output': expected}
+            for item_id, question, expected in zip(
+                ids, questions, expected_outputs, strict=True
+            )
+        ]
+
+    def _split(self, offsets: str, texts: str, start: int, stop: int) -> list[str]:
+        offsets = self._arrays[offsets][start : stop + 1]
+        base = int(offsets[0])
+        data = self._arrays[texts][base : int(offsets[-1])].tobytes()
+        bounds = (offsets - base).tolist()
+        return [data[a:b].decode() for a, b in zip(bounds, bounds[1:], strict=False)]
+
+    def close(self) -> None:
+        """
+        Releases the views of the buffer, and removes the shared memory segment if
+        this dataset created it.
+        """
+        self._arrays = {}
+        self._buffer = None
+        if self._shm is not None:
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self) -> 'SharedDataset':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+# Dataset of the current worker process, attached once by `_attach_worker`
+_worker_dataset: SharedDataset | None = None
+
+
+def _attach_worker(name: str) -> None:
+    global _worker_dataset
+    _worker_dataset = SharedDataset.attach(name)
+
+
+def _run_shard[T](
+    fn: Callable[[SharedDataset, int, int], T], start: int, stop: int
+) -> T:
+    return fn(_worker_dataset, start, stop)
+
+
+def map_shards[T](
+    fn: Callable[[SharedDataset, int, int], T],
+    dataset: SharedDataset,
+    n_workers: int | None = None,
+    shard_size: int | None = None,
+) -> list[T]:
+    """
+    Calls `fn(dataset, start, stop)` on consecutive ranges of items in a pool of
+    processes, each attaching to the dataset once instead of receiving a copy.
+
+    Args:
+        fn: Function processing a range of items. It must be picklable, e.g.
+            defined at the top level of a module
+        dataset: The dataset
+        n_workers: Number of processes. Defaults to the number of CPUs
+        shard_size: Number of items per call. Defaults to four shards per worker
+
+    Returns:
+        The return values of `fn`, in the order of the ranges
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    shard_size = shard_size or max(1, -(-len(dataset) // (4 * n_workers)))
+    with ProcessPoolExecutor(
+        n_workers, initializer=_attach_worker, initargs=(dataset.name,)
+    ) as pool:
+        futures = [
+            pool.submit(_run_shard, fn, start, min(start + shard_size, len(dataset)))
+            for start in range(0, len(dataset), shard_size)
+        ]
+        return [future.result() for future in futures]
+
+
+def _solve_shard(
+    get_agent: Callable[[], Any],
+    task_threads: int,
+    dataset: SharedDataset,
+    start: int,
+    stop: int,
+) -> list[ItemResult]:
+    agent = get_agent()
+    return run_items(agent.get_answer, dataset.get_items(start, stop), task_threads)
+
+
+def run_items_in_processes(
+    get_agent: Callable[[], Any],
+    dataset: SharedDataset,
+    n_workers: int | None = None,
+    task_threads: int = 1,
+    shard_size: int | None = None,
+) -> list[ItemResult]:
+    """
+    Solves and scores the items of a dataset in a pool of processes.
+
+    Args:
+        get_agent: Picklable function creating the agent in each process, e.g.
+            `functools.partial(OneShootAgent, model='openai-generic/llama3')`
+        dataset: The dataset
+        n_workers: Number of processes. Defaults to the number of CPUs
+        task_threads: Number of items solved concurrently in each process
+        shard_size: Number of items per shard, each solved by a new agent.
+            Defaults to four shards per worker
+
+    Returns:
+        The results, by shard in the order of the items, and in completion order
+        within a shard
+    """
+    logger.info(
+        f'Solving {len(dataset)} items of {dataset.name} in '
+        f'{n_workers or os.cpu_count()} processes'
+    )
+    shards = map_shards(
+        partial(_solve_shard, get_agent, task_threads),
+        dataset,
+        n_workers=n_workers,
+        shard_size=shard_size,
+    )
+    return [result for shard in shards for result in shard]
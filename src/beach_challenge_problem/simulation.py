@@ -0,0 +1,610 @@
+"""
+Vectorized trajectory simulator for variants of the beach problem.
+
+`calculate_final_distance` solves one scenario: Sofia drifts at constant velocity
+and Kai turns once, towards where Sofia is when he turns. This module solves
+families of harder variants over whole batches of problems at once:
+
+- Piecewise-constant motion (waypoints, currents that change at given times) has
+  an analytic solution, computed by `PiecewiseMotion` without any time stepping.
+- Motion driven by an arbitrary time-varying velocity, e.g. a tidal current, is
+  integrated numerically by `DriftMotion`.
+- Pursuit, where Kai continuously heads towards Sofia's current position, is an
+  ODE integrated by `simulate_pursuit`.
+
+The integrators step every problem of the batch in lockstep, with one step size
+per problem for the adaptive one.
+"""
+
+from collections.abc import Callable
+
+import numpy as np
+
+from beach_challenge_problem.problem import ProblemBatch
+
+# Velocity of each problem of a batch at the given times, of shape (n, 2)
+VelocityField = Callable[[np.ndarray], np.ndarray]
+
+# Derivative of a batch of states, f(t, y) with t of shape (n,) and y of shape (n, d)
+Derivative = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+# Dormand-Prince 5(4) tableau
+_DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+_DP_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+_DP_B5 = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0])
+_DP_B4 = np.array(
+    [5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40]
+)
+
+
+def _as_times(t: float | np.ndarray, n: int) -> np.ndarray:
+    return np.broadcast_to(np.asarray(t, dtype=np.float64), (n,))
+
+
+def integrate_fixed(
+    f: Derivative,
+    y0: np.ndarray,
+    t0: float | np.ndarray,
+    t1: float | np.ndarray,
+    n_steps: int = 200,
+    callback: Callable[[np.ndarray, np.ndarray], np.ndarray] | None = None,
+) -> np.ndarray:
+    """
+    Integrates a batch of ODEs with the classical fixed-step Runge-Kutta method.
+
+    Args:
+        f: Derivative of the states
+        y0: Initial states, of shape (n, d)
+        t0: Start time of each problem, scalar or of shape (n,)
+        t1: End time of each problem, scalar or of shape (n,)
+        n_steps: Number of steps, the same for every problem
+        callback: Called with the times and states after every step, returns the
+            states to continue from. Used to handle events, and to switch regimes
+            of f between steps rather than within one
+
+    Returns:
+        The states at t1, of shape (n, d)
+    """
+    y = np.array(y0, dtype=np.float64)
+    t0, t1 = _as_times(t0, len(y)), _as_times(t1, len(y))
+    h = ((t1 - t0) / n_steps)[:, None]
+    t = t0.copy()
+    for _ in range(n_steps):
+        k1 = f(t, y)
+        k2 = f(t + h[:, 0] / 2, y + h / 2 * k1)
+        k3 = f(t + h[:, 0] / 2, y + h / 2 * k2)
+        k4 = f(t + h[:, 0], y + h * k3)
+        y = y + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        t = t + h[:, 0]
+        if callback is not None:
+            y = callback(t, y)
+    return y
+
+
+def integrate_adaptive(
+    f: Derivative,
+    y0: np.ndarray,
+    t0: float | np.ndarray,
+    t1: float | np.ndarray,
+    rtol: float = 1e-8,
+    atol: float = 1e-10,
+    max_steps: int = 10_000,
+    callback: Callable[[np.ndarray, np.ndarray], np.ndarray] | None = None,
+) -> np.ndarray:
+    """
+    Integrates a batch of ODEs with the adaptive Dormand-Prince 5(4) method. Each
+    problem has its own step size, and problems that reached t1 stop moving while
+    the others finish.
+
+    Args:
+        f: Derivative of the states
+        y0: Initial states, of shape (n, d)
+        t0: Start time of each problem, scalar or of shape (n,)
+        t1: End time of each problem, scalar or of shape (n,)
+        rtol: Relative tolerance on the local error
+        atol: Absolute tolerance on the local error
+        max_steps: Maximum number of steps, accepted or not
+        callback: Called with the times and states after every step, as in
+            `integrate_fixed`
+
+    Returns:
+        The states at t1, of shape (n, d)
+
+    Raises:
+        RuntimeError: If some problems did not reach t1 within max_steps
+    """
+    y = np.array(y0, dtype=np.float64)
+    t0, t1 = _as_times(t0, len(y)), _as_times(t1, len(y))
+    t = t0.copy()
+    h = (t1 - t0) / 100
+    error_weights = _DP_B5 - _DP_B4
+    end_tolerance = 1e-12 * np.maximum(1.0, np.abs(t1))
+
+    for _ in range(max_steps):
+        active = t1 - t > end_tolerance
+        if not active.any():
+            return y
+
+        h = np.where(active, np.minimum(h, t1 - t), 0.0)
+        stages = []
+        for c, a in zip(_DP_C, _DP_A, strict=True):
+            y_stage = y + h[:, None] * sum(
+                (a_j * k for a_j, k in zip(a, stages, strict=True) if a_j),
+                np.zeros_like(y),
+            )
+            stages.append(f(t + c * h, y_stage))
+
+        y_new = y + h[:, None] * sum(b * k for b, k in zip(_DP_B5, stages, strict=True))
+        error = h[:, None] * sum(
+            e * k for e, k in zip(error_weights, stages, strict=True)
+        )
+        scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+        error_norm = np.sqrt(np.mean((error / scale) ** 2, axis=1))
+
+        accepted = active & (error_norm <= 1)
+        y = np.where(accepted[:, None], y_new, y)
+        t = np.where(accepted, t + h, t)
+        if callback is not None:
+            y = callback(t, y)
+        with np.errstate(divide='ignore'):
+            factor = np.clip(0.9 * error_norm**-0.2, 0.2, 5.0)
+        h = h * factor
+
+    raise RuntimeError(
+        f'{int(np.sum(t1 - t > end_tolerance))} problems did not converge '
+        f'within {max_steps} steps'
+    )
+
+
+class PiecewiseMotion:
+    """
+    Batch of trajectories with piecewise-constant velocity, evaluated analytically.
+    """
+
+    def __init__(self, start: np.ndarray, times: np.ndarray, velocities: np.ndarray):
+        """
+        Args:
+            start: Position at time 0, of shape (n, 2)
+            times: Time at which each segment starts, non-decreasing and starting
+                at 0, of shape (n, k). The last segment extends indefinitely
+            velocities: Velocity during each segment, of shape (n, k, 2)
+        """
+        self.start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+        self.times = np.asarray(times, dtype=np.float64).reshape(len(self.start), -1)
+        self.velocities = np.asarray(velocities, dtype=np.float64).reshape(
+            *self.times.shape, 2
+        )
+        self._ends = np.concatenate(
+            [self.times[:, 1:], np.full((len(self.times), 1), np.inf)], axis=1
+        )
+
+    @classmethod
+    def constant(cls, start: np.ndarray, velocity: np.ndarray) -> 'PiecewiseMotion':
+        """
+        Creates trajectories with a constant velocity, of shape (n, 2).
+        """
+        velocity = np.asarray(velocity, dtype=np.float64).reshape(-1, 1, 2)
+        return cls(start, np.zeros((len(velocity), 1)), velocity)
+
+    @classmethod
+    def from_waypoints(
+        cls,
+        start: np.ndarray,
+        waypoints: np.ndarray,
+        speeds: np.ndarray,
+        start_time: float | np.ndarray = 0.0,
+    ) -> 'PiecewiseMotion':
+        """
+        Creates trajectories that wait at the start until start_time, visit the
+        waypoints in order and stop at the last one.
+
+        Args:
+            start: Start position, of shape (n, 2)
+            waypoints: Positions to visit, of shape (n, k, 2)
+            speeds: Positive speed on the way to each waypoint, of shape (n, k)
+            start_time: Time of departure, scalar or of shape (n,)
+        """
+        start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+        waypoints = np.asarray(waypoints, dtype=np.float64).reshape(len(start), -1, 2)
+        speeds = np.broadcast_to(
+            np.asarray(speeds, dtype=np.float64), waypoints.shape[:2]
+        )
+
+        legs = np.diff(np.concatenate([start[:, None], waypoints], axis=1), axis=1)
+        durations = np.linalg.norm(legs, axis=2) / speeds
+        velocities = np.divide(
+            legs,
+            durations[..., None],
+            out=np.zeros_like(legs),
+            where=durations[..., None] > 0,
+        )
+        departure = _as_times(start_time, len(start))[:, None]
+        times = departure + np.concatenate(
+            [np.zeros((len(start), 1)), np.cumsum(durations, axis=1)], axis=1
+        )
+        zero = np.zeros((len(start), 1, 2))
+        return cls(
+            start,
+            np.concatenate([np.zeros((len(start), 1)), times], axis=1),
+            np.concatenate([zero, velocities, zero], axis=1),
+        )
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __add__(self, other: 'PiecewiseMotion') -> 'PiecewiseMotion':
+        """
+        Sums two batches of trajectories, e.g. a swimmer's own motion and the drift
+        of the current.
+        """
+        times = np.sort(np.concatenate([self.times, other.times], axis=1), axis=1)
+        return PiecewiseMotion(
+            self.start + other.start,
+            times,
+            self._velocity_at(times) + other._velocity_at(times),
+        )
+
+    def _velocity_at(self, times: np.ndarray) -> np.ndarray:
+        # Index of the segment each time falls in, for times of shape (n, m)
+        segment = np.sum(self.times[:, None, :] <= times[:, :, None], axis=2) - 1
+        segment = np.maximum(segment, 0)
+        return np.take_along_axis(self.velocities, segment[..., None], axis=1)
+
+    def velocity(self, t: float | np.ndarray) -> np.ndarray:
+        """
+        Returns the velocity of each trajectory at time t, scalar or of shape (n,).
+        """
+        return self._velocity_at(_as_times(t, len(self))[:, None])[:, 0]
+
+    def position(self, t: float | np.ndarray) -> np.ndarray:
+        """
+        Returns the position of each trajectory at time t, scalar or of shape (n,).
+        """
+        t = _as_times(t, len(self))[:, None]
+        elapsed = np.clip(t - self.times, 0, self._ends - self.times)
+        return self.start + np.einsum('nk,nkd->nd', elapsed, self.velocities)
+
+
+class DriftMotion:
+    """
+    Batch of trajectories driven by a time-varying velocity, integrated numerically.
+    """
+
+    def __init__(self, start: np.ndarray, velocity: VelocityField, rtol: float = 1e-10):
+        """
+        Args:
+            start: Position at time 0, of shape (n, 2)
+            velocity: Velocity of each trajectory at the given times
+            rtol: Relative tolerance of the integration
+        """
+        self.start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+        self.velocity = velocity
+        self.rtol = rtol
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def position(self, t: float | np.ndarray) -> np.ndarray:
+        """
+        Returns the position of each trajectory at time t, scalar or of shape (n,).
+        """
+        return integrate_adaptive(
+            lambda s, _: self.velocity(s),
+            self.start,
+            0.0,
+            t,
+            rtol=self.rtol,
+            atol=self.rtol * 1e-2,
+        )
+
+
+Motion = PiecewiseMotion | DriftMotion
+
+
+def simulate_pursuit(
+    target: Motion,
+    start: np.ndarray,
+    start_time: float | np.ndarray,
+    speed: float | np.ndarray,
+    end_time: float | np.ndarray,
+    method: str = 'adaptive',
+    n_steps: int = 200,
+    rtol: float = 1e-8,
+    atol: float = 1e-10,
+    capture_radius: float = 1e-6,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Simulates pursuers that continuously head towards their target at constant
+    speed. A pursuer that catches its target then matches the target's velocity,
+    instead of circling around it, until the target gets away. A target counts
+    as caught once it is closer than the method resolves: a few times the error
+    tolerance for the adaptive method, one step for the fixed-step one.
+
+    Args:
+        target: Trajectories of the targets
+        start: Position of each pursuer at start_time, of shape (n, 2)
+        start_time: Time the pursuit starts, scalar or of shape (n,)
+        speed: Speed of the pursuers, scalar or of shape (n,)
+        end_time: Time the pursuit ends, scalar or of shape (n,)
+        method: 'adaptive' for Dormand-Prince 5(4), 'fixed' for Runge-Kutta 4 with
+            n_steps steps
+        n_steps: Number of steps of the fixed-step method
+        rtol: Relative tolerance of the adaptive method
+        atol: Absolute tolerance of the adaptive method
+        capture_radius: Minimum distance in km at which a target counts as caught
+
+    Returns:
+        The positions of the pursuers and of the targets at end_time, both of shape
+        (n, 2)
+    """
+    if method not in ('adaptive', 'fixed'):
+        raise ValueError(f"Unknown method '{method}', expected 'adaptive' or 'fixed'")
+
+    n = len(target)
+    speed = _as_times(speed, n)[:, None]
+    start_time = _as_times(start_time, n)
+
+    # Whether each pursuer has caught its target, updated between integration steps
+    # only: switching within a step would make the adaptive method chatter
+    caught = np.zeros((n, 1), dtype=bool)
+    last_time = start_time.copy()
+
+    def heading(
+        pursuer: np.ndarray, target_position: np.ndarray, target_velocity: np.ndarray
+    ) -> np.ndarray:
+        delta = target_position - pursuer
+        distance = np.linalg.norm(delta, axis=1, keepdims=True)
+        chase = speed * delta / np.maximum(distance, 1e-300)
+        target_speed = np.linalg.norm(target_velocity, axis=1, keepdims=True)
+        follow = target_velocity * np.minimum(
+            1.0, speed / np.maximum(target_speed, 1e-300)
+        )
+        return np.where(caught, follow, chase)
+
+    def capture(
+        t: np.ndarray,
+        pursuer: np.ndarray,
+        target_position: np.ndarray,
+        target_velocity: np.ndarray,
+    ) -> np.ndarray:
+        # Close to the target the steps straddle it and the pursuer slides along
+        # behind it, so within the resolution of the method it is put on the target
+        if method == 'adaptive':
+            resolution = 10 * (atol + rtol * np.abs(target_position).max(axis=1))
+        else:
+            resolution = speed[:, 0] * (t - last_time)
+        gap = np.linalg.norm(target_position - pursuer, axis=1)
+        reached = gap <= np.maximum(capture_radius, resolution)
+        # A faster target gets away again
+        can_follow = np.linalg.norm(target_velocity, axis=1) <= speed[:, 0]
+        caught[:, 0] = (caught[:, 0] | reached) & can_follow
+        last_time[:] = t
+        return np.where(
+            reached[:, None] & can_follow[:, None], target_position, pursuer
+        )
+
+    if isinstance(target, PiecewiseMotion):
+        # The target position is known analytically, only the pursuer is integrated
+        def f(t, y):
+            return heading(y, target.position(t), target.velocity(t))
+
+        def callback(t, y):
+            return capture(t, y, target.position(t), target.velocity(t))
+
+        y0 = np.asarray(start, dtype=np.float64)
+    else:
+        # Target and pursuer are integrated together, from where the target is when
+        # the pursuit starts
+        def f(t, y):
+            target_velocity = target.velocity(t)
+            pursuer_velocity = heading(y[:, 2:], y[:, :2], target_velocity)
+            return np.concatenate([target_velocity, pursuer_velocity], axis=1)
+
+        def callback(t, y):
+            pursuer = capture(t, y[:, 2:], y[:, :2], target.velocity(t))
+            return np.concatenate([y[:, :2], pursuer], axis=1)
+
+        y0 = np.concatenate([target.position(start_time), start], axis=1)
+
+    y0 = callback(start_time, y0)
+    if method == 'adaptive':
+        y = integrate_adaptive(
+            f, y0, start_time, end_time, rtol=rtol, atol=atol, callback=callback
+        )
+    else:
+        y = integrate_fixed(
+            f, y0, start_time, end_time, n_steps=n_steps, callback=callback
+        )
+
+    if isinstance(target, PiecewiseMotion):
+        return y, target.position(end_time)
+    return y[:, 2:], y[:, :2]
+
+
+def get_sofia_heading(batch: ProblemBatch) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the unit vector from the beach towards the buoy, and the unit vector
+    perpendicular to it along which the current pushes Sofia, both of shape (n, 2).
+    """
+    angle = np.radians(batch.get_column('buoy_angle'))
+    heading = np.stack([np.cos(angle), np.sin(angle)], axis=1)
+    return heading, heading[:, ::-1] * [-1, 1]
+
+
+def get_sofia_motion(
+    batch: ProblemBatch, current: Motion | VelocityField | None = None
+) -> Motion:
+    """
+    Returns Sofia's trajectories: she swims towards the buoy while the current
+    drifts her.
+
+    Args:
+        batch: The problems
+        current: Drift of the current. A PiecewiseMotion keeps the trajectories
+            analytic, a velocity field is integrated numerically. Defaults to the
+            constant current perpendicular to her heading of the original problem
+    """
+    heading, perpendicular = get_sofia_heading(batch)
+    origin = np.zeros((len(batch), 2))
+    swim = heading * batch.get_column('sofia_speed')[:, None]
+    if current is None:
+        current = PiecewiseMotion.constant(
+            origin, perpendicular * batch.get_column('ocean_current_speed')[:, None]
+        )
+    if isinstance(current, PiecewiseMotion):
+        return PiecewiseMotion.constant(origin, swim) + current
+    if isinstance(current, DriftMotion):
+        current = current.velocity
+    return DriftMotion(origin, lambda t: swim + current(t))
+
+
+def changing_current(
+    batch: ProblemBatch, times: np.ndarray, speeds: np.ndarray
+) -> PiecewiseMotion:
+    """
+    Returns a current perpendicular to Sofia's heading whose speed changes at given
+    times, e.g. at the turn of the tide.
+
+    Args:
+        batch: The problems
+        times: Time each speed starts to apply, the first being 0, of shape (n, k)
+        speeds: Signed speed of the current from each time on, of shape (n, k)
+    """
+    _, perpendicular = get_sofia_heading(batch)
+    speeds = np.asarray(speeds, dtype=np.float64).reshape(len(batch), -1)
+    return PiecewiseMotion(
+        np.zeros((len(batch), 2)),
+        np.broadcast_to(times, speeds.shape),
+        speeds[..., None] * perpendicular[:, None],
+    )
+
+
+def tidal_current(
+    batch: ProblemBatch, amplitude: float = 0.5, period: float = 12.42
+) -> VelocityField:
+    """
+    Returns a current perpendicular to Sofia's heading whose speed oscillates
+    around the current speed of each problem.
+
+    Args:
+        batch: The problems
+        amplitude: Relative amplitude of the oscillation
+        period: Period of the oscillation in hours, a semi-diurnal tide by default
+    """
+    _, perpendicular = get_sofia_heading(batch)
+    mean_speed = batch.get_column('ocean_current_speed')
+
+    def velocity(t: np.ndarray) -> np.ndarray:
+        speed = mean_speed * (1 + amplitude * np.sin(2 * np.pi * t / period))
+        return speed[:, None] * perpendicular
+
+    return velocity
+
+
+def get_kai_shoreline_motion(batch: ProblemBatch) -> PiecewiseMotion:
+    """
+    Returns Kai's trajectories during the first phase, along the shoreline.
+    """
+    velocity = np.zeros((len(batch), 2))
+    velocity[:, 0] = batch.get_column('kai_initial_speed')
+    return PiecewiseMotion.constant(np.zeros((len(batch), 2)), velocity)
+
+
+def solve_two_phase(
+    batch: ProblemBatch, current: Motion | VelocityField | None = None
+) -> np.ndarray:
+    """
+    Solves the original problems, where Kai turns once towards Sofia's position at
+    the time he turns, possibly with another current.
+
+    With the default current this matches `ProblemBatch.get_correct_answers`.
+
+    Returns:
+        Distance between Sofia and Kai at the final time, for each problem
+    """
+    sofia = get_sofia_motion(batch, current)
+    change_time = batch.get_column('kai_change_direction_time')
+    final_time = batch.get_column('final_time')
+
+    kai_change = get_kai_shoreline_motion(batch).position(change_time)
+    kai = PiecewiseMotion.from_waypoints(
+        kai_change,
+        sofia.position(change_time)[:, None],
+        batch.get_column('kai_final_speed')[:, None],
+        start_time=change_time,
+    )
+    # Kai keeps paddling in the same direction past Sofia's old position
+    kai.velocities[:, -1] = kai.velocities[:, -2]
+    return np.linalg.norm(sofia.position(final_time) - kai.position(final_time), axis=1)
+
+
+def solve_waypoints(
+    batch: ProblemBatch,
+    waypoints: np.ndarray,
+    speeds: np.ndarray,
+    current: Motion | VelocityField | None = None,
+) -> np.ndarray:
+    """
+    Solves a variant where Kai, after paddling along the shoreline, visits
+    waypoints in order and stops at the last one.
+
+    Args:
+        batch: The problems
+        waypoints: Positions Kai visits after turning, of shape (n, k, 2)
+        speeds: Kai's speed on the way to each waypoint, of shape (n, k)
+        current: Drift of the current, as in `get_sofia_motion`
+
+    Returns:
+        Distance between Sofia and Kai at the final time, for each problem
+    """
+    sofia = get_sofia_motion(batch, current)
+    change_time = batch.get_column('kai_change_direction_time')
+    final_time = batch.get_column('final_time')
+
+    kai = PiecewiseMotion.from_waypoints(
+        get_kai_shoreline_motion(batch).position(change_time),
+        waypoints,
+        speeds,
+        start_time=change_time,
+    )
+    return np.linalg.norm(sofia.position(final_time) - kai.position(final_time), axis=1)
+
+
+def solve_pursuit(
+    batch: ProblemBatch,
+    current: Motion | VelocityField | None = None,
+    method: str = 'adaptive',
+    **kwargs,
+) -> np.ndarray:
+    """
+    Solves a variant where Kai, after paddling along the shoreline, continuously
+    heads towards Sofia's current position instead of where she was when he turned.
+
+    Args:
+        batch: The problems
+        current: Drift of the current, as in `get_sofia_motion`
+        method: Integration method, as in `simulate_pursuit`
+        **kwargs: Arguments passed to `simulate_pursuit`
+
+    Returns:
+        Distance between Sofia and Kai at the final time, for each problem
+    """
+    change_time = batch.get_column('kai_change_direction_time')
+    kai, sofia = simulate_pursuit(
+        get_sofia_motion(batch, current),
+        get_kai_shoreline_motion(batch).position(change_time),
+        start_time=change_time,
+        speed=batch.get_column('kai_final_speed'),
+        end_time=batch.get_column('final_time'),
+        method=method,
+        **kwargs,
+    )
+    return np.linalg.norm(sofia - kai, axis=1)
@@ -0,0 +1,375 @@
+"""
+Speculative answers for interactive use.
+
+`SpeculativeAgent` answers straight away with a fast draft agent, e.g. the solver of
+`OracleAgent` or a small local model, and verifies the draft with the
+authoritative agent in the background. Each verification is reconciled through a
+future and an optional callback, and disagreements are logged for quality
+tracking. Once verified, the authoritative answer is returned for every
+equivalent problem.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from beach_challenge_problem.agents.generic_agent import GenericAgent
+from beach_challenge_problem.agents.oracle_agent import OracleAgent
+from beach_challenge_problem.cache import ProblemCache
+from beach_challenge_problem.profiling import span
+
+# Relative difference under which a draft agrees with the verified answer, the
+# tolerance of the within_1_percent metric
+AGREEMENT_TOLERANCE = 0.01
+
+
+def answers_agree(
+    draft: float, verified: float, tolerance: float = AGREEMENT_TOLERANCE
+) -> bool:
+    """
+    Returns whether the draft answer is within the relative tolerance of the
+    verified answer.
+    """
+    return abs(draft - verified) <= tolerance * max(abs(verified), 1e-9)
+
+
+@dataclass
+class Verification:
+    """
+    Outcome of the verification of a draft answer.
+    """
+
+    problem: str
+    draft_answer: float
+    verified_answer: float | None
+    agrees: bool | None
+    draft_latency: float
+    verify_latency: float
+    error: str | None = None
+
+
+@dataclass
+class Speculation:
+    """
+    Answer returned to the caller, and the future of its verification.
+
+    `verification` is None when the answer needs no verification, because it was
+    verified before or comes from the authoritative agent after the draft failed.
+    """
+
+    answer: float
+    verification: Future[Verification] | None
+
+
+class SpeculativeAgent(GenericAgent):
+    """
+    Wraps an agent so that problems are answered by a fast draft agent first, and
+    verified by the wrapped agent in the background.
+    """
+
+    def __init__(
+        self,
+        agent: GenericAgent,
+        draft_agent: GenericAgent | None = None,
+        on_verified: Callable[[Verification], None] | None = None,
+        disagreement_log: str | Path | None = None,
+        max_verifications: int = 16,
+        tolerance: float = AGREEMENT_TOLERANCE,
+        cache: ProblemCache | None = None,
+    ):
+        """
+        Args:
+            agent: The authoritative agent, e.g. OneShootAgent
+            draft_agent: The agent giving the immediate answer. Defaults to
+                OracleAgent, approximate so that it answers every template
+            on_verified: Callback called with each verification once it is done,
+                from a worker thread or the event loop
+            disagreement_log: Path of a JSON lines file the disagreements and the
+                failed verifications are appended to
+            max_verifications: Maximum number of verifications running at once in
+                the sync path. Later ones wait for a worker thread
+            tolerance: Relative difference under which the answers agree
+            cache: Cache of the verified answers. Defaults to a new in-memory cache
+        """
+        self.agent = agent
+        if draft_agent is None:
+            draft_agent = OracleAgent(approximate=True)
+        self.draft_agent = draft_agent
+        self.on_verified = on_verified
+        self.disagreement_log = Path(disagreement_log) if disagreement_log else None
+        self.tolerance = tolerance
+        self.verified_answers = cache if cache is not None else ProblemCache()
+
+        self._executor = ThreadPoolExecutor(
+            max_verifications, thread_name_prefix='verify'
+        )
+        self._pending: set[Future] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+        # metrics
+        self._n_speculations = 0
+        self._n_cached = 0
+        self._n_fallbacks = 0
+        self._n_verified = 0
+        self._n_verify_errors = 0
+        self._n_disagreements = 0
+        self._draft_latency = 0.0
+        self._verify_latency = 0.0
+
+    def speculate(self, problem: str) -> Speculation:
+        """
+        Returns the draft answer to the problem straight away, and starts its
+        verification in a worker thread.
+
+        Args:
+            problem: The problem statement as a string
+
+        Returns:
+            The answer and the future of its verification
+
+        Raises:
+            Exception: The exception raised by the authoritative agent, if the
+                draft agent failed too
+        """
+        answer = self.verified_answers.get(problem)
+        if answer is not None:
+            return self._count_cached(answer)
+
+        start = time.perf_counter()
+        try:
+            with span('speculative.draft'):
+                draft = self.draft_agent.get_answer(problem)
+        except Exception as e:
+            logger.debug(f'Draft failed, waiting for the verified answer: {e!r}')
+            return self._fall_back(problem, self.agent.get_answer(problem))
+        draft_latency = time.perf_counter() - start
+
+        future = self._executor.submit(self._verify, problem, draft, draft_latency)
+        self._track(future)
+        return Speculation(answer=draft, verification=future)
+
+    async def speculate_async(self, problem: str) -> Speculation:
+        """
+        Async version of `speculate`, verifying the draft in a task on the running
+        event loop with the async path of the wrapped agent.
+        """
+        answer = self.verified_answers.get(problem)
+        if answer is not None:
+            return self._count_cached(answer)
+
+        start = time.perf_counter()
+        try:
+            with span('speculative.draft'):
+                draft = await self.draft_agent.get_answer_async(problem)
+        except Exception as e:
+            logger.debug(f'Draft failed, waiting for the verified answer: {e!r}')
+            answer = await self.agent.get_answer_async(problem)
+            return self._fall_back(problem, answer)
+        draft_latency = time.perf_counter() - start
+
+        future = Future()
+        task = asyncio.create_task(
+            self._verify_async(problem, draft, draft_latency, future)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._track(future)
+        return Speculation(answer=draft, verification=future)
+
+    def get_answer(self, problem: str) -> float:
+        """
+        Returns the draft answer to the problem, verified in the background.
+        """
+        return self.speculate(problem).answer
+
+    async def get_answer_async(self, problem: str) -> float:
+        """
+        Async version of `get_answer`.
+        """
+        return (await self.speculate_async(problem)).answer
+
+    def _count_cached(self, answer: float) -> Speculation:
+        with self._lock:
+            self._n_speculations += 1
+            self._n_cached += 1
+        return Speculation(answer=answer, verification=None)
+
+    def _fall_back(self, problem: str, answer: float) -> Speculation:
+        self.verified_answers.set(problem, answer)
+        with self._lock:
+            self._n_speculations += 1
+            self._n_fallbacks += 1
+        return Speculation(answer=answer, verification=None)
+
+    def _track(self, future: Future) -> None:
+        with self._lock:
+            self._n_speculations += 1
+            self._pending.add(future)
+        future.add_done_callback(self._untrack)
+
+    def _untrack(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def _verify(self, problem: str, draft: float, draft_latency: float) -> Verification:
+        start = time.perf_counter()
+        verified, error = None, None
+        try:
+            with span('speculative.verify'):
+                verified = self.agent.get_answer(problem)
+        except Exception as e:
+            error = repr(e)
+        return self._reconcile(
+            problem, draft, verified, draft_latency, time.perf_counter() - start, error
+        )
+
+    async def _verify_async(
+        self, problem: str, draft: float, draft_latency: float, future: Future
+    ) -> None:
+        start = time.perf_counter()
+        verified, error = None, None
+        try:
+            with span('speculative.verify'):
+                verified = await self.agent.get_answer_async(problem)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            error = repr(e)
+        future.set_result(
+            self._reconcile(
+                problem,
+                draft,
+                verified,
+                draft_latency,
+                time.perf_counter() - start,
+                error,
+            )
+        )
+
+    def _reconcile(
+        self,
+        problem: str,
+        draft: float,
+        verified: float | None,
+        draft_latency: float,
+        verify_latency: float,
+        error: str | None,
+    ) -> Verification:
+        """
+        Records the outcome of a verification, and stores the verified answer.
+        """
+        agrees = (
+            answers_agree(draft, verified, self.tolerance)
+            if verified is not None
+            else None
+        )
+        verification = Verification(
+            problem=problem,
+            draft_answer=draft,
+            verified_answer=verified,
+            agrees=agrees,
+            draft_latency=draft_latency,
+            verify_latency=verify_latency,
+            error=error,
+        )
+        if verified is not None:
+            self.verified_answers.set(problem, verified)
+
+        with self._lock:
+            self._draft_latency += draft_latency
+            self._verify_latency += verify_latency
+            if verified is None:
+                self._n_verify_errors += 1
+            else:
+                self._n_verified += 1
+                self._n_disagreements += not agrees
+
+            if not agrees:
+                if verified is None:
+                    logger.warning(f'Verification of the draft {draft} failed: {error}')
+                else:
+                    logger.warning(
+                        f'Draft {draft} disagrees with verified answer {verified}'
+                    )
+                if self.disagreement_log is not None:
+                    self.disagreement_log.parent.mkdir(parents=True, exist_ok=True)
+                    with self.disagreement_log.open('a') as f:
+                        f.write(json.dumps(asdict(verification)) + '\n')
+
+        if self.on_verified is not None:
+            try:
+                self.on_verified(verification)
+            except Exception:
+                logger.exception('on_verified callback failed')
+        return verification
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits for the pending verifications. Must not be called from the event
+        loop running async verifications.
+
+        Args:
+            timeout: Maximum number of seconds to wait, or None to wait for all
+
+        Returns:
+            Whether every verification is done
+        """
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = concurrent.futures.wait(pending, timeout=timeout)
+        return not not_done
+
+    async def wait_async(self) -> None:
+        """
+        Waits for the pending async verifications.
+        """
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        """
+        Waits for the pending sync verifications and stops the worker threads.
+        """
+        self._executor.shutdown(wait=True)
+
+    def get_metrics(self) -> dict:
+        """
+        Returns the counters of the speculations and of their verifications.
+        """
+        with self._lock:
+            n_done = self._n_verified + self._n_verify_errors
+            return {
+                'n_speculations': self._n_speculations,
+                'n_cached': self._n_cached,
+                'n_fallbacks': self._n_fallbacks,
+                'n_pending': len(self._pending),
+                'n_verified': self._n_verified,
+                'n_verify_errors': self._n_verify_errors,
+                'n_disagreements': self._n_disagreements,
+                'disagreement_rate': self._n_disagreements / self._n_verified
+                if self._n_verified
+                else 0.0,
+                'mean_draft_latency': self._draft_latency / n_done if n_done else 0.0,
+                'mean_verify_latency': self._verify_latency / n_done if n_done else 0.0,
+            }
+
+    def get_params(self) -> dict:
+        """
+        Returns the parameters of the wrapped agent and of the draft agent.
+        """
+        return {
+            **self.agent.get_params(),
+            'wrapped_agent_type': self.agent.__class__.__name__,
+            'draft_agent_type': self.draft_agent.__class__.__name__,
+            'draft_agent_params': self.draft_agent.get_params(),
+            'speculative': True,
+        }
@@ -0,0 +1,265 @@
+"""
+Registry of question templates, to phrase problems in several ways.
+
+Each template is compiled once into a printf-style renderer and a regex that
+parses rendered questions back into problems. Templates of the same scenario
+are paraphrases of each other, e.g. to test how robust a model is to the wording
+of the question. A whole `ProblemBatch` is rendered at once by formatting each
+distinct parameter value once.
+"""
+
+import random
+import string
+from collections.abc import Sequence
+
+import numpy as np
+
+from beach_challenge_problem.problem import (
+    COMPACT_QUESTION_TEMPLATE,
+    PARAMETER_NAMES,
+    QUESTION_TEMPLATE,
+    Problem,
+    ProblemBatch,
+    _compile_template,
+    _normalize_question,
+    _parse_number,
+)
+
+
+class QuestionTemplate:
+    """
+    A named question template with its renderer and parser.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        text: str,
+        scenario: str = 'two_phase',
+        fixed_params: dict[str, float] | None = None,
+    ):
+        """
+        Args:
+            name: Unique name of the template
+            text: Question with one {parameter} field per parameter of
+                `PARAMETER_NAMES` that it mentions, optionally with a format spec
+            scenario: Scenario the question describes. Templates of the same
+                scenario are paraphrases of each other
+            fixed_params: Values of the parameters the question states literally
+                instead of through a field, e.g. a turn "after exactly 1 hour"
+
+        Raises:
+            ValueError: If a field is not a parameter, or a parameter is neither a
+                field nor fixed, so questions could not be parsed back
+        """
+        self.name = name
+        self.text = text
+        self.scenario = scenario
+        self.fixed_params = dict(fixed_params or {})
+
+        segments = list(string.Formatter().parse(text))
+        self._fields = [
+            (field, spec) for _, field, spec, _ in segments if field is not None
+        ]
+        self._format = ''.join(
+            literal.replace('%', '%%') + ('%s' if field is not None else '')
+            for literal, field, _, _ in segments
+        )
+        self._pattern = _compile_template(text)
+
+        fields = {field for field, _ in self._fields}
+        unknown = fields - set(PARAMETER_NAMES)
+        if unknown:
+            raise ValueError(f'Template {name} has unknown fields {sorted(unknown)}')
+        missing = set(PARAMETER_NAMES) - fields - set(self.fixed_params)
+        if missing:
+            raise ValueError(f'Template {name} does not state {sorted(missing)}')
+
+    def render(self, problem: Problem) -> str:
+        """
+        Returns the question for a problem.
+
+        Raises:
+            ValueError: If the problem has another value for a parameter fixed by
+                the template, so the question would not describe it
+        """
+        for name, value in self.fixed_params.items():
+            if getattr(problem, name) != value:
+                raise ValueError(
+                    f'Template {self.name} states {name}={value}, '
+                    f'the problem has {getattr(problem, name)}'
+                )
+        return self._format % tuple(
+            format(getattr(problem, field), spec) for field, spec in self._fields
+        )
+
+    def render_batch(self, batch: ProblemBatch) -> list[str]:
+        """
+        Returns the question for every problem of a batch, the same as `render`
+        for each problem.
+
+        Raises:
+            ValueError: If a problem has another value for a parameter fixed by the
+                template, so its question would not describe it
+        """
+        for name, value in self.fixed_params.items():
+            mismatches = np.count_nonzero(batch.get_column(name) != value)
+            if mismatches:
+                raise ValueError(
+                    f'Template {self.name} states {name}={value}, '
+                    f'{mismatches} problems have another value'
+                )
+        columns = []
+        for field, spec in self._fields:
+            values, inverse = np.unique(batch.get_column(field), return_inverse=True)
+            formatted = [
+                format(_parse_number(value), spec) for value in values.tolist()
+            ]
+            columns.append([formatted[i] for i in inverse.tolist()])
+        return [self._format % row for row in zip(*columns, strict=True)]
+
+    def parse(self, question: str) -> Problem | None:
+        """
+        Parses a question rendered by this template back into a problem.
+
+        Returns:
+            The problem, or None if the question does not follow the template
+        """
+        match = self._pattern.fullmatch(_normalize_question(question))
+        if match is None:
+            return None
+        params = {
+            name: _parse_number(value) for name, value in match.groupdict().items()
+        }
+        return Problem(**params, **self.fixed_params)
+
+
+class TemplateRegistry:
+    """
+    Question templates by name.
+    """
+
+    def __init__(self, templates: Sequence[QuestionTemplate] = ()):
+        self._templates: dict[str, QuestionTemplate] = {}
+        for template in templates:
+            self.register(template)
+
+    def register(self, template: QuestionTemplate) -> QuestionTemplate:
+        """
+        Adds a template to the registry.
+
+        Raises:
+            ValueError: If a template with the same name is already registered
+        """
+        if template.name in self._templates:
+            raise ValueError(f'Template {template.name} is already registered')
+        self._templates[template.name] = template
+        return template
+
+    def get(self, name: str) -> QuestionTemplate:
+        """
+        Raises:
+            KeyError: If no template has this name
+        """
+        if name not in self._templates:
+            raise KeyError(f'Unknown template {name}, expected one of {self.names()}')
+        return self._templates[name]
+
+    def names(self, scenario: str | None = None, complete: bool = False) -> list[str]:
+        """
+        Returns the names of the templates, optionally only of one scenario.
+
+        Args:
+            scenario: Only return the templates of this scenario
+            complete: Only return the templates without fixed parameters, whose
+                questions state every parameter and so determine the answer
+        """
+        return [
+            name
+            for name, template in self._templates.items()
+            if (scenario is None or template.scenario == scenario)
+            and not (complete and template.fixed_params)
+        ]
+
+    def parse(
+        self, question: str, names: Sequence[str] | None = None
+    ) -> tuple[str, Problem] | None:
+        """
+        Parses a question with the first template it follows.
+
+        Args:
+            question: The question text
+            names: Templates to try, in order. Defaults to all of them
+
+        Returns:
+            The name of the template and the problem, or None if the question
+            follows none of the templates
+        """
+        for name in names or self._templates:
+            problem = self.get(name).parse(question)
+            if problem is not None:
+                return name, problem
+        return None
+
+    def render_batch(
+        self,
+        batch: ProblemBatch,
+        names: str | Sequence[str] = 'explicit_turn_time',
+        seed: int | None = None,
+    ) -> tuple[list[str], list[str]]:
+        """
+        Renders a batch of problems, each with one of the given templates.
+
+        Args:
+            batch: The problems
+            names: Template, or templates to draw one from at random for each
+                problem
+            seed: Random seed of the draw
+
+        Returns:
+            The questions, and the name of the template of each one
+
+        Raises:
+            ValueError: If a problem has another value for a parameter fixed by the
+                template drawn for it
+        """
+        names = [names] if isinstance(names, str) else list(names)
+        rng = random.Random(seed)
+        assigned = [rng.choice(names) for _ in range(len(batch))]
+
+        questions = [''] * len(batch)
+        for name in dict.fromkeys(assigned):
+            indices = [
+                i for i, assigned_name in enumerate(assigned) if assigned_name == name
+            ]
+            rendered = self.get(name).render_batch(ProblemBatch(batch.params[indices]))
+            for i, question in zip(indices, rendered, strict=True):
+                questions[i] = question
+        return questions, assigned
+
+
+# Kai turns after exactly 1 hour in most phrasings, as in `QUESTION_TEMPLATE`
+_TURN_AFTER_ONE_HOUR = {'kai_change_direction_time': 1}
+
+TEMPLATES = TemplateRegistry(
+    [
+        QuestionTemplate(
+            'original', QUESTION_TEMPLATE, fixed_params=_TURN_AFTER_ONE_HOUR
+        ),
+        QuestionTemplate(
+            'reworded',
+            'Kai and Sofia leave from the same spot on a beach. Sofia swims straight for a buoy {buoy_offshore_distance} km away, at an angle of {buoy_angle}° to the shoreline, at a speed of {sofia_speed} km/h. A current pushes her sideways at {ocean_current_speed} km/h, perpendicular to the direction she is aiming for. Kai paddles his longboard along the shoreline at {kai_initial_speed} km/h for one hour. He then turns towards the point where Sofia is at that moment and paddles in a straight line in that direction at {kai_final_speed} km/h. How far apart are they {final_time} hours after they set off?',
+            fixed_params=_TURN_AFTER_ONE_HOUR,
+        ),
+        QuestionTemplate(
+            'question_first',
+            'What is the distance between Kai and Sofia {final_time} hours after they start from the same point on a beach? Sofia aims for a buoy {buoy_offshore_distance} km offshore at {buoy_angle}° from the shoreline and swims at {sofia_speed} km/hour, while an ocean current pushes her at {ocean_current_speed} km/hour perpendicular to the direction she aims for. Kai paddles along the shoreline at {kai_initial_speed} km/hour. After 1 hour, he heads at {kai_final_speed} km/hour in a straight line towards where Sofia is at that moment.',
+            fixed_params=_TURN_AFTER_ONE_HOUR,
+        ),
+        QuestionTemplate(
+            'explicit_turn_time',
+            "Kai and Sofia start at the same point on a beach. Sofia swims toward a buoy that's {buoy_offshore_distance} km offshore at a {buoy_angle}° angle from the shoreline, at {sofia_speed} km/hour, while ocean currents push her sideways at {ocean_current_speed} km/hour perpendicular to her intended direction. Kai paddles along the shoreline at {kai_initial_speed} km/hour until {kai_change_direction_time} hours after the start. He then turns and paddles directly toward Sofia's position at that time at {kai_final_speed} km/hour. What is the distance between them {final_time} hours after the start?",
+        ),
+        QuestionTemplate('compact', COMPACT_QUESTION_TEMPLATE),
+    ]
+)
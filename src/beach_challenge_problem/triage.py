@@ -0,0 +1,447 @@
+"""
+Local store of wrong answers, bucketed by the likely cause of the failure.
+
+Each failed item is stored in SQLite with the parameters of its problem, the
+reasoning of the model, its numeric error and its latency, so that failures of
+large runs can be triaged with SQL queries. The cause of a wrong answer is guessed
+by solving the problem again with the usual mistakes built in, e.g. without the
+current or with Kai turning at another time, and checking which one gives the
+answer of the model.
+"""
+
+import dataclasses
+import datetime
+import sqlite3
+import threading
+from collections.abc import Callable
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from beach_challenge_problem.evaluation import ItemResult
+from beach_challenge_problem.problem import PARAMETER_NAMES, Problem
+from beach_challenge_problem.templates import TEMPLATES
+
+# Relative error under which an answer matches a value, as for within_1_percent
+MATCH_TOLERANCE = 0.01
+
+# Upper bounds of the relative error bands, in increasing order
+ERROR_BANDS = (
+    (0.01, '<1%'),
+    (0.05, '1-5%'),
+    (0.1, '5-10%'),
+    (0.5, '10-50%'),
+    (1.0, '50-100%'),
+    (float('inf'), '>100%'),
+)
+
+# Kai's turn times the problems are generated with
+_TURN_TIMES = (1.0, 2.0)
+
+_PARAMETER_COLUMNS = ',\n    '.join(f'{name} REAL' for name in PARAMETER_NAMES)
+_PARAMETER_INDEXES = '\n'.join(
+    f'CREATE INDEX IF NOT EXISTS failures_{name} ON failures ({name});'
+    for name in PARAMETER_NAMES
+)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS failures (
+    id INTEGER PRIMARY KEY,
+    run TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dataset_item_id TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    error_band TEXT NOT NULL,
+    template TEXT,
+    {_PARAMETER_COLUMNS},
+    expected_output REAL NOT NULL,
+    answer REAL,
+    abs_error REAL,
+    relative_error REAL,
+    latency REAL NOT NULL,
+    reasoning TEXT,
+    reason TEXT,
+    error TEXT,
+    input TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS failures_model ON failures (model, bucket);
+CREATE INDEX IF NOT EXISTS failures_run ON failures (run, bucket);
+CREATE INDEX IF NOT EXISTS failures_bucket ON failures (bucket);
+CREATE INDEX IF NOT EXISTS failures_error_band ON failures (error_band);
+{_PARAMETER_INDEXES}
+"""
+
+
+@dataclasses.dataclass
+class Failure:
+    """
+    A wrong answer or a failed item, with its likely cause.
+    """
+
+    run: str
+    model: str
+    dataset_item_id: str
+    bucket: str
+    template: str | None
+    params: dict[str, float] | None
+    expected_output: float
+    answer: float | None
+    latency: float
+    reasoning: str | None
+    reason: str | None
+    error: str | None
+    input: str
+
+    @property
+    def abs_error(self) -> float | None:
+        if self.answer is None:
+            return None
+        return abs(self.answer - self.expected_output)
+
+    @property
+    def relative_error(self) -> float | None:
+        if self.answer is None or self.expected_output == 0:
+            return None
+        return self.abs_error / abs(self.expected_output)
+
+    @property
+    def error_band(self) -> str:
+        return get_error_band(self.relative_error)
+
+
+def _matches(value: float, target: float) -> bool:
+    return abs(value - target) <= MATCH_TOLERANCE * max(abs(target), 1e-9)
+
+
+def get_error_band(relative_error: float | None) -> str:
+    """
+    Returns the band of a relative error, e.g. '5-10%', or 'none' without answer.
+    """
+    if relative_error is None:
+        return 'none'
+    for bound, band in ERROR_BANDS:
+        if relative_error < bound:
+            return band
+    return ERROR_BANDS[-1][1]
+
+
+def get_reference_problem(problem: Problem, expected_output: float) -> Problem:
+    """
+    Returns the problem whose answer is the expected output. Most templates state
+    that Kai turns after 1 hour whatever the turn time the expected output was
+    computed with, so the turn time is inferred from the expected output.
+    """
+    if _matches(problem.get_correct_answer(), expected_output):
+        return problem
+    for turn_time in _TURN_TIMES:
+        candidate = _replace(problem, kai_change_direction_time=turn_time)
+        if _matches(candidate.get_correct_answer(), expected_output):
+            return candidate
+    return problem
+
+
+def _replace(problem: Problem, **changes: float) -> Problem:
+    return Problem(**{**vars(problem), **changes})
+
+
+def _get_mistakes(problem: Problem) -> list[tuple[str, Problem]]:
+    """
+    Returns the problem as solved with each usual mistake, by bucket.
+    """
+    turn_time = problem.kai_change_direction_time
+    mistakes = [
+        # Current pushing towards the other side, heading mirrored on the shoreline
+        (
+            'sign_error',
+            _replace(problem, ocean_current_speed=-problem.ocean_current_speed),
+        ),
+        ('sign_error', _replace(problem, buoy_angle=-problem.buoy_angle)),
+        ('ignored_current', _replace(problem, ocean_current_speed=0)),
+        # Second phase lasting the total time instead of what is left of it
+        (
+            'wrong_phase_duration',
+            _replace(problem, final_time=problem.final_time + turn_time),
+        ),
+    ]
+    mistakes += [
+        ('wrong_phase_duration', _replace(problem, kai_change_direction_time=t))
+        for t in (0.5, 1.0, 1.5, 2.0, 2.5)
+        if t != turn_time and t <= problem.final_time
+    ]
+    return mistakes
+
+
+def classify_failure(
+    problem: Problem | None,
+    expected_output: float,
+    answer: float | None,
+    error: str | None = None,
+) -> str:
+    """
+    Guesses why an item failed.
+
+    Args:
+        problem: The problem parsed from the question, or None if it did not follow
+            any template
+        expected_output: The correct answer
+        answer: The answer of the model, or None if solving the item failed
+        error: The error raised while solving the item, if any
+
+    Returns:
+        One of 'parse_failure' (the reply had no number), 'request_error',
+        'sign_error', 'ignored_current', 'wrong_phase_duration', 'unparsed_question'
+        (no template to check mistakes against) or 'other'
+    """
+    if answer is None:
+        if error is not None and error.startswith('BamlValidationError'):
+            return 'parse_failure'
+        return 'request_error'
+
+    if answer < 0 and _matches(-answer, expected_output):
+        return 'sign_error'
+    if problem is None:
+        return 'unparsed_question'
+
+    problem = get_reference_problem(problem, expected_output)
+    for bucket, mistake in _get_mistakes(problem):
+        distance = mistake.get_correct_answer()
+        # Mistakes without effect on this problem, e.g. ignoring a zero current
+        if _matches(distance, expected_output):
+            continue
+        if _matches(answer, distance):
+            return bucket
+    return 'other'
+
+
+def get_failure(
+    result: ItemResult,
+    run: str,
+    model: str,
+    reasoning: str | None = None,
+    metric: str = 'within_1_percent',
+) -> Failure | None:
+    """
+    Returns the failure of a result, or None if the result passes the metric.
+    """
+    value = result.get_score(metric)
+    if result.error is None and value is not None and value >= 0.5:
+        return None
+
+    parsed = TEMPLATES.parse(result.input)
+    template, problem = parsed if parsed is not None else (None, None)
+    if problem is not None:
+        problem = get_reference_problem(problem, result.expected_output)
+
+    return Failure(
+        run=run,
+        model=model,
+        dataset_item_id=result.dataset_item_id,
+        bucket=classify_failure(
+            problem, result.expected_output, result.answer, result.error
+        ),
+        template=template,
+        params=vars(problem) if problem is not None else None,
+        expected_output=result.expected_output,
+        answer=result.answer,
+        latency=result.latency,
+        reasoning=reasoning,
+        reason=next(
+            (score.reason for score in result.scores if score.name == metric), None
+        ),
+        error=result.error,
+        input=result.input,
+    )
+
+
+class FailureStore:
+    """
+    SQLite store of failures, indexed by run, model, bucket, error band and
+    problem parameters.
+    """
+
+    def __init__(self, path: str | Path = 'results/failures.sqlite'):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One connection per call, so the store can be used from any thread
+        with closing(sqlite3.connect(self.path, timeout=60)) as connection:
+            connection.row_factory = sqlite3.Row
+            with connection:
+                yield connection
+
+    def add(self, failures: list[Failure]) -> None:
+        """
+        Stores failures in a single transaction.
+        """
+        columns = [
+            'run',
+            'model',
+            'dataset_item_id',
+            'bucket',
+            'error_band',
+            'template',
+            *PARAMETER_NAMES,
+            'expected_output',
+            'answer',
+            'abs_error',
+            'relative_error',
+            'latency',
+            'reasoning',
+            'reason',
+            'error',
+            'input',
+            'created_at',
+        ]
+        created_at = datetime.datetime.now(datetime.UTC).isoformat()
+        rows = [
+            (
+                f.run,
+                f.model,
+                f.dataset_item_id,
+                f.bucket,
+                f.error_band,
+                f.template,
+                *(
+                    (f.params[name] for name in PARAMETER_NAMES)
+                    if f.params is not None
+                    else (None,) * len(PARAMETER_NAMES)
+                ),
+                f.expected_output,
+                f.answer,
+                f.abs_error,
+                f.relative_error,
+                f.latency,
+                f.reasoning,
+                f.reason,
+                f.error,
+                f.input,
+                created_at,
+            )
+            for f in failures
+        ]
+        with self._connect() as connection:
+            connection.executemany(
+                f'INSERT INTO failures ({", ".join(columns)}) '
+                f'VALUES ({", ".join("?" * len(columns))})',
+                rows,
+            )
+
+    def query(self, sql: str, params: tuple | dict = ()) -> list[dict[str, Any]]:
+        """
+        Runs a read query on the store, e.g.
+        `SELECT * FROM failures WHERE bucket = 'ignored_current' AND buoy_angle > 40`.
+
+        Returns:
+            The rows as dictionaries
+        """
+        with self._connect() as connection:
+            return [dict(row) for row in connection.execute(sql, params)]
+
+    def count(
+        self, by: tuple[str, ...] = ('bucket',), where: str = '1', params: tuple = ()
+    ) -> list[dict[str, Any]]:
+        """
+        Counts failures grouped by the given columns, most frequent first.
+
+        Args:
+            by: Columns to group by, e.g. ('model', 'bucket')
+            where: SQL condition on the failures to count
+            params: Parameters of the condition
+        """
+        unknown = set(by) - {
+            'run',
+            'model',
+            'bucket',
+            'error_band',
+            'template',
+            *PARAMETER_NAMES,
+        }
+        if unknown:
+            raise ValueError(f'Cannot group failures by {sorted(unknown)}')
+        group = ', '.join(by)
+        return self.query(
+            f'SELECT {group}, COUNT(*) AS n_failures, '
+            f'AVG(relative_error) AS mean_relative_error, AVG(latency) AS mean_latency '
+            f'FROM failures WHERE {where} GROUP BY {group} ORDER BY n_failures DESC',
+            params,
+        )
+
+
+class FailureRecorder:
+    """
+    Evaluation callback storing the failures of a run, in batches.
+    """
+
+    def __init__(
+        self,
+        store: FailureStore,
+        model: str,
+        run: str | None = None,
+        get_reasoning: Callable[[str], str | None] | None = None,
+        metric: str = 'within_1_percent',
+        batch_size: int = 500,
+    ):
+        """
+        Args:
+            store: Store the failures are written to
+            model: Model identifier the failures are stored under
+            run: Name of the run. Defaults to the current time
+            get_reasoning: Function returning the reasoning of the model for a
+                problem, e.g. `OneShootAgent.get_reasoning`
+            metric: Binary metric an item fails
+            batch_size: Number of failures written per transaction
+        """
+        self.store = store
+        self.model = model
+        self.run = run or datetime.datetime.now(datetime.UTC).isoformat()
+        self.get_reasoning = get_reasoning
+        self.metric = metric
+        self.batch_size = batch_size
+
+        self.n_failures = 0
+        self._buffer: list[Failure] = []
+        self._lock = threading.Lock()
+
+    def on_result(self, result: ItemResult) -> None:
+        """
+        Stores the result if it is a failure.
+        """
+        reasoning = self.get_reasoning(result.input) if self.get_reasoning else None
+        failure = get_failure(result, self.run, self.model, reasoning, self.metric)
+        if failure is None:
+            return
+
+        with self._lock:
+            self.n_failures += 1
+            self._buffer.append(failure)
+            if len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+        self.store.add(batch)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered failures.
+        """
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self.store.add(batch)
+
+    def close(self) -> None:
+        self.flush()
+        logger.info(
+            f'Stored {self.n_failures} failures of run {self.run} in {self.store.path}'
+        )
+
+    def __enter__(self) -> 'FailureRecorder':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()